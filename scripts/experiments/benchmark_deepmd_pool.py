@@ -0,0 +1,81 @@
+"""Benchmark the DeepMD evaluation paths on the same batch:
+
+  * in-process    DeepMDBatchEvaluator (one batched dp.eval per layout)
+  * pool/frame    batch_calculator_deepmd_mp, one dp.eval per frame per worker
+  * pool/batched  batch_calculator_deepmd_mp, one dp.eval per layout per worker
+
+The pool runs are repeated over a grid of worker counts and threads per
+worker, for both transports. Energies are checked against the in-process
+result so every row is also a correctness check.
+
+    python benchmark_deepmd_pool.py structures.traj --batch 64 \
+        --workers 1 2 4 --threads 1 2 4
+"""
+
+import argparse
+import time
+import warnings
+warnings.filterwarnings("ignore", message=r"logm result may be inaccurate.*")
+
+import numpy as np
+from ase.io import read
+
+from create_batch_deepmd import create_calc
+from ea.parallel.create_batch import (
+    DeepMDBatchEvaluator,
+    batch_calculator_deepmd_mp,
+    _shutdown_dp_pool,
+)
+
+
+def _time(fn, repeats):
+    """Best wall time over `repeats` calls (the first call is a warm-up)."""
+    out = fn()
+    best = np.inf
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("structures", help="any ASE-readable file with frames")
+    p.add_argument("--model", default="deepmd_d3")
+    p.add_argument("--batch", type=int, default=64)
+    p.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    p.add_argument("--threads", type=int, nargs="+", default=[1])
+    p.add_argument("--repeats", type=int, default=3)
+    args = p.parse_args()
+
+    frames = read(args.structures, index=":")
+    batch = [frames[i % len(frames)].copy() for i in range(args.batch)]
+    calc = create_calc(args.model)
+
+    t_ref, (E_ref, _, _) = _time(lambda: DeepMDBatchEvaluator(calc)(batch),
+                                 args.repeats)
+    print(f"{'path':<14}{'transport':>10}{'workers':>9}{'threads':>9}"
+          f"{'time [s]':>11}{'speedup':>9}{'max|dE|':>11}")
+    print(f"{'in-process':<14}{'-':>10}{'-':>9}{'-':>9}"
+          f"{t_ref:>11.3f}{1.0:>9.2f}{0.0:>11.2e}")
+
+    for transport in ("pickle", "shm"):
+        for batched in (False, True):
+            for n_workers in args.workers:
+                for n_threads in args.threads:
+                    run = lambda: batch_calculator_deepmd_mp(
+                        batch, calc, n_workers=n_workers, transport=transport,
+                        threads_per_worker=n_threads,
+                        worker_batching=batched)
+                    t, (E, _, _) = _time(run, args.repeats)
+                    dE = float(np.abs(np.asarray(E) - E_ref).max())
+                    label = "pool/batched" if batched else "pool/frame"
+                    print(f"{label:<14}{transport:>10}{n_workers:>9}"
+                          f"{n_threads:>9}{t:>11.3f}{t_ref / t:>9.2f}"
+                          f"{dE:>11.2e}")
+        _shutdown_dp_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@ from collections.abc import Callable
 import warnings
 import numpy as np
 
+from ea.parallel.precon import apply_precon, estimate_mu, make_precon
+from ea.parallel.symmetry import SYMPREC, symmetry_constraint
+
 
 
 @dataclass
@@ -23,6 +26,7 @@ class FIREState:
     a: float = 0.1
     Nsteps: int = 0
     vel: Any = None                  # 1D array over (natoms+3)*3 DOFs
+    precon: Any = None               # ExpPrecon of the filter DOFs, or None
     converged: bool = False
     energy: float | None = None
     fmax_current: float | None = None
@@ -42,6 +46,60 @@ def _inject_results(atoms, energy, forces, stress_voigt):
     )
 
 
+def fire_update_batched(vel, G, rows, started, dt, a, Nsteps, Nmin,
+                        finc, fdec, astart, fa, dtmax, maxstep):
+    """One FIRE update for the rows `rows` of a padded batch.
+
+    `vel` (B, D), `started` and the per-structure parameter arrays (B,) are
+    updated in place for the selected rows; `G` (len(rows), D) holds the
+    flattened filter forces, zero-padded past each structure's DOFs.
+    Returns the (len(rows), D) displacement, already clipped to `maxstep`.
+    Mirrors the scalar update in ParallelFIRE.step row by row.
+    """
+    v = vel[rows]
+    a_r = a[rows]
+    dt_r = dt[rows]
+    n_r = Nsteps[rows]
+
+    vf = np.einsum('ij,ij->i', G, v)
+    grad2 = np.einsum('ij,ij->i', G, G)
+    vnorm = np.sqrt(np.einsum('ij,ij->i', v, v))
+
+    was_started = started[rows]
+    uphill = was_started & (vf > 0.0)
+    reset = was_started & ~(vf > 0.0)
+
+    gnorm = np.sqrt(np.where(grad2 > 0.0, grad2, 1.0))
+    mixed = ((1.0 - a_r)[:, None] * v
+             + a_r[:, None] * G / gnorm[:, None] * vnorm[:, None])
+    v = np.where(uphill[:, None], mixed, v)
+    v[reset] = 0.0
+
+    grow = uphill & (n_r > Nmin[rows])
+    dt_r = np.where(grow, np.minimum(dt_r * finc[rows], dtmax[rows]), dt_r)
+    a_r = np.where(grow, a_r * fa[rows], a_r)
+    n_r = np.where(uphill, n_r + 1, n_r)
+
+    a_r = np.where(reset, astart[rows], a_r)
+    dt_r = np.where(reset, dt_r * fdec[rows], dt_r)
+    n_r = np.where(reset, 0, n_r)
+
+    v = v + dt_r[:, None] * G
+    dr = dt_r[:, None] * v
+    normdr = np.sqrt(np.einsum('ij,ij->i', dr, dr))
+    clip = normdr > maxstep[rows]
+    if clip.any():
+        dr[clip] = (maxstep[rows][clip, None] * dr[clip]
+                    / normdr[clip, None])
+
+    vel[rows] = v
+    dt[rows] = dt_r
+    a[rows] = a_r
+    Nsteps[rows] = n_r
+    started[rows] = True
+    return dr
+
+
 class ParallelFIRE:
     """Backend-agnostic FIRE optimizer that batches force/energy/stress
     evaluations across multiple ase.Atoms objects.
@@ -61,13 +119,32 @@ class ParallelFIRE:
         FIRE(FrechetCellFilter(atoms))
     would do for a single structure. Per-structure FIRE state (vel, dt, a,
     Nsteps) is tracked independently and mirrors ase.optimize.fire.FIRE.step.
+
+    With ``vectorized=True`` the FIRE state of the whole batch lives in
+    padded NumPy arrays (``vel`` of shape (B, max_ndof), zero past each
+    structure's DOFs, and (B,) arrays for dt, a, Nsteps, ...) and the
+    velocity mixing, dt/alpha adaptation and maxstep clipping are done for
+    every active structure at once by :func:`fire_update_batched`. Per-structure
+    trajectories match the scalar path to floating-point tolerance; call
+    ``sync_states()`` to copy the arrays back into ``self.states``.
+
+    With ``symmetry=True`` every structure is refined to its space group
+    (``symprec``) and carries a ``FixSymmetry`` constraint, so forces,
+    stress and steps are symmetrized and the space group is kept.
+
+    With ``precon='Exp'`` FIRE moves along the preconditioned forces
+    ``P^-1 f`` of a per-structure ``ea.parallel.precon.ExpPrecon`` (as
+    ase.optimize.precon.PreconFIRE does); ``mu`` / ``mu_c`` are fitted for
+    the whole batch with one extra evaluator call after the first step's
+    evaluation.  Convergence is still tested on the plain filter forces.
     """
 
     def __init__(self, atoms_list, batch_evaluator: Callable = None,
                  fmax=0.05, max_steps=200,
                  dt=0.1, maxstep=0.03, dtmax=1.0, Nmin=5,
                  finc=1.1, fdec=0.5, astart=0.1, fa=0.99, a=0.1,
-                 logfile='-'):
+                 logfile='-', vectorized=False, symmetry=False,
+                 symprec=SYMPREC, precon=None):
         if batch_evaluator is None:
             warnings.warn(
                 "ParallelFIRE: no batch_evaluator provided. Pass a callable "
@@ -80,17 +157,22 @@ class ParallelFIRE:
         self.states = []
         for at in atoms_list:
             at_copy = at.copy()
+            if symmetry:
+                symmetry_constraint(at_copy, symprec)
             flt = FrechetCellFilter(at_copy)
             self.states.append(
                 FIREState(atoms=at_copy, filter=flt,
                           dt=dt, maxstep=maxstep, dtmax=dtmax,
                           Nmin=Nmin, finc=finc, fdec=fdec, astart=astart,
-                          fa=fa, a=a)
+                          fa=fa, a=a, precon=make_precon(precon))
             )
         self.fmax = fmax
         self.max_steps = max_steps
         self.nsteps_done = 0
         self.logfile = logfile
+        self.vectorized = vectorized
+        if vectorized:
+            self._pack_states()
 
     def _log(self, msg):
         if self.logfile == '-':
@@ -99,16 +181,16 @@ class ParallelFIRE:
             with open(self.logfile, 'a') as fh:
                 fh.write(msg + '\n')
 
-    def step(self):
-        active_idx = [i for i, s in enumerate(self.states) if not s.converged]
-        if not active_idx:
-            return True
-
+    def _evaluate(self, active_idx):
+        """Run one batched evaluation over `active_idx` and return the
+        combined (natoms+3, 3) filter force vector of every structure.
+        Updates energy / fmax_current / converged on each state."""
         active_atoms = [self.states[i].atoms for i in active_idx]
 
         # Single batched evaluation call, backend-agnostic.
         E, F_list, S_list = self.batch_evaluator(active_atoms)
 
+        force_vecs = []
         for j, i in enumerate(active_idx):
             s = self.states[i]
 
@@ -121,13 +203,37 @@ class ParallelFIRE:
             fnorm_max = float(np.linalg.norm(force_vec, axis=1).max())
             s.fmax_current = fnorm_max
             s.energy = float(np.asarray(E[j]).ravel()[0])
-
             if fnorm_max < self.fmax:
                 s.converged = True
+            force_vecs.append(force_vec)
+        return force_vecs
+
+    def step(self):
+        active_idx = [i for i, s in enumerate(self.states) if not s.converged]
+        if not active_idx:
+            return True
+
+        force_vecs = self._evaluate(active_idx)
+        estimate_mu([(self.states[i].precon, self.states[i].filter, fv)
+                     for i, fv in zip(active_idx, force_vecs)
+                     if not self.states[i].converged
+                     and self.states[i].precon is not None
+                     and self.states[i].precon.mu is None],
+                    self.batch_evaluator)
+        if self.vectorized:
+            self._step_vectorized(active_idx, force_vecs)
+            return False
+
+        for i, force_vec in zip(active_idx, force_vecs):
+            s = self.states[i]
+            if s.converged:
                 continue
 
             # ASE FIRE convention: gradient = -(-forces) = +forces (flat)
             gradient = force_vec.ravel()
+            if s.precon is not None:
+                s.precon.update(s.atoms)
+                gradient = s.precon.solve(force_vec).ravel()
 
             if s.vel is None:
                 s.vel = np.zeros_like(gradient)
@@ -160,6 +266,72 @@ class ParallelFIRE:
 
         return False
 
+    # ---------------------------------------------------------- vectorized
+
+    def _pack_states(self):
+        """Build the structure-of-arrays view of `self.states`.
+
+        Every per-structure FIRE scalar becomes a (B,) array and the
+        velocities a zero-padded (B, max_ndof) array (`ndofs` holds the
+        real DOF count of each row). The forces are zero-padded too, so the
+        padding stays exactly zero through every update and whole-row
+        reductions equal the per-structure ones.
+        """
+        ndofs = np.array([3 * (len(s.atoms) + 3) for s in self.states],
+                         dtype=int)
+        B = len(self.states)
+        D = int(ndofs.max()) if B else 0
+        self.ndofs = ndofs
+        self.vel = np.zeros((B, D))
+        self.started = np.zeros(B, dtype=bool)
+        for name in ('dt', 'maxstep', 'dtmax', 'finc', 'fdec', 'astart',
+                     'fa', 'a'):
+            setattr(self, name,
+                    np.array([getattr(s, name) for s in self.states],
+                             dtype=float))
+        self.Nmin = np.array([s.Nmin for s in self.states], dtype=int)
+        self.Nsteps = np.array([s.Nsteps for s in self.states], dtype=int)
+        for k, s in enumerate(self.states):
+            if s.vel is not None:
+                self.vel[k, :ndofs[k]] = s.vel
+                self.started[k] = True
+
+    def _step_vectorized(self, active_idx, force_vecs):
+        moving = [(i, fv) for i, fv in zip(active_idx, force_vecs)
+                  if not self.states[i].converged]
+        if not moving:
+            return
+
+        rows = np.array([i for i, _ in moving], dtype=int)
+        G = np.zeros((rows.size, self.vel.shape[1]))
+        for j, (i, fv) in enumerate(moving):
+            G[j, :self.ndofs[i]] = fv.ravel()
+        G = apply_precon([(self.states[i].precon, self.states[i].atoms, None)
+                          for i in rows], G)
+
+        dr = fire_update_batched(
+            self.vel, G, rows, self.started, self.dt, self.a, self.Nsteps,
+            self.Nmin, self.finc, self.fdec, self.astart, self.fa,
+            self.dtmax, self.maxstep,
+        )
+
+        for j, i in enumerate(rows):
+            s = self.states[i]
+            x = s.filter.get_positions().ravel()
+            s.filter.set_positions(
+                (x + dr[j, :self.ndofs[i]]).reshape(-1, 3))
+
+    def sync_states(self):
+        """Copy the vectorized FIRE arrays back into `self.states` so each
+        FIREState looks as if the scalar path had been used."""
+        if not self.vectorized:
+            return
+        for k, s in enumerate(self.states):
+            s.vel = self.vel[k, :self.ndofs[k]].copy() if self.started[k] else None
+            s.dt = float(self.dt[k])
+            s.a = float(self.a[k])
+            s.Nsteps = int(self.Nsteps[k])
+
     def run(self):
         for step in range(self.max_steps):
             self.nsteps_done = step + 1
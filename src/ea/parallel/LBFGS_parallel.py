@@ -5,7 +5,7 @@ FrechetCellFilter so atomic positions AND cell DOFs are relaxed together,
 exactly like LBFGS(FrechetCellFilter(atoms)) would do for a single structure.
 """
 
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import Any
 from collections.abc import Callable
 import numpy as np
@@ -15,6 +15,9 @@ from ase.io import write
 from pathlib import Path
 from ase.io.trajectory import Trajectory
 import warnings
+
+from ea.parallel.precon import apply_precon, estimate_mu, make_precon
+from ea.parallel.symmetry import SYMPREC, symmetric_basis, symmetry_constraint
 warnings.filterwarnings("ignore", message=r"logm result may be inaccurate.*")
 
 
@@ -25,19 +28,132 @@ class LBFGSState:
     maxstep: float = 0.2
     memory: int = 100
     damping: float = 1.0
-    # LBFGS history (per-structure, mirrors ASE's LBFGS internals)
+    # number of L-BFGS updates taken (mirrors ASE's LBFGS.iteration); the
+    # s / y / rho history itself lives in the optimizer's LBFGSHistory
     iteration: int = 0
-    s: list = field(default_factory=list)
-    y: list = field(default_factory=list)
-    rho: list = field(default_factory=list)
-    r0: Any = None
-    f0: Any = None
+    # (ndof, r) orthonormal basis of the symmetry-invariant DOFs, or None
+    basis: Any = None
+    # ExpPrecon of the filter DOFs (replaces H0 in the two-loop), or None
+    precon: Any = None
     # bookkeeping
     converged: bool = False
     energy: float | None = None
     fmax_current: float | None = None
 
 
+class LBFGSHistory:
+    """Preallocated L-BFGS ring buffers for a padded batch of structures.
+
+    ``s`` and ``y`` have shape (B, memory, max_ndof) and ``rho`` (B, memory);
+    row ``k`` holds the history of structure ``k``, zero-padded past its own
+    DOF count, so whole-row dot products equal the per-structure ones.
+    ``head[k]`` is the next slot to overwrite and ``count[k]`` the number of
+    valid pairs, i.e. ``min(iteration, memory)`` exactly as in
+    ase.optimize.lbfgs.LBFGS, whose ``list.pop(0)`` trimming is replaced by
+    overwriting the oldest slot.
+
+    Every method takes ``rows`` (indices into the batch) together with
+    (len(rows), max_ndof) arrays, so the two-loop recursion runs for all
+    selected structures at once.
+    """
+
+    def __init__(self, ndofs, memory):
+        ndofs = np.asarray(ndofs, dtype=int)
+        B = len(ndofs)
+        D = int(ndofs.max()) if B else 0
+        self.memory = int(memory)
+        self.ndofs = ndofs
+        self.s = np.zeros((B, self.memory, D))
+        self.y = np.zeros((B, self.memory, D))
+        self.rho = np.zeros((B, self.memory))
+        self.r0 = np.zeros((B, D))
+        self.f0 = np.zeros((B, D))
+        self.head = np.zeros(B, dtype=int)
+        self.count = np.zeros(B, dtype=int)
+        self.iteration = np.zeros(B, dtype=int)
+
+    @property
+    def width(self):
+        return self.s.shape[2]
+
+    def widen(self, width):
+        """Grow the padded DOF axis to `width` (new columns are zero)."""
+        extra = int(width) - self.width
+        if extra <= 0:
+            return
+        self.s = np.pad(self.s, ((0, 0), (0, 0), (0, extra)))
+        self.y = np.pad(self.y, ((0, 0), (0, 0), (0, extra)))
+        self.r0 = np.pad(self.r0, ((0, 0), (0, extra)))
+        self.f0 = np.pad(self.f0, ((0, 0), (0, extra)))
+
+    def reset(self, rows):
+        """Forget the history of `rows` (cold restart, as a fresh LBFGS)."""
+        self.s[rows] = 0.0
+        self.y[rows] = 0.0
+        self.r0[rows] = 0.0
+        self.f0[rows] = 0.0
+        self.rho[rows] = 0.0
+        self.head[rows] = 0
+        self.count[rows] = 0
+        self.iteration[rows] = 0
+
+    def update(self, rows, pos, forces):
+        """Push (s, y, rho) built from the previous step of every row that
+        has one. Mirrors LBFGS.update."""
+        rows = np.asarray(rows, dtype=int)
+        has_prev = self.iteration[rows] > 0
+        if not has_prev.any():
+            return
+        r = rows[has_prev]
+        s0 = pos[has_prev] - self.r0[r]
+        y0 = self.f0[r] - forces[has_prev]          # gradient difference
+        slot = self.head[r]
+        self.s[r, slot] = s0
+        self.y[r, slot] = y0
+        self.rho[r, slot] = 1.0 / np.einsum('ij,ij->i', y0, s0)
+        self.head[r] = (slot + 1) % self.memory
+        self.count[r] = np.minimum(self.count[r] + 1, self.memory)
+
+    def remember(self, rows, pos, forces):
+        """Store the current point as the base of the next update."""
+        self.r0[rows] = pos
+        self.f0[rows] = forces
+        self.iteration[rows] += 1
+
+    def direction(self, rows, forces, H0, solve=None):
+        """Batched two-loop recursion; returns the descent direction
+        ``-H·g`` for every row (g = -forces).
+
+        ``solve(q)``, if given, replaces the initial ``H0 * q`` on the
+        (len(rows), width) array ``q`` (preconditioned L-BFGS: ``P^-1 q``).
+        """
+        rows = np.asarray(rows, dtype=int)
+        n = rows.size
+        count = self.count[rows]
+        loopmax = int(count.max()) if n else 0
+        # slot of the k-th most recent pair, per row
+        slots = (self.head[rows][:, None] - 1
+                 - np.arange(loopmax)[None, :]) % self.memory
+        valid = np.arange(loopmax)[None, :] < count[:, None]
+
+        a = np.zeros((n, loopmax))
+        q = -forces                                  # = gradient
+        for k in range(loopmax):                     # newest -> oldest
+            sk = self.s[rows, slots[:, k]]
+            yk = self.y[rows, slots[:, k]]
+            rk = np.where(valid[:, k], self.rho[rows, slots[:, k]], 0.0)
+            a[:, k] = rk * np.einsum('ij,ij->i', sk, q)
+            q = q - a[:, k, None] * yk
+        z = H0 * q if solve is None else solve(q)
+        for k in range(loopmax - 1, -1, -1):         # oldest -> newest
+            sk = self.s[rows, slots[:, k]]
+            yk = self.y[rows, slots[:, k]]
+            rk = np.where(valid[:, k], self.rho[rows, slots[:, k]], 0.0)
+            b = rk * np.einsum('ij,ij->i', yk, z)
+            z = z + sk * (a[:, k] - b)[:, None]
+        return -z
+
+
 def _inject_results(atoms, energy, forces, stress_voigt):
     """Attach a SinglePointCalculator carrying the batched results so
     FrechetCellFilter.get_forces() / atoms.get_stress() return them.
@@ -66,13 +182,26 @@ class ParallelLBFGS:
     etc.). Any virial↔stress conversion lives in the caller's evaluator.
 
     Per-structure L-BFGS history (s, y, rho, r0, f0, iteration) is tracked
-    independently and mirrors ase.optimize.lbfgs.LBFGS.step exactly.
+    independently and mirrors ase.optimize.lbfgs.LBFGS.step exactly. It is
+    stored in preallocated (B, memory, ndof) ring buffers (`LBFGSHistory`)
+    and the two-loop recursion runs for the whole batch at once.
+
+    With ``symmetry=True`` every structure is refined to its space group
+    (``symprec``) and carries a ``FixSymmetry`` constraint, and its L-BFGS
+    history lives in the reduced space spanned by ``symmetric_basis``: only
+    the symmetry-invariant combinations of the 3N+9 DOFs are optimized.
+
+    With ``precon='Exp'`` the initial inverse Hessian ``H0`` of the two-loop
+    recursion is replaced by ``P^-1`` of a per-structure
+    ``ea.parallel.precon.ExpPrecon`` (as ase.optimize.precon.PreconLBFGS
+    does), whose ``mu`` / ``mu_c`` are fitted for the whole batch with one
+    extra evaluator call after the first step's evaluation.
     """
 
     def __init__(self, atoms_list, batch_evaluator: Callable = None,
                  fmax=0.05, max_steps=200,
                  maxstep=0.2, memory=100, damping=1.0, alpha=70.0,
-                 logfile='-'):
+                 logfile='-', symmetry=False, symprec=SYMPREC, precon=None):
         if maxstep > 1.0:
             raise ValueError(
                 f"maxstep={maxstep} is too large (must be <= 1.0 A)"
@@ -97,11 +226,19 @@ class ParallelLBFGS:
         self.states = []
         for at in atoms_list:
             at_copy = at.copy()
+            basis = None
+            if symmetry:
+                constraint = symmetry_constraint(at_copy, symprec)
+                if constraint is not None:
+                    basis = symmetric_basis(at_copy, constraint)
             flt = FrechetCellFilter(at_copy)
             self.states.append(
-                LBFGSState(atoms=at_copy, filter=flt,
-                           maxstep=maxstep, memory=memory, damping=damping)
+                LBFGSState(atoms=at_copy, filter=flt, basis=basis,
+                           precon=make_precon(precon), maxstep=maxstep, memory=memory, damping=damping)
             )
+        self.history = LBFGSHistory(
+            [3 * (len(st.atoms) + 3) if st.basis is None
+             else st.basis.shape[1] for st in self.states], memory)
 
     def _log(self, msg):
         if self.logfile == '-':
@@ -120,16 +257,16 @@ class ParallelLBFGS:
             dr = dr * (maxstep / longest)
         return dr
 
-    def step(self):
-        active_idx = [i for i, s in enumerate(self.states) if not s.converged]
-        if not active_idx:
-            return True
-
+    def _evaluate(self, active_idx):
+        """Run one batched evaluation over `active_idx` and return the
+        combined (natoms+3, 3) filter force vector of every structure.
+        Updates energy / fmax_current / converged on each state."""
         active_atoms = [self.states[i].atoms for i in active_idx]
 
         # Single batched evaluation call, backend-agnostic.
         E, F_list, S_list = self.batch_evaluator(active_atoms)
 
+        force_vecs = []
         for j, i in enumerate(active_idx):
             st = self.states[i]
 
@@ -141,48 +278,65 @@ class ParallelLBFGS:
             fnorm_max = float(np.linalg.norm(force_vec, axis=1).max())
             st.fmax_current = fnorm_max
             st.energy = float(np.asarray(E[j]).ravel()[0])
-
             if fnorm_max < self.fmax:
                 st.converged = True
-                continue
-
-            forces = force_vec.ravel()                  # 1D, length = ndofs
-            pos = st.filter.get_positions().ravel()
-
-            # --- update L-BFGS history (mirrors LBFGS.update) -----------
-            if st.iteration > 0:
-                s0 = pos - st.r0
-                y0 = st.f0 - forces                     # gradient difference
-                st.s.append(s0)
-                st.y.append(y0)
-                st.rho.append(1.0 / np.dot(y0, s0))
-            if st.iteration > st.memory:
-                st.s.pop(0)
-                st.y.pop(0)
-                st.rho.pop(0)
-
-            # --- two-loop recursion ------------------------------------
-            loopmax = int(min(st.memory, st.iteration))
-            a = np.empty(loopmax, dtype=np.float64)
-            q = -forces                                 # = gradient
-            for k in range(loopmax - 1, -1, -1):
-                a[k] = st.rho[k] * np.dot(st.s[k], q)
-                q = q - a[k] * st.y[k]
-            z = self.H0 * q
-            for k in range(loopmax):
-                b = st.rho[k] * np.dot(st.y[k], z)
-                z = z + st.s[k] * (a[k] - b)
-            p = -z                                       # descent direction
-
-            # --- apply step with maxstep rescale + damping -------------
-            dr = self._determine_step(p, st.maxstep) * st.damping
-            st.filter.set_positions((pos + dr).reshape(-1, 3))
-
-            # remember for next iteration
-            st.r0 = pos
-            st.f0 = forces
+            force_vecs.append(force_vec)
+        return force_vecs
+
+    def step(self):
+        active_idx = [i for i, s in enumerate(self.states) if not s.converged]
+        if not active_idx:
+            return True
+
+        force_vecs = self._evaluate(active_idx)
+        moving = [(i, fv) for i, fv in zip(active_idx, force_vecs)
+                  if not self.states[i].converged]
+        if not moving:
+            return False
+
+        # --- fit the preconditioners at their first evaluation ------------
+        estimate_mu([(self.states[i].precon, self.states[i].filter, fv)
+                     for i, fv in moving
+                     if self.states[i].precon is not None
+                     and self.states[i].precon.mu is None],
+                    self.batch_evaluator)
+
+        # --- gather padded (n, max_ndof) forces / positions -------------
+        # (reduced coordinates for structures with a symmetric basis)
+        rows = np.array([i for i, _ in moving], dtype=int)
+        forces = np.zeros((rows.size, self.history.width))
+        pos = np.zeros_like(forces)
+        full_pos = []
+        for j, (i, fv) in enumerate(moving):
+            Q = self.states[i].basis
+            x = self.states[i].filter.get_positions().ravel()
+            full_pos.append(x)
+            f = fv.ravel()
+            if Q is not None:
+                x, f = x @ Q, f @ Q
+            forces[j, :f.size] = f
+            pos[j, :x.size] = x
+
+        # --- update L-BFGS history + two-loop recursion (whole batch) ----
+        self.history.update(rows, pos, forces)
+        items = [(self.states[i].precon, self.states[i].atoms,
+                  self.states[i].basis) for i in rows]
+        p = self.history.direction(
+            rows, forces, self.H0,
+            solve=lambda q: apply_precon(items, q, self.H0))
+
+        # --- apply step with maxstep rescale + damping -------------------
+        for j, i in enumerate(rows):
+            st = self.states[i]
+            nd = self.history.ndofs[i]
+            dr = p[j, :nd] if st.basis is None else st.basis @ p[j, :nd]
+            dr = self._determine_step(dr, st.maxstep) * st.damping
+            st.filter.set_positions((full_pos[j] + dr).reshape(-1, 3))
             st.iteration += 1
 
+        # remember for next iteration
+        self.history.remember(rows, pos, forces)
+
         return False
 
     def run(self, out_dir):
@@ -1,37 +1,251 @@
 import atexit
 import concurrent.futures
 import multiprocessing as mp
+from multiprocessing import shared_memory
 
 import numpy as np
 from ase.stress import full_3x3_to_voigt_6_stress
 
 
+# Atom-type arrays depend only on the (atomic numbers in order, type_dict)
+# signature of a structure, so they are computed once per layout.
+_type_cache = {}
+
+
+def layout_key(atoms):
+    """Batching signature of a structure: its atomic numbers in order
+    (this fixes both the atom count and the type layout)."""
+    return atoms.numbers.tobytes()
+
+
+def group_by_layout(atoms_list):
+    """Group batch indices by :func:`layout_key`, in first-seen order."""
+    groups = {}
+    for k, atoms in enumerate(atoms_list):
+        groups.setdefault(layout_key(atoms), []).append(k)
+    return groups
+
+
+def layout_types(atoms, type_dict):
+    """DeepMD atom-type array for `atoms`, cached per layout and type map."""
+    key = (layout_key(atoms), tuple(type_dict.items()))
+    atypes = _type_cache.get(key)
+    if atypes is None:
+        atypes = np.array([type_dict[s] for s in atoms.get_chemical_symbols()])
+        _type_cache[key] = atypes
+    return atypes
+
+
 def build_batch_deepmd(crystals, type_dict):
     '''
     This batch is only created if the crystals have the same amount of atoms in the same
-    order (type)
+    order (type); split mixed batches with group_by_layout first.
     :param crystals: Ase atoms list
     :param type_dict: DP calc.type_dict
     :return:
     '''
-    coords = []
-    cells = []
-    atypes = []
+    key = layout_key(crystals[0])
+    if any(layout_key(c) != key for c in crystals[1:]):
+        raise ValueError(
+            "build_batch_deepmd: structures differ in atom count or type "
+            "layout; group them with group_by_layout() first")
 
-    for c in crystals:
-        coords.append(c.get_positions().reshape(-1))
-        cells.append(c.get_cell().reshape(-1))
+    coords = np.stack([c.get_positions().reshape(-1) for c in crystals])  # (B, N*3)
+    cells = np.stack([c.get_cell().reshape(-1) for c in crystals])        # (B, 9)
 
+    # atom types shared by the whole group
+    atypes = layout_types(crystals[0], type_dict)  # (N,)
 
-    coords = np.stack(coords)   # (B, N*3)
-    cells  = np.stack(cells)    # (B, 9)
-    atypes = np.array(atypes)   # ( N,)
+    return coords, cells, atypes
 
-    # atom types ONLY from first structure
-    symbols = crystals[0].get_chemical_symbols()
-    atypes = np.array([type_dict[s] for s in symbols])  # (N,)
 
-    return coords, cells, atypes
+def _virials_to_voigt(virials, cells):
+    """(n, 9) DeepMD virials + (n, 3, 3) cells -> (n, 6) ASE Voigt stress.
+
+    stress = -virial / volume, symmetrised, in Voigt order
+    (xx, yy, zz, yz, xz, xy) as full_3x3_to_voigt_6_stress.
+    """
+    v = virials.reshape(-1, 3, 3)
+    volumes = np.abs(np.linalg.det(cells))
+    stress = -v / volumes[:, None, None]
+    stress = 0.5 * (stress + stress.transpose(0, 2, 1))
+    return stress[:, [0, 1, 2, 1, 0, 0], [0, 1, 2, 2, 2, 1]]
+
+
+class DeepMDBatchEvaluator:
+    """Reusable batched evaluator for a deepmd `DP` calculator.
+
+    Call it with an atoms list; returns (energies, forces_list,
+    stress_voigt_list) like :func:`batch_calculator_deepmd`.
+
+    Per-step allocation is avoided for the fixed batch layouts an optimizer
+    produces: for each layout signature the evaluator owns preallocated
+    coordinate (n, N*3) and cell (n, 9) arrays that are filled in place and
+    reused, the type array is computed once per layout, and the grouping of
+    a batch is cached as long as the same Atoms objects are passed in the
+    same order.  Layout diagnostics and auto-batch-size reports are only
+    printed with ``verbose=True``.
+
+    It is also a Hessian provider for ``ParallelVibrations``: see
+    :meth:`hessians`.
+    """
+
+    def __init__(self, calculator, verbose=False):
+        self.calculator = calculator
+        self.type_dict = calculator.type_dict
+        self.verbose = verbose
+        self._buffers = {}       # layout key -> (coords, cells) capacity arrays
+        self._plan_ids = None    # ids of the Atoms objects of the last call
+        self._plan_numbers = None
+        self._plan = None        # [(layout key, indices, types)]
+
+    def _make_plan(self, atoms_list):
+        ids = tuple(id(a) for a in atoms_list)
+        if (ids == self._plan_ids
+                and all(a.numbers is n
+                        for a, n in zip(atoms_list, self._plan_numbers))):
+            return self._plan
+        plan = []
+        for key, idx in group_by_layout(atoms_list).items():
+            types = layout_types(atoms_list[idx[0]], self.type_dict)
+            plan.append((key, np.asarray(idx), types))
+        self._plan_ids = ids
+        self._plan_numbers = [a.numbers for a in atoms_list]
+        self._plan = plan
+        return plan
+
+    def _buffers_for(self, key, n, natoms):
+        coords, cells = self._buffers.get(key, (None, None))
+        if coords is None or coords.shape[0] < n:
+            coords = np.empty((n, natoms * 3))
+            cells = np.empty((n, 9))
+            self._buffers[key] = (coords, cells)
+        return coords[:n], cells[:n]
+
+    def __call__(self, batch_atoms_list):
+        import time
+
+        B = len(batch_atoms_list)
+        if B == 0:
+            return np.empty(0), [], []
+        plan = self._make_plan(batch_atoms_list)
+        dp = self.calculator.dp
+        if self.verbose:
+            atom_counts = sorted({len(a) for a in batch_atoms_list})
+            print(f"[batch_calc] B={B}  unique_atom_counts={atom_counts}  "
+                  f"unique_symbol_layouts={len(plan)}")
+            abs_obj = dp.deep_eval.auto_batch_size
+            print(f"[batch_calc] BEFORE eval  current={abs_obj.current_batch_size}  "
+                  f"max_working={abs_obj.maximum_working_batch_size}  "
+                  f"min_not_working={abs_obj.minimal_not_working_batch_size}")
+
+        energies = np.empty(B)
+        forces_list = [None] * B
+        stress_voigt = [None] * B
+
+        t0 = time.perf_counter()
+        for key, idx, types in plan:
+            coords, cells = self._buffers_for(key, len(idx), len(types))
+            for j, k in enumerate(idx):
+                atoms = batch_atoms_list[k]
+                coords[j] = atoms.positions.reshape(-1)
+                cells[j] = atoms.cell.array.reshape(-1)
+            E, F, V = dp.eval(coords, cells, types)[:3]
+
+            energies[idx] = np.asarray(E).reshape(-1)
+            F = np.asarray(F).reshape(len(idx), -1, 3)
+            S = _virials_to_voigt(np.asarray(V), cells.reshape(-1, 3, 3))
+            for j, k in enumerate(idx):
+                forces_list[k] = F[j]
+                stress_voigt[k] = S[j]
+        dt = time.perf_counter() - t0
+
+        if self.verbose:
+            print(f"[batch_calc] AFTER eval   current={abs_obj.current_batch_size}  "
+                  f"max_working={abs_obj.maximum_working_batch_size}  "
+                  f"min_not_working={abs_obj.minimal_not_working_batch_size}")
+            print(f"[batch_calc] eval() wall time: {dt:.3f}s  "
+                  f"({dt/B*1000:.1f} ms/struct, {len(plan)} dp.eval call(s))")
+
+        return energies, forces_list, stress_voigt
+
+    def hessians(self, batch_atoms_list):
+        """Analytic Hessians d2E/dx2, one (3N, 3N) array in eV/A^2 per
+        structure.
+
+        DeepMD models frozen in ``hessian_mode`` return it from ``dp.eval``
+        (one call per layout group).  Other PyTorch models are
+        differentiated twice with autograd through the loaded module.
+        Raises ``NotImplementedError`` for backends without a PyTorch model
+        (TensorFlow, JAX), so callers can fall back to finite differences.
+        """
+        dp = self.calculator.dp
+        deep_eval = dp.deep_eval
+        plan = self._make_plan(batch_atoms_list)
+        out = [None] * len(batch_atoms_list)
+
+        if deep_eval.get_has_hessian():
+            for key, idx, types in plan:
+                coords, cells = self._buffers_for(key, len(idx), len(types))
+                for j, k in enumerate(idx):
+                    coords[j] = batch_atoms_list[k].positions.reshape(-1)
+                    cells[j] = batch_atoms_list[k].cell.array.reshape(-1)
+                H = np.asarray(dp.eval(coords, cells, types)[-1])
+                for j, k in enumerate(idx):
+                    out[k] = H[j].reshape(3 * len(types), 3 * len(types))
+            return out
+
+        module = getattr(deep_eval, "dp", None)
+        if module is None or not hasattr(module, "parameters"):
+            raise NotImplementedError(
+                f"no PyTorch model behind {type(deep_eval).__name__}")
+        import torch
+        from deepmd.pt.utils.env import DEVICE, GLOBAL_PT_FLOAT_PRECISION
+
+        for key, idx, types in plan:
+            atype = torch.as_tensor(np.asarray(types)[None, :],
+                                    dtype=torch.long, device=DEVICE)
+            for k in idx:
+                atoms = batch_atoms_list[k]
+                box = torch.as_tensor(atoms.cell.array[None],
+                                      dtype=GLOBAL_PT_FLOAT_PRECISION,
+                                      device=DEVICE)
+
+                def energy(x, atype=atype, box=box):
+                    result = module(x.view(1, -1, 3), atype, box=box)
+                    if isinstance(result, tuple):
+                        result = result[0]
+                    return result["energy"].sum()
+
+                out[k] = autograd_hessian(energy, atoms.positions,
+                                          dtype=GLOBAL_PT_FLOAT_PRECISION,
+                                          device=DEVICE)
+        return out
+
+
+def autograd_hessian(energy, positions, dtype=None, device=None):
+    """Hessian of ``energy(x)`` (a torch scalar of the flattened (3N,)
+    positions tensor ``x``) at ``positions``, as a (3N, 3N) ndarray.
+
+    One backward pass gives the gradient with its graph; the second
+    derivative is taken for all 3N rows at once (``is_grads_batched``),
+    falling back to one backward pass per row for models vmap cannot
+    trace.
+    """
+    import torch
+
+    x = torch.tensor(np.asarray(positions).reshape(-1), dtype=dtype,
+                     device=device, requires_grad=True)
+    grad, = torch.autograd.grad(energy(x), x, create_graph=True)
+    eye = torch.eye(x.numel(), dtype=x.dtype, device=x.device)
+    try:
+        H, = torch.autograd.grad(grad, x, eye, retain_graph=True,
+                                 is_grads_batched=True)
+    except RuntimeError:
+        H = torch.stack([torch.autograd.grad(grad, x, row,
+                                             retain_graph=True)[0]
+                         for row in eye])
+    return H.detach().cpu().numpy()
 
 
 def batch_calculator_deepmd(batch_atoms_list, calculator):
@@ -43,51 +257,17 @@ def batch_calculator_deepmd(batch_atoms_list, calculator):
       - forces_list:       list of B arrays, each (N_i, 3)
       - stress_voigt_list: list of B arrays, each (6,) in ASE convention
 
-    DP's virial v satisfies stress = -v / volume (ASE sign convention).
-    """
-    import time
-
-    # ---- diagnostic: structure layout ----
-    atom_counts = [len(a) for a in batch_atoms_list]
-    symbol_sigs = [tuple(a.get_chemical_symbols()) for a in batch_atoms_list]
-    unique_counts = sorted(set(atom_counts))
-    unique_sigs = len(set(symbol_sigs))
-    print(f"[batch_calc] B={len(batch_atoms_list)}  unique_atom_counts={unique_counts}  "
-          f"unique_symbol_layouts={unique_sigs}")
-    if len(unique_counts) > 1 or unique_sigs > 1:
-        print("[batch_calc] WARNING: heterogeneous batch — build_batch_deepmd assumes "
-              "all structures share crystals[0]'s symbols/length. eval() may error or "
-              "silently fall back to per-structure evaluation.")
+    Mixed batches (different atom counts or orderings, e.g. variable
+    composition or mixed Z') are grouped by layout signature with one
+    ``dp.eval`` per group, and results are scattered back into the
+    original batch order.
 
-    coords, cells, types = build_batch_deepmd(batch_atoms_list, calculator.type_dict)
-
-    abs_obj = calculator.dp.deep_eval.auto_batch_size
-    print(f"[batch_calc] BEFORE eval  current={abs_obj.current_batch_size}  "
-          f"max_working={abs_obj.maximum_working_batch_size}  "
-          f"min_not_working={abs_obj.minimal_not_working_batch_size}")
-
-    # abs_obj.current_batch_size = 128
-    print(f"[batch_calc] forced current_batch_size=128")
-
-    t0 = time.perf_counter()
-    E, F, V = calculator.dp.eval(coords, cells, types)[:3]
-    dt = time.perf_counter() - t0
-
-    print(f"[batch_calc] AFTER eval   current={abs_obj.current_batch_size}  "
-          f"max_working={abs_obj.maximum_working_batch_size}  "
-          f"min_not_working={abs_obj.minimal_not_working_batch_size}")
-    print(f"[batch_calc] eval() wall time: {dt:.3f}s  ({dt/len(batch_atoms_list)*1000:.1f} ms/struct)")
-
-    energies = np.asarray(E).reshape(-1)
-    forces_list, stress_voigt = [], []
-    for k, at in enumerate(batch_atoms_list):
-        forces_list.append(np.asarray(F[k]).reshape(-1, 3))
-        virial = np.asarray(V[k]).reshape(3, 3)
-        stress_3x3 = -virial / at.get_volume()
-        stress_3x3 = 0.5 * (stress_3x3 + stress_3x3.T)
-        stress_voigt.append(full_3x3_to_voigt_6_stress(stress_3x3))
+    DP's virial v satisfies stress = -v / volume (ASE sign convention).
 
-    return energies, forces_list, stress_voigt
+    One-shot form with diagnostics; optimizers that call the evaluator
+    every step should hold a :class:`DeepMDBatchEvaluator` instead.
+    """
+    return DeepMDBatchEvaluator(calculator, verbose=True)(batch_atoms_list)
 
 
 # Persistent multiprocessing pool for DeepMD parallel evaluation.
@@ -99,39 +279,196 @@ _dp_pool = None
 _dp_pool_key = None
 
 
-def _dp_worker_init(model_path: str, device: str) -> None:
-    """Run once per worker process at startup. Loads one DP into the worker."""
+def _dp_worker_init(model_path: str, device: str,
+                    n_threads: int | None = None) -> None:
+    """Run once per worker process at startup. Loads one DP into the worker.
+
+    `n_threads` caps the intra-op threads of each worker (OMP/MKL and
+    torch), so process parallelism x intra-process threads can be matched
+    to the core count.
+    """
     global _worker_dp, _worker_type_dict
+    if n_threads is not None:
+        import os
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS",
+                    "DP_INTRA_OP_PARALLELISM_THREADS"):
+            os.environ[var] = str(n_threads)
+        os.environ["DP_INTER_OP_PARALLELISM_THREADS"] = "1"
     from deepmd.calculator import DP
     _worker_dp = DP(model=model_path, device=device)
-    # Pin auto_batch_size to 1 — each task is a single frame, no need to
-    # search for a larger batch (we never call eval with multiple frames).
-    _worker_dp.dp.deep_eval.auto_batch_size.current_batch_size = 1
+    if n_threads is not None:
+        try:
+            import torch
+            torch.set_num_threads(n_threads)
+        except ImportError:
+            pass
     _worker_type_dict = _worker_dp.type_dict
 
 
-def _dp_eval_chunk(chunk):
+def _dp_eval_chunk(chunk, batched=True):
     """Evaluate a list of (orig_idx, atoms) tuples inside a worker process.
 
+    Frames are grouped by layout and each group is evaluated with ONE
+    batched ``dp.eval`` call, like ``batch_calculator_deepmd`` in-process
+    (``batched=False``: one call per frame).
     Returns a list of (orig_idx, energy, forces, stress_voigt) tuples so the
     caller can scatter back into the original batch order.
     """
     global _worker_dp, _worker_type_dict
+    atoms_list = [atoms for _, atoms in chunk]
+    if batched:
+        groups = list(group_by_layout(atoms_list).values())
+    else:
+        groups = [[k] for k in range(len(atoms_list))]
     out = []
-    for idx, atoms in chunk:
-        coords = atoms.get_positions().reshape(1, -1)
-        cells = atoms.get_cell().reshape(1, -1)
-        types = np.array([_worker_type_dict[s] for s in atoms.get_chemical_symbols()])
+    for idx in groups:
+        group = [atoms_list[k] for k in idx]
+        coords, cells, types = build_batch_deepmd(group, _worker_type_dict)
         E, F, V = _worker_dp.dp.eval(coords, cells, types)[:3]
-        energy = float(np.asarray(E).reshape(-1)[0])
-        forces = np.asarray(F[0]).reshape(-1, 3)
-        virial = np.asarray(V[0]).reshape(3, 3)
-        stress_3x3 = -virial / atoms.get_volume()
-        stress_3x3 = 0.5 * (stress_3x3 + stress_3x3.T)
-        out.append((idx, energy, forces, full_3x3_to_voigt_6_stress(stress_3x3)))
+        E = np.asarray(E).reshape(-1)
+        F = np.asarray(F).reshape(len(idx), -1, 3)
+        S = _virials_to_voigt(np.asarray(V), cells.reshape(-1, 3, 3))
+        for j, k in enumerate(idx):
+            out.append((chunk[k][0], float(E[j]), F[j], S[j]))
     return out
 
 
+# ---- shared-memory transport ------------------------------------------------
+# The parent writes positions / cells / types of the whole batch into one
+# SharedMemory block; workers evaluate a contiguous [start, stop) range and
+# write energies / forces / virials back in place.  Only (block name, shape,
+# range) tuples cross the process boundary.  The block is sized by
+# (capacity frames, nmax atoms per frame) and reallocated when outgrown.
+_SHM_FIELDS = (
+    # name, per-frame shape as a function of nmax, dtype
+    ('natoms', lambda n: (), np.int64),
+    ('types', lambda n: (n,), np.int64),
+    ('coords', lambda n: (n, 3), np.float64),
+    ('cells', lambda n: (9,), np.float64),
+    ('energies', lambda n: (), np.float64),
+    ('forces', lambda n: (n, 3), np.float64),
+    ('virials', lambda n: (9,), np.float64),
+)
+
+
+def _shm_layout(capacity, nmax):
+    """[(name, shape, dtype, offset)] of every field, plus the total size."""
+    layout, offset = [], 0
+    for name, frame_shape, dtype in _SHM_FIELDS:
+        shape = (capacity, *frame_shape(nmax))
+        layout.append((name, shape, dtype, offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return layout, offset
+
+
+def _shm_views(buf, capacity, nmax):
+    layout, _ = _shm_layout(capacity, nmax)
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+            for name, shape, dtype, offset in layout}
+
+
+class _DPSharedBatch:
+    """Parent-side owner of the shared batch block."""
+
+    def __init__(self):
+        self.shm = None
+        self.capacity = 0
+        self.nmax = 0
+        self.views = None
+
+    def ensure(self, n_frames, nmax):
+        if (self.shm is not None and n_frames <= self.capacity
+                and nmax <= self.nmax):
+            return self.views
+        capacity = max(n_frames, self.capacity)
+        nmax = max(nmax, self.nmax)
+        self.close()
+        _, nbytes = _shm_layout(capacity, nmax)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+        self.capacity, self.nmax = capacity, nmax
+        self.views = _shm_views(self.shm.buf, capacity, nmax)
+        return self.views
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.views = None          # drop buffer exports before closing
+        try:
+            self.shm.close()
+        except BufferError:
+            pass
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        self.shm = None
+        self.capacity = self.nmax = 0
+
+
+_dp_shm = _DPSharedBatch()
+_worker_shm = None             # (name, SharedMemory, views) inside a worker
+
+
+def _attach_shm(name, capacity, nmax):
+    """Worker side: attach to (and cache) the parent's current block."""
+    global _worker_shm
+    if _worker_shm is None or _worker_shm[0] != name:
+        if _worker_shm is not None:
+            old_shm = _worker_shm[1]
+            _worker_shm = None         # releases the views on the old buffer
+            old_shm.close()
+        shm = shared_memory.SharedMemory(name=name)
+        _worker_shm = (name, shm, _shm_views(shm.buf, capacity, nmax))
+    return _worker_shm[2]
+
+
+def _dp_eval_shm(task):
+    """Evaluate frames [start, stop) of the shared block inside a worker,
+    one batched ``dp.eval`` per layout found in the range (or one per frame
+    when the task's `batched` flag is off)."""
+    global _worker_dp
+    name, capacity, nmax, start, stop, batched = task
+    v = _attach_shm(name, capacity, nmax)
+    groups = {}
+    for k in range(start, stop):
+        n = int(v['natoms'][k])
+        key = v['types'][k, :n].tobytes() if batched else k
+        groups.setdefault(key, []).append(k)
+    for idx in groups.values():
+        idx = np.asarray(idx)
+        n = int(v['natoms'][idx[0]])
+        E, F, V = _worker_dp.dp.eval(v['coords'][idx, :n].reshape(len(idx), -1),
+                                     v['cells'][idx],
+                                     v['types'][idx[0], :n])[:3]
+        v['energies'][idx] = np.asarray(E).reshape(-1)
+        v['forces'][idx, :n] = np.asarray(F).reshape(len(idx), n, 3)
+        v['virials'][idx] = np.asarray(V).reshape(len(idx), 9)
+    return stop - start
+
+
+def _shm_write_batch(batch_atoms_list, type_dict):
+    """Parent side: copy the batch inputs into the shared block."""
+    B = len(batch_atoms_list)
+    v = _dp_shm.ensure(B, max(len(a) for a in batch_atoms_list))
+    for k, atoms in enumerate(batch_atoms_list):
+        n = len(atoms)
+        v['natoms'][k] = n
+        v['types'][k, :n] = layout_types(atoms, type_dict)
+        v['coords'][k, :n] = atoms.positions
+        v['cells'][k] = atoms.cell.array.reshape(-1)
+    return v
+
+
+def _shm_read_results(batch_atoms_list, v):
+    B = len(batch_atoms_list)
+    energies = v['energies'][:B].copy()
+    forces_list = [v['forces'][k, :len(a)].copy()
+                   for k, a in enumerate(batch_atoms_list)]
+    stress = _virials_to_voigt(v['virials'][:B],
+                               v['cells'][:B].reshape(-1, 3, 3))
+    return energies, forces_list, list(stress)
+
+
 def _shutdown_dp_pool() -> None:
     global _dp_pool, _dp_pool_key
     if _dp_pool is not None:
@@ -144,11 +481,13 @@ def _shutdown_dp_pool() -> None:
 
 
 atexit.register(_shutdown_dp_pool)
+atexit.register(_dp_shm.close)
 
 
-def _ensure_dp_pool(n_workers: int, model_path: str, device: str):
+def _ensure_dp_pool(n_workers: int, model_path: str, device: str,
+                    n_threads: int | None = None):
     global _dp_pool, _dp_pool_key
-    key = (n_workers, str(model_path), device)
+    key = (n_workers, str(model_path), device, n_threads)
     if _dp_pool is None or _dp_pool_key != key:
         _shutdown_dp_pool()
         ctx = mp.get_context('spawn')  # spawn required: fork breaks CUDA contexts
@@ -156,24 +495,37 @@ def _ensure_dp_pool(n_workers: int, model_path: str, device: str):
             max_workers=n_workers,
             mp_context=ctx,
             initializer=_dp_worker_init,
-            initargs=(str(model_path), device),
+            initargs=(str(model_path), device, n_threads),
         )
         _dp_pool_key = key
     return _dp_pool
 
 
-def batch_calculator_deepmd_mp(batch_atoms_list, calculator, n_workers=4):
-    """Multiprocessing per-structure evaluator for DeepMD `DP`.
+def batch_calculator_deepmd_mp(batch_atoms_list, calculator, n_workers=4,
+                               transport='shm', threads_per_worker=None,
+                               worker_batching=True):
+    """Multiprocessing batched evaluator for DeepMD `DP`.
 
     Splits the batch into n_workers chunks and dispatches each to a persistent
     worker process. Each worker owns its own DP instance and CUDA context, so
     `dp.eval` calls run with the same isolation as N separate Python processes
     — sidestepping the GIL and single-context cuBLAS/allocator serialization
-    that defeated the threaded version.
+    that defeated the threaded version. Inside a worker the chunk is
+    evaluated as one batched `dp.eval` per layout (hybrid process + batch
+    parallelism); `threads_per_worker` sets each worker's thread count and
+    ``worker_batching=False`` restores frame-by-frame evaluation (kept for
+    benchmarking, see scripts/experiments/benchmark_deepmd_pool.py).
 
     The pool is built on first call and reused thereafter, so the (large)
     spawn + DP-load cost is paid once per Python session.
 
+    ``transport='shm'`` (default) moves the per-step data through a
+    ``multiprocessing.shared_memory`` block: positions, cells and cached
+    type arrays are written there by the parent, workers write energies,
+    forces and virials back in place, and only (block, range) index tuples
+    are pickled.  ``transport='pickle'`` sends whole ``ase.Atoms`` objects
+    and returns pickled arrays, as before.
+
     Results are returned in the original batch order.
     """
     import time
@@ -200,30 +552,46 @@ def batch_calculator_deepmd_mp(batch_atoms_list, calculator, n_workers=4):
 
     n_workers = max(1, min(n_workers, B))
 
-    pool_was_cold = _dp_pool is None or _dp_pool_key != (n_workers, str(model_path), device)
+    pool_key = (n_workers, str(model_path), device, threads_per_worker)
+    pool_was_cold = _dp_pool is None or _dp_pool_key != pool_key
     t_pool = time.perf_counter()
-    pool = _ensure_dp_pool(n_workers, model_path, device)
+    pool = _ensure_dp_pool(n_workers, model_path, device, threads_per_worker)
     if pool_was_cold:
         print(f"[batch_calc_mp] spawning {n_workers} worker processes on {device} "
-              f"(model load happens lazily on first task)...")
+              f"(threads/worker={threads_per_worker or 'default'}; "
+              f"model load happens lazily on first task)...")
 
     chunks = [list(idxs) for idxs in np.array_split(np.arange(B), n_workers)]
     chunks = [c for c in chunks if len(c) > 0]
-    payloads = [[(int(i), batch_atoms_list[int(i)]) for i in c] for c in chunks]
-
-    energies = np.empty(B)
-    forces_list = [None] * B
-    stress_voigt = [None] * B
 
     t0 = time.perf_counter()
-    futures = [pool.submit(_dp_eval_chunk, p) for p in payloads]
-    for fut in concurrent.futures.as_completed(futures):
-        for idx, energy, forces, stress in fut.result():
-            energies[idx] = energy
-            forces_list[idx] = forces
-            stress_voigt[idx] = stress
+    if transport == 'shm':
+        v = _shm_write_batch(batch_atoms_list, calculator.type_dict)
+        tasks = [(_dp_shm.shm.name, _dp_shm.capacity, _dp_shm.nmax,
+                  int(c[0]), int(c[-1]) + 1, worker_batching) for c in chunks]
+        futures = [pool.submit(_dp_eval_shm, t) for t in tasks]
+        for fut in concurrent.futures.as_completed(futures):
+            fut.result()
+        energies, forces_list, stress_voigt = _shm_read_results(
+            batch_atoms_list, v)
+    elif transport == 'pickle':
+        payloads = [[(int(i), batch_atoms_list[int(i)]) for i in c]
+                    for c in chunks]
+        energies = np.empty(B)
+        forces_list = [None] * B
+        stress_voigt = [None] * B
+        futures = [pool.submit(_dp_eval_chunk, p, worker_batching)
+                   for p in payloads]
+        for fut in concurrent.futures.as_completed(futures):
+            for idx, energy, forces, stress in fut.result():
+                energies[idx] = energy
+                forces_list[idx] = forces
+                stress_voigt[idx] = stress
+    else:
+        raise ValueError(f"unknown transport {transport!r} "
+                         f"(expected 'shm' or 'pickle')")
     dt = time.perf_counter() - t0
-    print(f"[batch_calc_mp] B={B} workers={len(chunks)}  "
+    print(f"[batch_calc_mp] B={B} workers={len(chunks)} transport={transport}  "
           f"wall={dt:.3f}s  ({dt / B * 1000:.1f} ms/struct)"
           + (f"  (cold-start incl. worker init: {time.perf_counter() - t_pool:.2f}s)"
              if pool_was_cold else ""))
@@ -0,0 +1,188 @@
+"""Batched q-mesh phonon ZPE / free energies through phonopy.
+
+Gamma-point vibrations (``ea.parallel.zpe``) miss the phonon dispersion of
+small cells.  ``ParallelPhonons`` runs phonopy's finite-displacement method
+for many structures at once: phonopy generates the symmetry-reduced
+displaced supercells of every structure, all of them go through the usual
+batch evaluator interface::
+
+    batch_evaluator(atoms_list) -> (energies, forces_list, stress_voigt_list)
+
+in full calls (``batch_size`` supercells, optionally at most ``max_atoms``
+atoms per call), and the zero-point and Helmholtz free energies are array
+reductions over the q-mesh frequencies of each structure.
+
+phonopy is imported lazily, so this module can be imported without it.
+"""
+
+import sys
+from collections.abc import Callable
+from typing import List, Optional, Sequence
+
+import numpy as np
+from ase import Atoms
+from ase.units import kB
+
+from ea.parallel.zpe import PACK_BATCH_SIZE
+
+THZ_TO_EV = 4.135667696e-3      # h * 1 THz in eV
+SUPERCELL_LENGTH = 10.0         # A, minimum supercell lattice vector length
+MESH_LENGTH = 30.0              # phonopy q-mesh sampling length (A)
+SYMPREC = 1e-5
+FREQ_CUTOFF = 1e-3              # THz; lower (acoustic at Gamma, imaginary) skipped
+
+
+def supercell_for(atoms, length=SUPERCELL_LENGTH):
+    """Diagonal supercell multiples giving lattice vectors >= `length`."""
+    lengths = atoms.cell.lengths()
+    return [max(1, int(np.ceil(length / L))) for L in lengths]
+
+
+def _to_phonopy(atoms):
+    from phonopy.structure.atoms import PhonopyAtoms
+
+    return PhonopyAtoms(symbols=atoms.get_chemical_symbols(),
+                        cell=atoms.cell.array,
+                        scaled_positions=atoms.get_scaled_positions())
+
+
+def _to_ase(patoms):
+    return Atoms(symbols=patoms.symbols, cell=patoms.cell,
+                 scaled_positions=patoms.scaled_positions, pbc=True)
+
+
+class ParallelPhonons:
+    """phonopy force constants and q-mesh thermodynamics for many
+    structures, with every displaced supercell evaluated in batches.
+
+    Parameters
+    ----------
+    atoms_list:
+        Relaxed structures (unit cells).
+    batch_evaluator:
+        Callable ``(atoms_list) -> (E, forces_list, stress_voigt_list)``.
+    supercell_matrix:
+        Supercell of every structure; ``None`` picks, per structure, the
+        smallest diagonal one with lattice vectors >= ``SUPERCELL_LENGTH``.
+    distance:
+        Displacement length in A.
+    symprec:
+        phonopy symmetry tolerance (fewer displacements for symmetric cells).
+    mesh:
+        q-mesh numbers ``(n1, n2, n3)`` or a phonopy sampling length.
+    batch_size, max_atoms:
+        Supercells per evaluator call, and optional cap on the atoms per call.
+    """
+
+    def __init__(self,
+                 atoms_list: Sequence[Atoms],
+                 batch_evaluator: Callable,
+                 supercell_matrix=None,
+                 distance: float = 0.01,
+                 symprec: float = SYMPREC,
+                 mesh=MESH_LENGTH,
+                 batch_size: int = PACK_BATCH_SIZE,
+                 max_atoms: Optional[int] = None):
+        from phonopy import Phonopy
+
+        self.atoms_list = [a.copy() for a in atoms_list]
+        self.batch_evaluator = batch_evaluator
+        self.distance = distance
+        self.mesh = mesh
+        self.batch_size = batch_size
+        self.max_atoms = max_atoms
+
+        self.phonons = []
+        for atoms in self.atoms_list:
+            matrix = (supercell_for(atoms) if supercell_matrix is None
+                      else supercell_matrix)
+            phonon = Phonopy(_to_phonopy(atoms), supercell_matrix=matrix,
+                             symprec=symprec)
+            phonon.generate_displacements(distance=float(distance))
+            self.phonons.append(phonon)
+        self._freqs: List[Optional[np.ndarray]] = [None] * len(self.phonons)
+        self._weights: List[Optional[np.ndarray]] = [None] * len(self.phonons)
+
+    # ------------------------------------------------------------------- run
+
+    def run(self):
+        """Evaluate every displaced supercell of every structure and build
+        the force constants."""
+        work = [(k, j, _to_ase(sc))
+                for k, phonon in enumerate(self.phonons)
+                for j, sc in enumerate(phonon.supercells_with_displacements)]
+        forces = [np.empty((len(p.supercells_with_displacements),
+                            len(p.supercell), 3)) for p in self.phonons]
+        total = len(work)
+        start = 0
+        while start < total:
+            stop, n_atoms = start, 0
+            while stop < total and stop - start < self.batch_size:
+                n = len(work[stop][2])
+                if (self.max_atoms is not None and stop > start
+                        and n_atoms + n > self.max_atoms):
+                    break
+                n_atoms += n
+                stop += 1
+            print(f"[ParallelPhonons] displaced supercells "
+                  f"{start + 1}-{stop}/{total} ({n_atoms} atoms)")
+            _, F_list, _ = self.batch_evaluator(
+                [item[2] for item in work[start:stop]])
+            for (k, j, _), F in zip(work[start:stop], F_list):
+                forces[k][j] = np.asarray(F).reshape(-1, 3)
+            start = stop
+
+        for phonon, F in zip(self.phonons, forces):
+            phonon.forces = F
+            phonon.produce_force_constants()
+        self._freqs = [None] * len(self.phonons)
+
+    # ------------------------------------------------------------------ mesh
+
+    def _mesh(self, k):
+        if self._freqs[k] is None:
+            phonon = self.phonons[k]
+            # Gamma-centred: keeps the point-group reduction of the mesh
+            phonon.run_mesh(self.mesh, is_gamma_center=True)
+            self._freqs[k] = np.asarray(phonon.mesh.frequencies)  # (nq, nmodes)
+            self._weights[k] = np.asarray(phonon.mesh.weights, dtype=float)
+        return self._freqs[k], self._weights[k]
+
+    def _mode_energies(self, k):
+        """Mode energies h*nu (eV) with the skipped modes masked to 0, and
+        the normalized q-point weights."""
+        freqs, weights = self._mesh(k)
+        energies = np.where(freqs > FREQ_CUTOFF, freqs * THZ_TO_EV, 0.0)
+        return energies, weights / weights.sum()
+
+    def get_zero_point_energies(self) -> List[float]:
+        """Mesh-averaged ZPE per unit cell (eV)."""
+        out = []
+        for k in range(len(self.phonons)):
+            energies, w = self._mode_energies(k)
+            out.append(float(0.5 * w @ energies.sum(axis=1)))
+        return out
+
+    def get_free_energies(self, temperature: float) -> List[float]:
+        """Harmonic Helmholtz free energy per unit cell (eV) at
+        `temperature` (K), zero point included."""
+        out = []
+        for k in range(len(self.phonons)):
+            energies, w = self._mode_energies(k)
+            F = 0.5 * energies
+            if temperature > 0:
+                active = energies > 0
+                x = np.where(active, energies, 1.0) / (kB * temperature)
+                F = F + np.where(active,
+                                 kB * temperature * np.log1p(-np.exp(-x)),
+                                 0.0)
+            out.append(float(w @ F.sum(axis=1)))
+        return out
+
+    def summary(self, log=sys.stdout):
+        for k, zpe in enumerate(self.get_zero_point_energies()):
+            phonon = self.phonons[k]
+            log.write(f"--- Structure {k}: supercell "
+                      f"{np.diag(phonon.supercell_matrix).tolist()}, "
+                      f"{len(phonon.supercells_with_displacements)} "
+                      f"displacements, mesh ZPE {zpe:.4f} eV\n")
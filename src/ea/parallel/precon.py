@@ -0,0 +1,197 @@
+"""Batched Exp preconditioning for the ``ea.parallel`` optimizers.
+
+Molecular crystals combine very stiff intramolecular bonds with soft
+intermolecular modes, so plain L-BFGS/FIRE on the FrechetCellFilter DOFs
+needs tiny steps and many iterations.  ``ExpPrecon`` is the
+``ase.optimize.precon.Exp`` preconditioner for one structure::
+
+    P_ij = -mu exp(-A (r_ij / r_NN - 1))     (r_ij < r_cut = 2 r_NN)
+    P_ii = -sum_j P_ij + mu c_stab           (cell rows: mu_c)
+
+acting on the (N + 3, 3) filter DOFs.  The optimizers use ``P^-1 f`` in
+place of the forces (FIRE) or of ``H0 * q`` in the two-loop recursion
+(L-BFGS).
+
+Per structure the neighbor list, the sparse matrix and its LU factorization
+are kept until some atom has moved more than ``skin`` (0.5 r_NN, ASE's
+rebuild criterion) since they were built.  Because P is a scalar matrix per
+atom pair, the (N + 3) x (N + 3) matrix is factorized once and applied to
+all three Cartesian columns, instead of ASE's 3N x 3N Kronecker form.
+
+``estimate_mu`` fits ``mu`` and ``mu_c`` of a whole batch with ASE's sine
+perturbation and ONE extra ``batch_evaluator`` call.
+"""
+
+from collections.abc import Callable
+
+import numpy as np
+from ase.filters import FrechetCellFilter
+from ase.neighborlist import neighbor_list
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+PRECON_A = 3.0
+C_STAB = 0.1
+
+
+def _inject(atoms, energy, forces, stress_voigt):
+    # local import: FIRE_parallel imports this module
+    from ea.parallel.FIRE_parallel import _inject_results
+
+    _inject_results(atoms, energy, forces, stress_voigt)
+
+
+def nearest_neighbour_distance(atoms):
+    """Mean nearest-neighbour distance of `atoms` (ASE's r_NN estimate)."""
+    cutoff = 2.0
+    while True:
+        i, d = neighbor_list('id', atoms, cutoff)
+        nearest = np.full(len(atoms), np.inf)
+        np.minimum.at(nearest, i, d)
+        if np.isfinite(nearest).all():
+            return float(nearest.mean())
+        cutoff *= 1.5
+
+
+class ExpPrecon:
+    """Exp preconditioner of one structure's FrechetCellFilter DOFs.
+
+    ``mu`` / ``mu_c`` of None are fitted by ``estimate_mu``; until then the
+    preconditioner is built with 1.0.
+    """
+
+    def __init__(self, A=PRECON_A, r_cut=None, r_NN=None, mu=None, mu_c=None,
+                 c_stab=C_STAB, skin=None):
+        self.A = A
+        self.r_cut = r_cut
+        self.r_NN = r_NN
+        self.mu = mu
+        self.mu_c = mu_c
+        self.c_stab = c_stab
+        self.skin = skin
+        self.P = None
+        self.n_builds = 0
+        self._lu = None
+        self._built_at = None
+
+    def _setup(self, atoms):
+        if self.r_NN is None:
+            self.r_NN = nearest_neighbour_distance(atoms)
+        if self.r_cut is None:
+            self.r_cut = 2.0 * self.r_NN
+        if self.skin is None:
+            self.skin = 0.5 * self.r_NN
+
+    def build(self, atoms):
+        """(Re)build the neighbor list, P and its factorization at the
+        current geometry of `atoms`."""
+        self._setup(atoms)
+        mu = 1.0 if self.mu is None else self.mu
+        mu_c = 1.0 if self.mu_c is None else self.mu_c
+        n = len(atoms)
+        i, j, d = neighbor_list('ijd', atoms, self.r_cut)
+        coeff = -mu * np.exp(-self.A * (d / self.r_NN - 1.0))
+        diag = np.concatenate([np.bincount(i, -coeff, minlength=n)
+                               + mu * self.c_stab, np.full(3, mu_c)])
+        idx = np.arange(n + 3)
+        self.P = sparse.csc_matrix(
+            (np.concatenate([coeff, diag]),
+             (np.concatenate([i, idx]), np.concatenate([j, idx]))),
+            shape=(n + 3, n + 3))
+        self._lu = splu(self.P)
+        self._built_at = atoms.get_positions()
+        self.n_builds += 1
+
+    def update(self, atoms):
+        """Build on first use or once an atom moved more than ``skin``;
+        returns True if P was rebuilt."""
+        if self.P is not None:
+            moved = np.linalg.norm(atoms.positions - self._built_at, axis=1)
+            if moved.max() <= self.skin:
+                return False
+        self.build(atoms)
+        return True
+
+    def solve(self, forces):
+        """P^-1 applied to (N + 3, 3) filter forces."""
+        return self._lu.solve(np.asarray(forces, dtype=float).reshape(-1, 3))
+
+    def dot(self, x):
+        return self.P @ np.asarray(x, dtype=float).reshape(-1, 3)
+
+
+def make_precon(precon):
+    """Fresh per-structure preconditioner for the ``precon`` option of the
+    batched optimizers: None or ``'Exp'``."""
+    if precon is None:
+        return None
+    if precon == 'Exp':
+        return ExpPrecon()
+    raise ValueError(f"unknown precon={precon!r} (expected None or 'Exp')")
+
+
+def apply_precon(items, q, default=1.0):
+    """P^-1 applied to every row of the padded (len(items), width) array
+    `q`.
+
+    ``items[j]`` is the ``(precon, atoms, basis)`` of row j; ``basis`` (or
+    None) maps the row from symmetry-reduced to full filter DOFs and back.
+    Each preconditioner is first updated (rebuilt only beyond its skin).
+    Rows without a preconditioner are scaled by `default`.
+    """
+    z = default * q
+    for j, (precon, atoms, basis) in enumerate(items):
+        if precon is None:
+            continue
+        precon.update(atoms)
+        nd = 3 * (len(atoms) + 3) if basis is None else basis.shape[1]
+        qj = q[j, :nd] if basis is None else basis @ q[j, :nd]
+        zj = precon.solve(qj).ravel()
+        z[j, :nd] = zj if basis is None else zj @ basis
+    return z
+
+
+def estimate_mu(items, batch_evaluator: Callable):
+    """Fit ``mu`` and ``mu_c`` of every ``(precon, filter, force_vec)`` in
+    `items` (``force_vec``: current (N + 3, 3) filter forces, with the
+    filter's deformation still the identity) from one batched evaluation.
+
+    Mirrors ``SparsePrecon.estimate_mu``: with the sine perturbation
+    ``v = H sin(x / L)`` (cell rows ``H / r_NN``),
+    ``(g(p + v) - g(p)) . v = mu <P1 v, v>`` is solved separately for the
+    atom and the cell rows; both are capped below at 1.
+    """
+    if not items:
+        return
+    perturbed, vs = [], []
+    for precon, flt, _ in items:
+        atoms = flt.atoms
+        precon._setup(atoms)
+        n = len(atoms)
+        p = atoms.get_positions()
+        H = 1e-2 * precon.r_NN * np.eye(3)
+        L = np.ptp(p, axis=0)
+        H[L == 0, L == 0] = 0.0
+        sine = np.sin(p / np.where(L > 0, L, 1.0))
+        v = np.zeros((n + 3, 3))
+        v[:n] = sine @ H.T
+        v[n:] = H / precon.r_NN
+        moved = atoms.copy()
+        moved_flt = FrechetCellFilter(moved)
+        moved_flt.set_positions(moved_flt.get_positions() + v)
+        perturbed.append(moved_flt)
+        vs.append(v.ravel())
+
+    E, F_list, S_list = batch_evaluator([f.atoms for f in perturbed])
+    for k, ((precon, flt, force_vec), moved_flt, v) in enumerate(
+            zip(items, perturbed, vs)):
+        _inject(moved_flt.atoms, E[k], F_list[k], S_list[k])
+        lhs = (np.asarray(force_vec).ravel()
+               - moved_flt.get_forces().ravel()) * v
+        precon.mu = precon.mu_c = 1.0
+        precon.build(flt.atoms)
+        rhs = precon.dot(v).ravel() * v
+        n3 = 3 * len(flt.atoms)
+        precon.mu = max(1.0, float(lhs[:n3].sum() / rhs[:n3].sum()))
+        precon.mu_c = max(1.0, float(lhs[n3:].sum() / rhs[n3:].sum()))
+        precon.build(flt.atoms)
@@ -15,6 +15,21 @@ export OMP_NUM_THREADS=1
 uspex -r >> log
 """
 
+EA_SRC = Path(__file__).resolve().parents[2]
+USPEX26_DIR = EA_SRC / "ea" / "uspex" / "uspex26"
+
+# USPEX 26 runs attached to the shared evaluation service that launch_all.sh
+# starts (``--service``): one resident model and one batched relaxation for
+# every run instead of a worker + model copy per run.
+JOB_SH_SERVICE_CONTENT = f"""#!/bin/bash
+export MKL_NUM_THREADS=1
+export NUMEXPR_NUM_THREADS=1
+export OMP_NUM_THREADS=1
+
+python3 "{USPEX26_DIR / 'run_uspex26.py'}" --workdir "$PWD" \\
+    --service "${{EA_SERVICE:?start the runs through launch_all.sh}}" >> log 2>&1
+"""
+
 def copy_item(src: Path, dst: Path):
     """Copy file or directory if it exists."""
     if not src.exists():
@@ -25,13 +40,15 @@ def copy_item(src: Path, dst: Path):
     else:
         shutil.copy2(src, dst)
 
-def make_job_sh(dst_dir: Path, overwrite: bool = True):
+def make_job_sh(dst_dir: Path, overwrite: bool = True, service: bool = False):
     job = dst_dir / "job.sh"
     if overwrite or not job.exists():
-        job.write_text(JOB_SH_CONTENT, encoding="utf-8")
+        content = JOB_SH_SERVICE_CONTENT if service else JOB_SH_CONTENT
+        job.write_text(content, encoding="utf-8")
         os.chmod(job, 0o755)
 
-def create_runs(template_dir: Path, runs_dir: Path, count: int):
+def create_runs(template_dir: Path, runs_dir: Path, count: int,
+                service: bool = False):
     runs_dir.mkdir(parents=True, exist_ok=True)
 
     # Accept both capitalizations for the USPEX input
@@ -56,11 +73,30 @@ def create_runs(template_dir: Path, runs_dir: Path, count: int):
             copy_item(input_src, rd / input_src.name)
 
         # job.sh (as given)
-        make_job_sh(rd, overwrite=True)
+        make_job_sh(rd, overwrite=True, service=service)
 
     print(f"[OK] Created {count} run folders under: {runs_dir}")
 
-def write_launch_all(runs_dir: Path, tempfile , default_max_parallel: int = 50):
+SERVICE_START = f"""
+# One shared DeepMD evaluation service for every run (job.sh --service).
+export EA_SERVICE="${{EA_SERVICE:-${{TMPDIR:-/tmp}}/ea_service_$$.sock}}"
+PYTHONPATH="{EA_SRC}:${{PYTHONPATH:-}}" ${{EA_SERVICE_PY:-python3}} \\
+    "{USPEX26_DIR / 'daemon.py'}" "$EA_SERVICE" --multi >> service.log 2>&1 &
+SERVICE_PID=$!
+until [ -S "$EA_SERVICE" ]; do
+    kill -0 "$SERVICE_PID" 2>/dev/null || {{ echo "service failed, see service.log"; exit 1; }}
+    sleep 2
+done
+"""
+
+SERVICE_STOP = """
+# Stop the shared evaluation service (prints per-run accounting to service.log)
+kill $SERVICE_PID
+"""
+
+
+def write_launch_all(runs_dir: Path, tempfile , default_max_parallel: int = 50,
+                     service: bool = False):
     """Create a small xargs-based launcher with adjustable concurrency."""
     sh = runs_dir.parent / "launch_all.sh"
     sh_content_temp = f"""#!/usr/bin/env bash
@@ -102,6 +138,9 @@ find "{runs_dir}" -maxdepth 1 -type d -name 'run_*' | sort | \\
         sh_content = sh_content_temp
     else:
         sh_content = sh_content_notemp
+    if service:
+        head, sep, jobs = sh_content.partition("\n# Run each job")
+        sh_content = head + SERVICE_START + sep + jobs + SERVICE_STOP
     sh.write_text(sh_content, encoding="utf-8")
     os.chmod(sh, 0o755)
     print(f"[OK] Wrote launcher: {sh}  (usage: ./launch_all.sh 50)")
@@ -159,13 +198,17 @@ def main():
     ap.add_argument("--make-only", action="store_true", help="Only create folders; do not launch")
     ap.add_argument("--launch", action="store_true", help="Launch jobs after creating folders")
     ap.add_argument("--max-parallel", type=int, default=50, help="Max concurrent jobs if launching")
+    ap.add_argument("--service", action="store_true",
+                    help="USPEX 26 runs share one DeepMD evaluation service "
+                         "started by launch_all.sh (daemon.py --multi)")
     args = ap.parse_args()
 
     template_dir = Path(args.template).resolve()
     runs_dir = Path(args.runs_dir).resolve()
 
-    create_runs(template_dir, runs_dir, args.count)
-    write_launch_all(runs_dir, args.tempfile,  default_max_parallel=args.max_parallel)
+    create_runs(template_dir, runs_dir, args.count, service=args.service)
+    write_launch_all(runs_dir, args.tempfile,  default_max_parallel=args.max_parallel,
+                     service=args.service)
 
     if args.launch and not args.make_only:
         print(f"[RUN] Launching with max_parallel={args.max_parallel}")
@@ -0,0 +1,174 @@
+"""Persistent fingerprint-keyed cache of relaxation results.
+
+USPEX and the ASE GA keep proposing near-identical candidates (symmetric
+copies, re-seeded parents, ...) that the batched worker would otherwise
+re-relax from scratch.  ``RelaxationCache`` stores, per model key, the
+fingerprint of every relaxed *input* structure together with its relaxed
+geometry and final energy in an SQLite file, so any number of waves, runs
+and processes can share it.  A new input whose fingerprint is within
+``tol`` (cosine distance) of a cached input with the same atom sequence is
+a hit: the cached relaxed geometry and energy are published directly.
+
+The fingerprint is Oganov's, computed with ``OFPComparator`` and the
+settings ``EA_SEARCH.py`` uses to detect duplicates.  It is flattened into
+one weighted, normalized vector so that the comparator's cosine distance
+becomes ``0.5 * (1 - v1 . v2)`` and a lookup is one matrix-vector product
+over the candidates with the same model and atom sequence.  Requiring the
+same atom sequence (not just the composition) keeps the cached geometry
+valid for USPEX's order-preserving molecular interface.
+
+The cache holds at most ``max_entries`` results; beyond that the least
+recently used ones are evicted.
+"""
+
+import sqlite3
+import time
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+from ase.io import read, write
+
+# OFPComparator settings of EA_SEARCH.py
+OFP_SETTINGS = dict(rcut=10.0, binwidth=0.05, sigma=0.05, nsigma=4)
+COS_DIST_MAX = 1e-3
+MAX_ENTRIES = 100_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    sequence TEXT NOT NULL,
+    fp BLOB NOT NULL,
+    geometry TEXT NOT NULL,
+    energy REAL NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS entries_key ON entries (model, settings, sequence);
+CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_used);
+"""
+
+
+class RelaxationCache:
+    """SQLite cache of relaxed geometries/energies keyed by fingerprint.
+
+    Parameters
+    ----------
+    path:
+        SQLite file; created if missing.  Safe to share between processes.
+    model:
+        Model key the energies belong to (e.g. ``'deepmd_d3'``, or
+        ``'deepmd_d3+zpe'`` when the published energies include ZPE).
+    tol:
+        Maximum fingerprint cosine distance for a hit.
+    max_entries:
+        LRU capacity of the cache.
+    **ofp_settings:
+        Overrides of the ``OFPComparator`` fingerprint settings.
+    """
+
+    def __init__(self, path, model, tol=COS_DIST_MAX, max_entries=MAX_ENTRIES,
+                 **ofp_settings):
+        from ase.ga.ofp_comparator import OFPComparator
+
+        self.path = Path(path)
+        self.model = str(model)
+        self.tol = float(tol)
+        self.max_entries = int(max_entries)
+        settings = {**OFP_SETTINGS, **ofp_settings}
+        self.settings = ",".join(f"{k}={settings[k]}" for k in sorted(settings))
+        self.comparator = OFPComparator(pbc=[True, True, True], **settings)
+        self.hits = self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path), timeout=60.0)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    # ---- fingerprints -------------------------------------------------------
+
+    def fingerprint(self, atoms):
+        """Weighted, normalized OFP vector of ``atoms`` (float32)."""
+        fp, typedic = self.comparator._take_fingerprints(atoms)
+        keys = sorted(fp)
+        w = np.array([len(typedic[a]) * len(typedic[b]) for a, b in keys],
+                     dtype=float)
+        w /= w.sum()
+        v = np.concatenate([np.sqrt(wk) * np.ravel(fp[key])
+                            for wk, key in zip(w, keys)])
+        norm = np.linalg.norm(v)
+        return (v / norm if norm > 0 else v).astype(np.float32)
+
+    @staticmethod
+    def _sequence(atoms):
+        return atoms.get_chemical_formula(mode="all")
+
+    # ---- lookup / store -----------------------------------------------------
+
+    def lookup(self, atoms, fp=None):
+        """Return ``(relaxed_atoms, energy)`` of the closest cached input
+        within ``tol``, or None."""
+        if fp is None:
+            fp = self.fingerprint(atoms)
+        rows = self.db.execute(
+            "SELECT id, fp FROM entries WHERE model=? AND settings=? "
+            "AND sequence=?",
+            (self.model, self.settings, self._sequence(atoms)),
+        ).fetchall()
+        rows = [(i, blob) for i, blob in rows if len(blob) == fp.nbytes]
+        if not rows:
+            self.misses += 1
+            return None
+        fps = np.frombuffer(b"".join(blob for _, blob in rows),
+                            dtype=np.float32).reshape(len(rows), -1)
+        dist = 0.5 * (1.0 - fps @ fp)
+        best = int(np.argmin(dist))
+        if dist[best] >= self.tol:
+            self.misses += 1
+            return None
+
+        entry = rows[best][0]
+        geometry, energy = self.db.execute(
+            "SELECT geometry, energy FROM entries WHERE id=?", (entry,)
+        ).fetchone()
+        with self.db:
+            self.db.execute(
+                "UPDATE entries SET last_used=?, hits=hits+1 WHERE id=?",
+                (time.time(), entry),
+            )
+        self.hits += 1
+        return read(StringIO(geometry), format="extxyz"), float(energy)
+
+    def store(self, atoms_in, relaxed, energy, fp=None):
+        """Cache the relaxation ``atoms_in -> (relaxed, energy)``."""
+        if fp is None:
+            fp = self.fingerprint(atoms_in)
+        buf = StringIO()
+        write(buf, relaxed.copy(), format="extxyz")
+        now = time.time()
+        with self.db:
+            self.db.execute(
+                "INSERT INTO entries (model, settings, sequence, fp, geometry,"
+                " energy, created, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.model, self.settings, self._sequence(atoms_in),
+                 np.ascontiguousarray(fp, dtype=np.float32).tobytes(),
+                 buf.getvalue(), float(energy), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        n = self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if n > self.max_entries:
+            self.db.execute(
+                "DELETE FROM entries WHERE id IN (SELECT id FROM entries "
+                "ORDER BY last_used ASC LIMIT ?)", (n - self.max_entries,),
+            )
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def close(self):
+        self.db.close()
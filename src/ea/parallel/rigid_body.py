@@ -0,0 +1,293 @@
+"""Batched rigid-body pre-optimization of molecular crystals.
+
+Freshly generated molecular crystals (PyXtal, USPEX) often start with bad
+packing: short intermolecular contacts and a poor cell.  The atomistic FIRE
+stage then spends its first, most expensive steps pushing whole molecules
+apart through atomic forces.  ``ParallelRigidBodyRelaxer`` does that part
+with 6 degrees of freedom per molecule (centre-of-mass translation and a
+rotation, applied with the SO(3) exponential sketched in
+``ea/structures/determine_sym.py``) plus the cell, keeping every molecule's
+internal geometry and the atom order untouched.
+
+Per structure and step, the atomic forces ``f_a`` and the stress ``sigma``
+of one ``batch_evaluator(atoms_list)`` call give
+
+* the molecular force  ``F_m = sum_a f_a`` over the atoms of molecule m,
+* the torque           ``tau_m = sum_a r_a x f_a`` (``r_a`` relative to the
+  molecule's centre of mass),
+* the cell gradient    ``V sigma + sum_a f_a (x) r_a``: the strain
+  derivative of the energy when the molecular centres follow the cell but
+  the molecules do not deform.
+
+These generalized forces drive the batched FIRE update of
+``ea.parallel.FIRE_parallel`` (``fire_update_batched``), so the whole batch
+is stepped with array operations.  Rotations are scaled by each molecule's
+radius of gyration and the strain by ``cell_factor`` (the number of atoms,
+as in ``FrechetCellFilter``), so all generalized forces are in eV/A.
+
+Molecules are the connected components of the covalent-radius bond graph.
+When the atoms carry tags (one tag per molecule, as the structure generators
+set them), bonds between differently tagged atoms are ignored, so short
+contacts of a bad packing do not merge molecules.
+"""
+
+from collections import deque
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, List
+
+import numpy as np
+from ase.neighborlist import natural_cutoffs, neighbor_list
+from ase.stress import voigt_6_to_full_3x3_stress
+
+from ea.parallel.FIRE_parallel import fire_update_batched
+
+RIGID_FMAX = 0.5        # eV/A; the atomistic FIRE stage takes it from here
+RIGID_STEPS = 100
+
+
+def skew(w):
+    """Skew-symmetric matrices of the rows of `w` (..., 3) -> (..., 3, 3)."""
+    w = np.asarray(w, dtype=float)
+    W = np.zeros(w.shape[:-1] + (3, 3))
+    W[..., 0, 1], W[..., 0, 2] = -w[..., 2], w[..., 1]
+    W[..., 1, 0], W[..., 1, 2] = w[..., 2], -w[..., 0]
+    W[..., 2, 0], W[..., 2, 1] = -w[..., 1], w[..., 0]
+    return W
+
+
+def exp_so3(w):
+    """Rotation matrices exp(skew(w)) of rotation vectors `w` (..., 3)
+    (Rodrigues' formula)."""
+    w = np.asarray(w, dtype=float)
+    theta = np.linalg.norm(w, axis=-1)[..., None, None]
+    safe = np.where(theta > 1e-12, theta, 1.0)
+    K = skew(w) / safe
+    R = (np.eye(3) + np.sin(theta) * K
+         + (1.0 - np.cos(theta)) * (K @ K))
+    return np.where(theta > 1e-12, R, np.eye(3))
+
+
+def find_molecules(atoms, mult=1.0):
+    """Molecule index of every atom and positions with each molecule made
+    whole across the periodic boundaries.
+
+    Returns ``(mol_of, unwrapped, extended)``: (N,) molecule labels 0..M-1,
+    (N, 3) Cartesian positions, and whether some component is bonded to its
+    own periodic image (a framework or metal, not a molecule).
+    """
+    n = len(atoms)
+    i, j, D = neighbor_list('ijD', atoms, natural_cutoffs(atoms, mult=mult))
+    tags = atoms.get_tags()
+    if len(np.unique(tags)) > 1:
+        keep = tags[i] == tags[j]
+        i, j, D = i[keep], j[keep], D[keep]
+    bonds = [[] for _ in range(n)]
+    for a, b, d in zip(i, j, D):
+        bonds[a].append((b, d))
+
+    pos = atoms.get_positions()
+    mol_of = np.full(n, -1, dtype=int)
+    unwrapped = pos.copy()
+    n_mol, extended = 0, False
+    for root in range(n):
+        if mol_of[root] >= 0:
+            continue
+        mol_of[root] = n_mol
+        queue = deque([root])
+        while queue:
+            a = queue.popleft()
+            for b, d in bonds[a]:
+                if mol_of[b] < 0:
+                    mol_of[b] = n_mol
+                    unwrapped[b] = unwrapped[a] + d
+                    queue.append(b)
+                elif not extended:
+                    extended = not np.allclose(unwrapped[a] + d, unwrapped[b],
+                                               atol=1e-6)
+        n_mol += 1
+    return mol_of, unwrapped, extended
+
+
+@dataclass
+class RigidState:
+    atoms: Any                       # ase.Atoms, positions/cell kept in sync
+    mol_of: Any                      # (N,) molecule of every atom
+    com: Any                         # (M, 3) molecular centres of mass
+    rel: Any                         # (N, 3) atom positions relative to com
+    radius: Any                      # (M,) rotation length scale (A)
+    cell_factor: float
+    relax_cell: bool = True
+    extended: bool = False
+    converged: bool = False
+    energy: float | None = None
+    fmax_current: float | None = None
+
+    @classmethod
+    def from_atoms(cls, atoms, relax_cell=True, mult=1.0):
+        atoms = atoms.copy()
+        mol_of, unwrapped, extended = find_molecules(atoms, mult)
+        n_mol = int(mol_of.max()) + 1 if len(atoms) else 0
+        masses = atoms.get_masses()
+        total = np.bincount(mol_of, weights=masses, minlength=n_mol)
+        com = np.stack([np.bincount(mol_of, weights=masses * unwrapped[:, k],
+                                    minlength=n_mol)
+                        for k in range(3)], axis=1) / total[:, None]
+        rel = unwrapped - com[mol_of]
+        counts = np.bincount(mol_of, minlength=n_mol)
+        rms = np.sqrt(np.bincount(mol_of, weights=(rel ** 2).sum(axis=1),
+                                  minlength=n_mol) / counts)
+        state = cls(atoms=atoms, mol_of=mol_of, com=com, rel=rel,
+                    radius=np.where(rms > 1e-8, rms, 1.0),
+                    cell_factor=float(len(atoms)), relax_cell=relax_cell,
+                    extended=extended)
+        if state.is_molecular():
+            state.atoms.set_positions(state.positions())
+        return state
+
+    @property
+    def n_mol(self):
+        return len(self.com)
+
+    @property
+    def ndof(self):
+        return 6 * self.n_mol + 9
+
+    def is_molecular(self):
+        return not self.extended and self.n_mol < len(self.atoms)
+
+    def positions(self):
+        return self.com[self.mol_of] + self.rel
+
+    def generalized_forces(self, forces, stress_voigt):
+        """(M*2 + 3, 3) generalized forces: molecular forces, torques over
+        the radius, and the rigid-molecule cell force."""
+        forces = np.asarray(forces, dtype=float).reshape(-1, 3)
+        F = np.zeros((self.n_mol, 3))
+        np.add.at(F, self.mol_of, forces)
+        tau = np.zeros((self.n_mol, 3))
+        np.add.at(tau, self.mol_of, np.cross(self.rel, forces))
+        G = np.zeros((3, 3))
+        if self.relax_cell:
+            sigma = voigt_6_to_full_3x3_stress(np.asarray(stress_voigt))
+            G = self.atoms.get_volume() * sigma + forces.T @ self.rel
+            G = 0.5 * (G + G.T)
+        return np.concatenate([F, tau / self.radius[:, None],
+                               -G / self.cell_factor])
+
+    def displace(self, dq):
+        """Apply a step in generalized coordinates (layout as
+        ``generalized_forces``)."""
+        dq = np.asarray(dq, dtype=float).reshape(-1, 3)
+        m = self.n_mol
+        if self.relax_cell:
+            deform = np.eye(3) + dq[2 * m:] / self.cell_factor
+            self.atoms.set_cell(self.atoms.cell.array @ deform.T,
+                                scale_atoms=False)
+            self.com = self.com @ deform.T
+        self.com = self.com + dq[:m]
+        R = exp_so3(dq[m:2 * m] / self.radius[:, None])
+        self.rel = np.einsum('aij,aj->ai', R[self.mol_of], self.rel)
+        self.atoms.set_positions(self.positions())
+
+
+class ParallelRigidBodyRelaxer:
+    """FIRE over rigid molecules and the cell for a batch of molecular
+    crystals, with one ``batch_evaluator`` call per step.
+
+    The caller supplies a `batch_evaluator(atoms_list)` callable returning
+    `(energies, forces_list, stress_voigt_list)`, as for ``ParallelFIRE``.
+    Structures without a multi-atom molecule, or with an infinitely bonded
+    component, are passed through untouched.
+    A structure stops when its largest generalized force (molecular force,
+    torque / radius or cell force, eV/A) drops below `fmax`; the atomistic
+    relaxation is meant to continue from ``get_atoms()``.
+    """
+
+    def __init__(self, atoms_list, batch_evaluator: Callable,
+                 fmax=RIGID_FMAX, max_steps=RIGID_STEPS, relax_cell=True,
+                 dt=0.1, maxstep=0.2, dtmax=1.0, Nmin=5, finc=1.1, fdec=0.5,
+                 astart=0.1, fa=0.99, mult=1.0, logfile='-'):
+        self.batch_evaluator = batch_evaluator
+        self.fmax = fmax
+        self.max_steps = max_steps
+        self.logfile = logfile
+        self.nsteps_done = 0
+        self.states: List[RigidState] = [
+            RigidState.from_atoms(a, relax_cell=relax_cell, mult=mult)
+            for a in atoms_list]
+        for s in self.states:
+            s.converged = not s.is_molecular()
+
+        B = len(self.states)
+        self.ndofs = np.array([s.ndof for s in self.states], dtype=int)
+        self.vel = np.zeros((B, int(self.ndofs.max()) if B else 0))
+        self.started = np.zeros(B, dtype=bool)
+        self.dt = np.full(B, float(dt))
+        self.a = np.full(B, float(astart))
+        self.Nsteps = np.zeros(B, dtype=int)
+        self.Nmin = np.full(B, int(Nmin))
+        for name, value in (('maxstep', maxstep), ('dtmax', dtmax),
+                            ('finc', finc), ('fdec', fdec),
+                            ('astart', astart), ('fa', fa)):
+            setattr(self, name, np.full(B, float(value)))
+
+    def _log(self, msg):
+        if self.logfile == '-':
+            print(msg)
+        elif self.logfile is not None:
+            with open(self.logfile, 'a') as fh:
+                fh.write(msg + '\n')
+
+    def step(self):
+        active = [k for k, s in enumerate(self.states) if not s.converged]
+        if not active:
+            return True
+
+        E, F_list, S_list = self.batch_evaluator(
+            [self.states[k].atoms for k in active])
+        moving, G = [], np.zeros((len(active), self.vel.shape[1]))
+        for j, k in enumerate(active):
+            s = self.states[k]
+            g = s.generalized_forces(F_list[j], S_list[j])
+            s.energy = float(np.asarray(E[j]).ravel()[0])
+            s.fmax_current = float(np.linalg.norm(g, axis=1).max())
+            if s.fmax_current < self.fmax:
+                s.converged = True
+                continue
+            G[len(moving), :self.ndofs[k]] = g.ravel()
+            moving.append(k)
+        if not moving:
+            return all(s.converged for s in self.states)
+
+        rows = np.array(moving, dtype=int)
+        dr = fire_update_batched(
+            self.vel, G[:len(moving)], rows, self.started, self.dt, self.a,
+            self.Nsteps, self.Nmin, self.finc, self.fdec, self.astart,
+            self.fa, self.dtmax, self.maxstep,
+        )
+        for j, k in enumerate(rows):
+            self.states[k].displace(dr[j, :self.ndofs[k]])
+        return False
+
+    def run(self):
+        n_mol = sum(s.is_molecular() for s in self.states)
+        for step in range(self.max_steps):
+            self.nsteps_done = step + 1
+            done = self.step()
+            active = [s.fmax_current for s in self.states
+                      if s.is_molecular() and s.fmax_current is not None]
+            n_conv = sum(s.converged for s in self.states if s.is_molecular())
+            self._log(f"[ParallelRigidBody] step {self.nsteps_done:4d}  "
+                      f"converged {n_conv}/{n_mol}  "
+                      f"max fmax={max(active, default=0.0):.4f}")
+            if done:
+                return True
+        self._log(f"[ParallelRigidBody] reached max_steps={self.max_steps}")
+        return False
+
+    def get_atoms(self):
+        return [s.atoms for s in self.states]
+
+    def get_energies(self):
+        return [s.energy for s in self.states]
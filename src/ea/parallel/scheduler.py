@@ -0,0 +1,689 @@
+"""Continuous-batching relaxation scheduler.
+
+``ParallelFIRE`` / ``ParallelLBFGS`` relax a fixed batch: as structures
+converge, ``active_idx`` shrinks and the evaluator runs on ever smaller
+batches while a few stragglers finish.  ``RelaxationScheduler`` instead
+keeps a fixed number of *slots* and a queue of unrelaxed structures (all
+CalcFolders of a wave, a whole EA generation, ...).  Every step it admits
+queued structures into free slots, evaluates every occupied slot in ONE
+``batch_evaluator`` call and then advances each structure through its own
+
+    FIRE(fire_fmax) -> LBFGS(lbfgs_stages[0]) -> ... -> LBFGS(lbfgs_stages[-1])
+
+schedule.  Finished structures free their slot for the next queued one, so
+every evaluator call stays at the target size until the queue drains.
+
+The per-structure schedule mirrors the worker's ``run_full_optimization``:
+a stage ends when the structure's filter fmax drops below the stage fmax or
+after the stage's step budget, and each LBFGS stage starts from a fresh
+history (a new ``ParallelLBFGS`` per stage).  The evaluation that ends a
+stage is reused as the first evaluation of the next one instead of being
+repeated at the same geometry.
+
+With ``keep_history=True`` the L-BFGS stages instead behave as ONE L-BFGS
+run whose convergence threshold tightens: the filter and the curvature
+history survive stage changes, so there is no cold restart per stage.
+``StagedRelaxer`` is the fixed-batch front end with that behaviour, used by
+the USPEX workers in place of one ``ParallelLBFGS`` per stage.
+
+``screening`` turns the run into a successive-halving energy ranking for
+USPEX / the ASE GA, which only need the ordering: after a coarse LBFGS
+stage the cohort is ranked by energy per atom and only the best fraction
+is refined at the next, tighter stage.
+
+``dedup_every`` collapses duplicates in flight: structures of one wave often
+fall into the same basin halfway through L-BFGS and would all be refined to
+the last fmax.  Every ``dedup_every`` steps the L-BFGS jobs with the same
+atom sequence are compared by energy per atom, volume and a cheap smeared
+pair-distance fingerprint; the members of a matching group leave their
+slots and, when the group's representative finishes, are finished with a
+copy of its geometry and energy (``job.duplicate_of`` set to its key).
+
+The FIRE / L-BFGS updates are the batched kernels of
+``FIRE_parallel.fire_update_batched`` and ``LBFGS_parallel.LBFGSHistory``,
+run on the slot rows that are in that phase.
+"""
+
+from collections import deque
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+import warnings
+
+import numpy as np
+from ase.calculators.singlepoint import SinglePointCalculator
+from ase.filters import FrechetCellFilter
+from ase.io import write
+from ase.neighborlist import neighbor_list
+
+from ea.parallel.FIRE_parallel import _inject_results, fire_update_batched
+from ea.parallel.LBFGS_parallel import LBFGSHistory
+from ea.parallel.precon import apply_precon, estimate_mu, make_precon
+from ea.parallel.symmetry import SYMPREC, symmetry_constraint
+
+# in-flight duplicate collapse (``dedup_every``)
+DEDUP_ENERGY_TOL = 1e-3     # eV/atom
+DEDUP_VOLUME_TOL = 1e-2     # relative
+DEDUP_FP_TOL = 2e-2         # fingerprint distance, see _fingerprint_distance
+DEDUP_RCUT = 6.0            # A
+DEDUP_BINWIDTH = 0.05       # A
+DEDUP_SIGMA = 0.1           # A
+
+
+def _pair_fingerprint(atoms, rcut=DEDUP_RCUT, binwidth=DEDUP_BINWIDTH,
+                      sigma=DEDUP_SIGMA):
+    """Gaussian-smeared histogram of interatomic distances up to `rcut`,
+    per atom.  Invariant to translations, rotations and atom permutations
+    and cheap next to one evaluator call."""
+    edges = np.arange(0.0, rcut + binwidth, binwidth)
+    hist, _ = np.histogram(neighbor_list('d', atoms, rcut), bins=edges)
+    x = np.arange(-3 * sigma, 3 * sigma + binwidth, binwidth)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return np.convolve(hist, kernel / kernel.sum(), mode='same') / len(atoms)
+
+
+def _fingerprint_distance(fp1, fp2):
+    """Normalized L1 distance in [0, 1] between two pair fingerprints."""
+    total = fp1.sum() + fp2.sum()
+    return float(np.abs(fp1 - fp2).sum() / total) if total > 0 else 0.0
+
+
+@dataclass
+class RelaxJob:
+    key: Any                         # caller's handle (index, Calcfold path, ...)
+    atoms: Any                       # ase.Atoms copy (mutated in place)
+    filter: Any                      # FrechetCellFilter wrapping `atoms`
+    order: int = 0                   # admission order into the scheduler
+    slot: int = -1
+    precon: Any = None               # ExpPrecon of the filter DOFs, or None
+    stage: int = 0                   # 0 = FIRE, k >= 1 = lbfgs_stages[k-1]
+    stage_steps: int = 0             # optimizer steps taken in this stage
+    nevals: int = 0                  # evaluator calls spent on this job
+    converged: bool = False          # reached the final stage's fmax
+    done: bool = False
+    energy: float | None = None
+    fmax_current: float | None = None
+    # successive-halving screening
+    parked: bool = False             # waiting at a screening boundary
+    resume: bool = False             # last evaluation matches the geometry
+    best_energy: float | None = None
+    best_positions: Any = None
+    best_cell: Any = None
+    screened_out: float | None = None   # stage fmax at which it was retired
+    # in-flight duplicate collapse
+    duplicate_of: Any = None         # key of the representative it copies
+    followers: list = field(default_factory=list)
+
+
+class RelaxationScheduler:
+    """Slot-based FIRE -> staged-LBFGS relaxer fed by a queue.
+
+    Parameters
+    ----------
+    source:
+        Iterable of ``ase.Atoms`` or ``(key, ase.Atoms)`` pairs.  More
+        structures can be queued later with :meth:`submit`.  Plain atoms get
+        their position in the queue as key.
+    batch_evaluator:
+        Callable ``(atoms_list) -> (energies, forces_list,
+        stress_voigt_list)``, the same interface as ``ParallelFIRE``.
+    batch_size:
+        Number of slots, i.e. the target size of every evaluator call.
+    keep_history:
+        Keep the FrechetCellFilter and the L-BFGS history across LBFGS
+        stages instead of restarting each stage cold.
+    screening:
+        Successive-halving schedule for energy-ranking runs: ``screening[i]``
+        is the fraction of structures refined past ``lbfgs_stages[i]``
+        (values >= 1 keep everyone).  At each such boundary the jobs wait
+        for the whole cohort, are ranked by energy per atom, and only the
+        best fraction (at least ``screen_min``) continues; the others
+        finish with their best-so-far geometry and energy and
+        ``job.screened_out`` set to the boundary fmax.
+    dedup_every:
+        Every this many steps, collapse L-BFGS jobs that reached the same
+        basin (same atom sequence, energy per atom within
+        ``dedup_energy_tol``, relative volume within ``dedup_volume_tol``,
+        pair fingerprints within ``dedup_fp_tol``).  The member closest to
+        convergence keeps relaxing; the others free their slots and finish
+        with its final geometry and energy.  ``None`` disables the check.
+    symmetry:
+        Refine every submitted structure to its space group (``symprec``)
+        and attach a ``FixSymmetry`` constraint, so forces, stress and steps
+        are symmetrized and the space group survives the relaxation.
+    precon:
+        ``'Exp'`` gives every job an ``ea.parallel.precon.ExpPrecon``: FIRE
+        moves along ``P^-1 f`` and L-BFGS uses ``P^-1`` as its initial
+        inverse Hessian.  ``mu`` / ``mu_c`` of the jobs admitted in a step
+        are fitted together with one extra evaluator call.
+    on_finished:
+        Optional callback ``on_finished(job)`` run as soon as a structure
+        leaves its last stage (converged, out of steps or screened out).
+    """
+
+    def __init__(self, source: Iterable = (), batch_evaluator: Callable = None,
+                 batch_size=64,
+                 fire_fmax=0.10, fire_steps=500,
+                 lbfgs_stages=(0.03, 0.01, 0.005, 0.002, 0.001),
+                 lbfgs_steps=1200,
+                 maxstep=0.03, memory=40, alpha=70.0,
+                 dt=0.1, dtmax=1.0, Nmin=5, finc=1.1, fdec=0.5,
+                 astart=0.1, fa=0.99, keep_history=False,
+                 screening=None, screen_min=1, dedup_every=None,
+                 dedup_energy_tol=DEDUP_ENERGY_TOL,
+                 dedup_volume_tol=DEDUP_VOLUME_TOL,
+                 dedup_fp_tol=DEDUP_FP_TOL, symmetry=False, symprec=SYMPREC,
+                 precon=None,
+                 on_finished: Callable = None, logfile='-'):
+        if batch_evaluator is None:
+            warnings.warn(
+                "RelaxationScheduler: no batch_evaluator provided. Pass a "
+                "callable batch_evaluator(atoms_list) -> (energies, "
+                "forces_list, stress_voigt_list). step()/run() will fail "
+                "without one.",
+                stacklevel=2,
+            )
+        if maxstep > 1.0:
+            raise ValueError(
+                f"maxstep={maxstep} is too large (must be <= 1.0 A)"
+            )
+        self.batch_evaluator = batch_evaluator
+        self.batch_size = int(batch_size)
+        self.stage_fmax = (fire_fmax, *lbfgs_stages)
+        self.stage_steps = (fire_steps, *([lbfgs_steps] * len(lbfgs_stages)))
+        self.maxstep = maxstep
+        self.H0 = 1.0 / alpha
+        self.keep_history = keep_history
+        self.screening = (None if screening is None
+                          else tuple(float(f) for f in screening))
+        self.screen_min = int(screen_min)
+        self.dedup_every = None if dedup_every is None else int(dedup_every)
+        self.dedup_tols = (float(dedup_energy_tol), float(dedup_volume_tol),
+                           float(dedup_fp_tol))
+        self.symmetry = symmetry
+        self.symprec = symprec
+        make_precon(precon)             # reject unknown names up front
+        self.precon = precon
+        self.on_finished = on_finished
+        self.logfile = logfile
+
+        self.queue = deque()
+        self.slots: list[RelaxJob | None] = [None] * self.batch_size
+        self.finished: list[RelaxJob] = []
+        self.nsteps_done = 0
+        self.nevals = 0
+        self.n_duplicates = 0
+        self._n_steps = 0
+        self._n_submitted = 0
+
+        # ---- padded per-slot optimizer state -----------------------------
+        S = self.batch_size
+        self.ndofs = np.zeros(S, dtype=int)
+        self.vel = np.zeros((S, 0))
+        self.started = np.zeros(S, dtype=bool)
+        self.dt = np.full(S, float(dt))
+        self.a = np.full(S, float(astart))
+        self.Nsteps = np.zeros(S, dtype=int)
+        self._fire_defaults = dict(dt=float(dt), a=float(astart))
+        self._fire_params = dict(
+            Nmin=np.full(S, int(Nmin)), finc=np.full(S, float(finc)),
+            fdec=np.full(S, float(fdec)), astart=np.full(S, float(astart)),
+            fa=np.full(S, float(fa)), dtmax=np.full(S, float(dtmax)),
+            maxstep=np.full(S, float(maxstep)),
+        )
+        self.history = LBFGSHistory(np.zeros(S, dtype=int), memory)
+
+        for item in source:
+            self.submit(item)
+
+    # ---------------------------------------------------------------- queue
+
+    def submit(self, item, key=None):
+        """Queue one structure (``Atoms`` or ``(key, Atoms)``)."""
+        if key is None and isinstance(item, tuple):
+            key, item = item
+        if key is None:
+            key = self._n_submitted
+        at_copy = item.copy()
+        if self.symmetry:
+            symmetry_constraint(at_copy, self.symprec)
+        job = RelaxJob(key=key, atoms=at_copy,
+                       filter=FrechetCellFilter(at_copy),
+                       precon=make_precon(self.precon),
+                       order=self._n_submitted)
+        self._n_submitted += 1
+        self.queue.append(job)
+        return job
+
+    def occupied(self):
+        return [job for job in self.slots if job is not None]
+
+    def pending(self):
+        """Number of structures queued or still being relaxed."""
+        return len(self.queue) + len(self.occupied())
+
+    def drop_occupied(self):
+        """Take every job out of its slot without finishing it (e.g. after
+        a failed evaluator call); returns them with the duplicates that
+        were collapsed into them."""
+        dropped = []
+        for k, job in enumerate(self.slots):
+            if job is None:
+                continue
+            self.slots[k] = None
+            job.slot = -1
+            dropped += [job, *job.followers]
+            job.followers = []
+        return dropped
+
+    def _log(self, msg):
+        if self.logfile == '-':
+            print(msg)
+        elif self.logfile is not None:
+            with open(self.logfile, 'a') as fh:
+                fh.write(msg + '\n')
+
+    # ---------------------------------------------------------------- slots
+
+    def _widen(self, width):
+        extra = int(width) - self.vel.shape[1]
+        if extra > 0:
+            self.vel = np.pad(self.vel, ((0, 0), (0, extra)))
+        self.history.widen(width)
+
+    def _reset_fire(self, k):
+        self.vel[k] = 0.0
+        self.started[k] = False
+        self.dt[k] = self._fire_defaults['dt']
+        self.a[k] = self._fire_defaults['a']
+        self.Nsteps[k] = 0
+
+    def _admit(self):
+        for k in range(self.batch_size):
+            if not self.queue:
+                return
+            if self.slots[k] is not None:
+                continue
+            job = self.queue.popleft()
+            nd = 3 * (len(job.atoms) + 3)
+            self._widen(nd)
+            self.ndofs[k] = nd
+            self.history.ndofs[k] = nd
+            self._reset_fire(k)
+            self.history.reset([k])
+            job.slot = k
+            self.slots[k] = job
+
+    def _enter_stage(self, job, stage):
+        """Move `job` to `stage`.  Like a fresh ``ParallelLBFGS`` per stage,
+        every stage gets a new FrechetCellFilter (referenced to the current
+        cell) and LBFGS stages start with a cold history -- unless
+        ``keep_history`` is set, in which case LBFGS -> LBFGS transitions
+        only tighten the threshold."""
+        previous, job.stage, job.stage_steps = job.stage, stage, 0
+        if self.keep_history and previous >= 1:
+            return
+        job.filter = FrechetCellFilter(job.atoms)
+        if stage >= 1:
+            self.history.reset([job.slot])
+
+    def _finish(self, job):
+        job.done = True
+        if job.slot >= 0:
+            self.slots[job.slot] = None
+        job.slot = -1
+        self.finished.append(job)
+        if self.on_finished is not None:
+            self.on_finished(job)
+        # duplicates collapsed into this job finish with its result
+        for follower in job.followers:
+            follower.atoms.set_cell(job.atoms.get_cell(), scale_atoms=False,
+                                    apply_constraint=False)
+            follower.atoms.set_positions(job.atoms.get_positions(),
+                                         apply_constraint=False)
+            follower.energy = job.energy
+            follower.fmax_current = job.fmax_current
+            follower.converged = job.converged
+            follower.screened_out = job.screened_out
+            self._finish(follower)
+        job.followers = []
+
+    # ----------------------------------------------------------------- step
+
+    @staticmethod
+    def _filter_forces(job):
+        """Combined (natoms+3, 3) filter force vector from the injected
+        results; also refreshes ``job.fmax_current``."""
+        force_vec = job.filter.get_forces()
+        job.fmax_current = float(np.linalg.norm(force_vec, axis=1).max())
+        return force_vec
+
+    def _screens(self, stage):
+        """Whether the end of `stage` is a successive-halving boundary."""
+        k = stage - 1
+        return (self.screening is not None
+                and 0 <= k < len(self.screening)
+                and stage < len(self.stage_fmax) - 1
+                and self.screening[k] < 1.0)
+
+    def _advance(self, job, force_vec):
+        """Stage logic for a job with a current evaluation.
+
+        Walks the job through every stage whose fmax the evaluation already
+        satisfies and returns the force vector to move along, or None if
+        the job finished or was parked at a screening boundary.
+        """
+        last = len(self.stage_fmax) - 1
+        while job.fmax_current < self.stage_fmax[job.stage]:
+            if job.stage == last:
+                job.converged = True
+                self._finish(job)
+                return None
+            if self._screens(job.stage):
+                job.parked = True
+                job.resume = True       # evaluation still matches geometry
+                return None
+            self._enter_stage(job, job.stage + 1)
+            force_vec = self._filter_forces(job)
+        return force_vec
+
+    def _track_best(self, job):
+        if job.best_energy is None or job.energy < job.best_energy:
+            job.best_energy = job.energy
+            job.best_positions = job.atoms.get_positions()
+            job.best_cell = job.atoms.get_cell().array.copy()
+
+    def _screen(self):
+        """Successive halving: once every unfinished job is parked, rank the
+        cohort at the earliest boundary by (best) energy per atom, refine
+        the best fraction and retire the rest with their best-so-far
+        geometry and energy."""
+        parked = [job for job in self.occupied() if job.parked]
+        stage = min(job.stage for job in parked)
+        cohort = [job for job in parked if job.stage == stage]
+        frac = self.screening[stage - 1]
+        n_keep = min(len(cohort),
+                     max(self.screen_min, int(np.ceil(frac * len(cohort)))))
+        ranked = sorted(cohort,
+                        key=lambda job: job.best_energy / len(job.atoms))
+        for job in ranked[n_keep:]:
+            job.atoms.set_cell(job.best_cell)
+            job.atoms.set_positions(job.best_positions)
+            job.energy = job.best_energy
+            job.screened_out = self.stage_fmax[stage]
+            self._finish(job)
+        for job in ranked[:n_keep]:
+            job.parked = False
+            self._enter_stage(job, stage + 1)
+        self._log(
+            f"[RelaxationScheduler] screening at fmax={self.stage_fmax[stage]}"
+            f": refining {n_keep}/{len(cohort)} lowest E/atom, "
+            f"retired {len(cohort) - n_keep}"
+        )
+
+    def _dedup(self, jobs):
+        """Collapse L-BFGS `jobs` (all with a current evaluation) that
+        reached the same basin.
+
+        Compares them pairwise (cheap energy/volume tests first, the
+        fingerprint only for pairs that pass) and retires every member of a
+        group except the one closest to convergence.  Returns the ids of
+        the retired jobs.
+        """
+        e_tol, v_tol, fp_tol = self.dedup_tols
+        jobs = sorted(jobs, key=lambda job: (-job.stage, job.fmax_current))
+        fps = {}
+
+        def fingerprint(job):
+            if id(job) not in fps:
+                fps[id(job)] = _pair_fingerprint(job.atoms)
+            return fps[id(job)]
+
+        retired = set()
+        for i, rep in enumerate(jobs):
+            if id(rep) in retired:
+                continue
+            symbols = rep.atoms.get_chemical_symbols()
+            e_rep = rep.energy / len(rep.atoms)
+            v_rep = rep.atoms.get_volume()
+            for job in jobs[i + 1:]:
+                if (id(job) in retired or len(job.atoms) != len(rep.atoms)
+                        or abs(job.energy / len(job.atoms) - e_rep) > e_tol
+                        or abs(job.atoms.get_volume() - v_rep) > v_tol * v_rep
+                        or job.atoms.get_chemical_symbols() != symbols
+                        or _fingerprint_distance(fingerprint(rep),
+                                                 fingerprint(job)) > fp_tol):
+                    continue
+                retired.add(id(job))
+                self.slots[job.slot] = None
+                job.slot = -1
+                job.duplicate_of = rep.key
+                rep.followers += [job, *job.followers]
+                job.followers = []
+        if retired:
+            self.n_duplicates += len(retired)
+            self._log(f"[RelaxationScheduler] collapsed {len(retired)} "
+                      f"duplicate(s) in flight")
+        return retired
+
+    def step(self):
+        """Admit, evaluate every occupied slot once, advance each job.
+
+        Returns True once the queue is empty and every job has finished.
+        """
+        self._admit()
+        if not self.occupied():
+            return True
+
+        fire_moves, lbfgs_moves = [], []
+
+        def _queue_move(job, force_vec):
+            if force_vec is not None:
+                moves = fire_moves if job.stage == 0 else lbfgs_moves
+                moves.append((job, force_vec))
+
+        # Jobs released by screening whose last evaluation is still valid.
+        resumed = [job for job in self.occupied()
+                   if job.resume and not job.parked]
+        for job in resumed:
+            job.resume = False
+            _queue_move(job, self._advance(job, self._filter_forces(job)))
+
+        resumed_ids = {id(job) for job in resumed}
+        jobs = [job for job in self.occupied()
+                if not job.parked and id(job) not in resumed_ids]
+        if jobs:
+            # Single batched evaluation call, backend-agnostic.
+            E, F_list, S_list = self.batch_evaluator(
+                [job.atoms for job in jobs])
+            self.nevals += 1
+
+        for j, job in enumerate(jobs):
+            _inject_results(job.atoms, E[j], F_list[j], S_list[j])
+            job.energy = float(np.asarray(E[j]).ravel()[0])
+            job.nevals += 1
+            if self.screening is not None:
+                self._track_best(job)
+
+            # Reuse this evaluation for every stage whose fmax it satisfies.
+            _queue_move(job, self._advance(job, self._filter_forces(job)))
+
+        self._n_steps += 1
+        if (self.dedup_every and lbfgs_moves
+                and self._n_steps % self.dedup_every == 0):
+            retired = self._dedup([job for job, _ in lbfgs_moves])
+            lbfgs_moves = [(job, fv) for job, fv in lbfgs_moves
+                           if id(job) not in retired]
+
+        # Fit the preconditioners of newly admitted jobs in one call.
+        unfitted = [(job.precon, job.filter, fv)
+                    for job, fv in fire_moves + lbfgs_moves
+                    if job.precon is not None and job.precon.mu is None]
+        if unfitted:
+            estimate_mu(unfitted, self.batch_evaluator)
+            self.nevals += 1
+
+        if fire_moves:
+            self._fire_step(fire_moves)
+        if lbfgs_moves:
+            self._lbfgs_step(lbfgs_moves)
+
+        # Stage step budgets: out of steps -> next stage (or give up).
+        last = len(self.stage_fmax) - 1
+        for job, _ in fire_moves + lbfgs_moves:
+            job.stage_steps += 1
+            if job.stage_steps >= self.stage_steps[job.stage]:
+                if job.stage == last:
+                    self._finish(job)
+                elif self._screens(job.stage):
+                    job.parked = True
+                else:
+                    self._enter_stage(job, job.stage + 1)
+
+        occupied = self.occupied()
+        if occupied and all(job.parked for job in occupied):
+            self._screen()
+
+        return not self.queue and not self.occupied()
+
+    def _gather(self, moves):
+        rows = np.array([job.slot for job, _ in moves], dtype=int)
+        forces = np.zeros((rows.size, self.vel.shape[1]))
+        for j, (job, fv) in enumerate(moves):
+            forces[j, :self.ndofs[job.slot]] = fv.ravel()
+        return rows, forces
+
+    def _move(self, moves, dr, pos=None):
+        for j, (job, _) in enumerate(moves):
+            nd = self.ndofs[job.slot]
+            x = (pos[j, :nd] if pos is not None
+                 else job.filter.get_positions().ravel())
+            job.filter.set_positions((x + dr[j, :nd]).reshape(-1, 3))
+
+    def _fire_step(self, moves):
+        rows, G = self._gather(moves)
+        G = apply_precon([(job.precon, job.atoms, None) for job, _ in moves],
+                         G)
+        p = self._fire_params
+        dr = fire_update_batched(
+            self.vel, G, rows, self.started, self.dt, self.a, self.Nsteps,
+            p['Nmin'], p['finc'], p['fdec'], p['astart'], p['fa'],
+            p['dtmax'], p['maxstep'],
+        )
+        self._move(moves, dr)
+
+    def _lbfgs_step(self, moves):
+        rows, forces = self._gather(moves)
+        pos = np.zeros_like(forces)
+        for j, (job, _) in enumerate(moves):
+            pos[j, :self.ndofs[job.slot]] = job.filter.get_positions().ravel()
+
+        self.history.update(rows, pos, forces)
+        items = [(job.precon, job.atoms, None) for job, _ in moves]
+        p = self.history.direction(
+            rows, forces, self.H0,
+            solve=lambda q: apply_precon(items, q, self.H0))
+
+        # maxstep rescale on the largest per-row displacement, as
+        # ParallelLBFGS._determine_step does
+        dr = np.zeros_like(p)
+        for j, (job, _) in enumerate(moves):
+            nd = self.ndofs[job.slot]
+            pj = p[j, :nd]
+            longest = np.linalg.norm(pj.reshape(-1, 3), axis=1).max()
+            if longest >= self.maxstep:
+                pj = pj * (self.maxstep / longest)
+            dr[j, :nd] = pj
+        self._move(moves, dr, pos)
+        self.history.remember(rows, pos, forces)
+
+    # ------------------------------------------------------------------ run
+
+    def _stage_name(self, stage):
+        if stage == 0:
+            return f"FIRE({self.stage_fmax[0]})"
+        return f"LBFGS({self.stage_fmax[stage]})"
+
+    def run(self, max_steps=None):
+        """Step until every queued structure has finished (or `max_steps`
+        scheduler steps).  Returns True if everything finished."""
+        while max_steps is None or self.nsteps_done < max_steps:
+            self.nsteps_done += 1
+            done = self.step()
+
+            counts = {}
+            for job in self.occupied():
+                name = self._stage_name(job.stage)
+                counts[name] = counts.get(name, 0) + 1
+            stage_str = ', '.join(f"{k}: {v}" for k, v in counts.items())
+            self._log(
+                f"[RelaxationScheduler] step {self.nsteps_done:5d}  "
+                f"slots {len(self.occupied())}/{self.batch_size}  "
+                f"queued {len(self.queue)}  finished {len(self.finished)}"
+                + (f"  [{stage_str}]" if stage_str else "")
+            )
+            if done:
+                self._log(
+                    f"[RelaxationScheduler] {len(self.finished)} structures "
+                    f"relaxed in {self.nsteps_done} steps "
+                    f"({self.nevals} evaluator calls)"
+                    + (f", {self.n_duplicates} collapsed as duplicates"
+                       if self.n_duplicates else "")
+                )
+                return True
+        return False
+
+    def results(self):
+        """Finished jobs in submission order."""
+        return sorted(self.finished, key=lambda job: job.order)
+
+
+class StagedRelaxer(RelaxationScheduler):
+    """FIRE -> LBFGS relaxation of a fixed batch as one state machine.
+
+    Replaces the ``ParallelFIRE`` + one-``ParallelLBFGS``-per-fmax-stage
+    pipeline: every structure gets its own slot, the L-BFGS history and
+    filter are kept while the fmax threshold tightens (``keep_history``),
+    and the evaluation that satisfies one threshold is reused to test the
+    next one instead of being repeated.  Accepts the same schedule keywords
+    as :class:`RelaxationScheduler`.
+    """
+
+    def __init__(self, atoms_list, batch_evaluator: Callable = None,
+                 keep_history=True, **kwargs):
+        atoms_list = list(atoms_list)
+        super().__init__(atoms_list, batch_evaluator=batch_evaluator,
+                         batch_size=max(len(atoms_list), 1),
+                         keep_history=keep_history, **kwargs)
+        self.jobs = list(self.queue)
+
+    def run(self, max_steps=None, out_dir=None):
+        """Relax the whole batch.  With `out_dir`, the current geometries
+        are written to ``<out_dir>/output.traj`` every 50 steps and at the
+        end, like ``ParallelLBFGS.run``."""
+        if out_dir is None:
+            return super().run(max_steps=max_steps)
+
+        out_file = Path(out_dir) / "output.traj"
+        done = False
+        while not done and (max_steps is None
+                            or self.nsteps_done < max_steps):
+            chunk = 50 if max_steps is None else min(
+                50, max_steps - self.nsteps_done)
+            write(out_file, self.get_atoms())
+            done = super().run(max_steps=self.nsteps_done + chunk)
+        write(out_file, self.get_atoms())
+        return done
+
+    def get_atoms(self):
+        # Jobs still running keep their injected results: a parked job
+        # reuses its cached evaluation when screening lets it resume.
+        for job in self.jobs:
+            if job.done or job.atoms.calc is None:
+                job.atoms.calc = SinglePointCalculator(job.atoms,
+                                                       energy=job.energy)
+        return [job.atoms for job in self.jobs]
+
+    def get_energies(self):
+        return [job.energy for job in self.jobs]
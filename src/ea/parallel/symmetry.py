@@ -0,0 +1,77 @@
+"""Space-group constraints for the batched optimizers.
+
+Structures from the symmetric generators (``info['spacegroup']``) lose
+their symmetry when all 3N+9 FrechetCellFilter DOFs are relaxed, through
+numerical noise in the forces.  With ``symmetry=True`` the batched
+optimizers (``ParallelFIRE``, ``ParallelLBFGS``, ``RelaxationScheduler``)
+attach ASE's ``FixSymmetry`` to every structure: the structure is refined
+to its space group once, the spglib dataset (rotations, translations,
+atom map) is cached in the constraint, and from then on every injected
+force / stress and every position / cell step is symmetrized, exactly as
+``FixSymmetry`` does for a single structure.
+
+``symmetric_basis`` additionally spans the symmetry-invariant subspace of
+the filter DOFs with an orthonormal basis, so ``ParallelLBFGS`` keeps its
+history in that (usually much smaller) reduced space.
+"""
+
+import warnings
+
+import numpy as np
+
+SYMPREC = 1e-2          # spglib tolerance (A), FixSymmetry's default
+
+
+def symmetry_constraint(atoms, symprec=SYMPREC):
+    """Refine `atoms` to its space group in place and attach a
+    ``FixSymmetry`` holding the spglib dataset.
+
+    Returns the constraint, or None (nothing attached) if spglib finds no
+    symmetry beyond the identity or fails.
+    """
+    from ase.constraints import FixSymmetry
+
+    with warnings.catch_warnings():
+        # spglib >= 2.4 warns about its legacy None-on-failure convention
+        warnings.simplefilter("ignore", DeprecationWarning)
+        try:
+            constraint = FixSymmetry(atoms, symprec=symprec)
+        except Exception:
+            return None
+    if len(constraint.rotations) == 1:
+        return None
+    atoms.set_constraint(list(atoms.constraints) + [constraint])
+    return constraint
+
+
+def _invariant(P):
+    """Orthonormal basis of the range of the symmetrization projector P."""
+    w, V = np.linalg.eigh(0.5 * (P + P.T))
+    return V[:, w > 0.5]
+
+
+def symmetric_basis(atoms, constraint):
+    """Orthonormal (3 * (N + 3), r) basis of the FrechetCellFilter DOFs
+    invariant under the operations of `constraint`.
+
+    Atom rows: displacements with ``u[perm[i]] = C u[i]`` for every
+    operation (Cartesian rotation ``C``, atom map ``perm``).  Cell rows: 3x3
+    (log-)deformations with ``C F C^T = F``.
+    """
+    lattice = atoms.cell.array
+    inv = np.linalg.inv(lattice)
+    n = len(atoms)
+    P = np.zeros((n, 3, n, 3))
+    M = np.zeros((9, 9))
+    idx = np.arange(n)
+    for rot, perm in zip(constraint.rotations, constraint.symm_map):
+        C = lattice.T @ rot @ inv.T
+        P[np.asarray(perm), :, idx, :] += C
+        M += np.kron(C, C)
+    n_ops = len(constraint.rotations)
+    Q_atoms = _invariant(P.reshape(3 * n, 3 * n) / n_ops)
+    Q_cell = _invariant(M / n_ops)
+    Q = np.zeros((3 * n + 9, Q_atoms.shape[1] + Q_cell.shape[1]))
+    Q[:3 * n, :Q_atoms.shape[1]] = Q_atoms
+    Q[3 * n:, Q_atoms.shape[1]:] = Q_cell
+    return Q
@@ -9,11 +9,32 @@ call to a user-supplied batch evaluator with the signature::
 This is the same evaluator interface used by ``ParallelFIRE`` /
 ``ParallelLBFGS`` in this package, so the same wrappers around deepmd / UMA
 calculators apply (see :func:`make_deepmd_evaluator`).
+
+Unlike ASE, no per-displacement force arrays are kept: the finite-difference
+scheme is fixed up front and every force result is added straight into its
+row of the preallocated Hessian, so peak memory is one Hessian per structure
+(optionally an on-disk ``np.memmap`` for very large cells).
+
+If the batch evaluator is also a Hessian provider -- it has a
+``hessians(atoms_list)`` method returning one (3N, 3N) d2E/dx2 array in
+eV/A^2 per structure, as ``DeepMDBatchEvaluator`` does with autograd -- the
+Hessians are taken from it and no displacement is evaluated; finite
+differences remain the fallback when it raises (``NotImplementedError``
+for backends without autograd) or with ``analytic=False``.
+
+With ``symmetry=True`` only symmetry-inequivalent atoms are displaced (space
+group from spglib, as ``SpacegroupAnalyzer`` in ``ea/structures/determine_sym``
+finds it) and the Hessian rows of the other atoms are rebuilt with the
+space-group operations: about Z times fewer evaluations for a Z-molecule
+cell.
 """
 
 import sys
+import traceback
+import warnings
 from collections import defaultdict, namedtuple
 from collections.abc import Callable
+from pathlib import Path
 from typing import List, Optional, Sequence
 
 import numpy as np
@@ -21,19 +42,85 @@ from ase import Atoms
 from ase.constraints import FixAtoms
 from ase.vibrations.data import VibrationsData
 
-from ea.parallel.create_batch import batch_calculator_deepmd
+from ea.parallel.create_batch import DeepMDBatchEvaluator
 
 
 # Lightweight displacement spec (a=atom index, i=cartesian axis 0/1/2,
-# sign in {-1, 0, +1}, ndisp in {0, 1, 2}). Mirrors ASE's Displacement
-# naming so the on-disk vocabulary is recognizable.
+# sign in {-1, 0, +1}, ndisp in {0, 1, 2}). Mirrors ASE's Displacement.
 Disp = namedtuple('Disp', ['a', 'i', 'sign', 'ndisp'])
 
+# default evaluator-call size in packing mode
+PACK_BATCH_SIZE = 64
+# rows per block when a (memmapped) Hessian is swept
+BLOCK = 1024
+# spglib tolerance (A), SpacegroupAnalyzer's default
+SYMPREC = 1e-2
+
 
-def _disp_name(d: Disp) -> str:
-    if d.sign == 0:
-        return 'eq'
-    return f"{d.a}{'xyz'[d.i]}{d.ndisp * ' +-'[int(d.sign)]}"
+def _space_group_images(atoms, symprec=SYMPREC):
+    """How every atom is generated from a symmetry-inequivalent one.
+
+    Returns ``(irreducible, images)`` where ``images[b] = (a, R, perm)``:
+    atom ``b`` is the image of irreducible atom ``a`` under the operation
+    with Cartesian rotation ``R`` and atom permutation ``perm`` (atom ``c``
+    goes to ``perm[c]``).  None if spglib finds no symmetry.
+    """
+    import spglib
+
+    cell = (atoms.cell.array, atoms.get_scaled_positions(),
+            atoms.get_atomic_numbers())
+    with warnings.catch_warnings():
+        # spglib >= 2.4 warns about its legacy None-on-failure convention
+        warnings.simplefilter("ignore", DeprecationWarning)
+        try:
+            dataset = spglib.get_symmetry_dataset(cell, symprec=symprec)
+        except Exception:
+            dataset = None
+    if dataset is None or len(dataset.rotations) == 1:
+        return None
+    lattice = atoms.cell.array.T            # columns = lattice vectors
+    frac = atoms.get_scaled_positions()
+    images = [None] * len(atoms)
+    for rot, trans in zip(dataset.rotations, dataset.translations):
+        moved = frac @ rot.T + trans
+        diff = moved[:, None, :] - frac[None, :, :]
+        diff -= np.round(diff)
+        perm = np.linalg.norm(diff @ lattice.T, axis=2).argmin(axis=1)
+        R = lattice @ rot @ np.linalg.inv(lattice)
+        for a in np.unique(dataset.equivalent_atoms):
+            b = perm[a]
+            if images[b] is None and dataset.equivalent_atoms[b] == a:
+                images[b] = (int(a), R, perm)
+    return sorted({a for a, _, _ in images}), images
+
+
+def _row_weights(direction, nfree):
+    """Weight of each displacement's forces in its Hessian row (before the
+    1 / (2 delta) scaling), keyed by ``(sign, ndisp)``; ``(0, 0)`` is the
+    equilibrium force, which enters every row."""
+    if direction == 'central':
+        if nfree == 2:
+            return {(-1, 1): 0.5, (1, 1): -0.5}
+        return {(-1, 1): 8 / 12, (1, 1): -8 / 12,
+                (-1, 2): -1 / 12, (1, 2): 1 / 12}
+    if direction == 'forward':
+        return {(0, 0): 1.0, (1, 1): -1.0}
+    return {(0, 0): -1.0, (-1, 1): 1.0}
+
+
+def _symmetrize(H, block=BLOCK):
+    """``H += H.T`` in place, one pair of row/column blocks at a time so a
+    memmapped Hessian is never copied whole."""
+    n = H.shape[0]
+    for i in range(0, n, block):
+        for j in range(i, n, block):
+            a = np.array(H[i:i + block, j:j + block])
+            if i == j:
+                H[i:i + block, j:j + block] = a + a.T
+                continue
+            b = np.array(H[j:j + block, i:i + block])
+            H[i:i + block, j:j + block] = a + b.T
+            H[j:j + block, i:i + block] = b + a.T
 
 
 class ParallelVibrations:
@@ -59,6 +146,33 @@ class ParallelVibrations:
     batch_size:
         Optional cap on the per-call batch size. ``None`` packs all
         same-composition displacements into one evaluator call.
+    pack:
+        Packing mode: fill every evaluator call with displaced copies for
+        many (structure, atom, axis, sign) displacements at once, up to
+        ``batch_size`` copies (default ``PACK_BATCH_SIZE``) and
+        ``max_atoms`` atoms, instead of one displacement per call.  One
+        120-atom structure then takes ~12 calls of 64 instead of 721
+        calls of 1.
+    max_atoms:
+        Packing mode: optional cap on the total number of atoms per
+        evaluator call (the memory bound for large structures).
+    method, direction:
+        Finite-difference scheme (as in ``Vibrations.read``).  Fixed here
+        because the forces are assembled into the Hessian as they arrive.
+    memmap_dir:
+        Optional directory for on-disk Hessians (``hessian_<k>.npy``
+        memmaps) instead of in-memory arrays.
+    analytic:
+        Use ``batch_evaluator.hessians`` when the evaluator has one.
+    symmetry:
+        Displace only symmetry-inequivalent atoms (tolerance ``symprec``)
+        and rebuild the other Hessian rows with the space-group
+        operations.  Applies to structures whose displaced atoms are all
+        atoms (no ``FixAtoms`` / custom ``indices``) and that have a
+        non-trivial space group; the others are displaced in full.
+        Needs ``direction='central'``: one-sided rows carry the equilibrium
+        forces and the O(delta) error of their own step direction, so
+        rotating them does not give the rows of the other atoms.
     """
 
     def __init__(self,
@@ -67,13 +181,23 @@ class ParallelVibrations:
                  indices: Optional[Sequence] = None,
                  delta: float = 0.01,
                  nfree: int = 2,
-                 batch_size: Optional[int] = None):
+                 batch_size: Optional[int] = None,
+                 pack: bool = False,
+                 max_atoms: Optional[int] = None,
+                 method: str = 'standard',
+                 direction: str = 'central',
+                 memmap_dir=None,
+                 symmetry: bool = False,
+                 symprec: float = SYMPREC,
+                 analytic: bool = True):
         assert nfree in (2, 4)
         self.atoms_list = [a.copy() for a in atoms_list]
         self.batch_evaluator = batch_evaluator
         self.delta = delta
         self.nfree = nfree
         self.batch_size = batch_size
+        self.pack = pack
+        self.max_atoms = max_atoms
 
         self.indices_list: List[np.ndarray] = []
         for atoms in self.atoms_list:
@@ -89,24 +213,108 @@ class ParallelVibrations:
                 raise ValueError('one (or more) indices included more than once')
             self.indices_list.append(np.asarray(idx, dtype=int))
 
-        self.cache_list: List[dict] = [{} for _ in self.atoms_list]
+        self.method = method.lower()
+        self.direction = direction.lower()
+        assert self.method in ('standard', 'frederiksen')
+        assert self.direction in ('central', 'forward', 'backward')
+        if symmetry and self.direction != 'central':
+            raise ValueError("symmetry=True needs direction='central', "
+                             f"not {self.direction!r}")
+        self.memmap_dir = None if memmap_dir is None else Path(memmap_dir)
+        self.analytic = analytic
+        self._weights = _row_weights(self.direction, self.nfree)
+        # column block of atom a in the rows of structure k
+        self._pos_list = [{int(a): 3 * p for p, a in enumerate(idx)}
+                          for idx in self.indices_list]
+
+        # per structure: (irreducible atoms, images) or None (no symmetry)
+        self._symmetry_list = [
+            _space_group_images(atoms, symprec)
+            if symmetry and len(idx) == len(atoms) else None
+            for atoms, idx in zip(self.atoms_list, self.indices_list)]
+
         self.H_list: List[Optional[np.ndarray]] = [None] * len(self.atoms_list)
         self._vibrations_list: List[Optional[VibrationsData]] = \
             [None] * len(self.atoms_list)
-        self.method = 'standard'
-        self.direction = 'central'
 
     # ------------------------------------------------------------------ disps
 
+    def _displaced(self, k: int):
+        """Atoms of structure `k` that are actually displaced."""
+        sym = self._symmetry_list[k]
+        return self.indices_list[k] if sym is None else sym[0]
+
     def _disps_for(self, k: int) -> List[Disp]:
         out = [Disp(0, 0, 0, 0)]
-        for a in self.indices_list[k]:
+        for a in self._displaced(k):
             for i in range(3):
                 for sign in (-1, 1):
                     for ndisp in range(1, self.nfree // 2 + 1):
                         out.append(Disp(int(a), i, sign, ndisp))
         return out
 
+    # -------------------------------------------------------------- hessian
+
+    def _allocate(self):
+        """Fresh zeroed Hessian accumulators (in memory or memmapped)."""
+        if self.memmap_dir is not None:
+            self.memmap_dir.mkdir(parents=True, exist_ok=True)
+        for k, indices in enumerate(self.indices_list):
+            n = 3 * len(indices)
+            if self.memmap_dir is None:
+                self.H_list[k] = np.zeros((n, n))
+            else:
+                self.H_list[k] = np.lib.format.open_memmap(
+                    self.memmap_dir / f"hessian_{k}.npy", mode='w+',
+                    dtype=float, shape=(n, n))
+                self.H_list[k][:] = 0.0
+            self._vibrations_list[k] = None
+
+    def _accumulate(self, k, disps, forces):
+        """Add the forces of displacements `disps` of structure `k` into
+        their Hessian rows, all at once."""
+        H = self.H_list[k]
+        indices = self.indices_list[k]
+        pos = self._pos_list[k]
+        scale = 1.0 / (2 * self.delta)
+        rows, weights, F = [], [], []
+        for d, f in zip(disps, forces):
+            w = self._weights.get((d.sign, d.ndisp))
+            if w is None:
+                continue
+            f = np.asarray(f).reshape(-1, 3)
+            if d.sign == 0:
+                # equilibrium forces enter every row
+                feq = w * scale * f[indices].ravel()
+                for start in range(0, H.shape[0], BLOCK):
+                    H[start:start + BLOCK] += feq
+                continue
+            if self.method == 'frederiksen':
+                f = f.copy()
+                f[d.a] -= f.sum(0)
+            rows.append(pos[d.a] + d.i)
+            weights.append(w * scale)
+            F.append(f[indices].ravel())
+        if rows:
+            np.add.at(H, np.asarray(rows),
+                      np.asarray(weights)[:, None] * np.asarray(F))
+
+    def _unfold(self, k):
+        """Rows of atoms that were not displaced, from the rows of their
+        irreducible atom: block (R a, R b) = R block(a, b) R^T."""
+        sym = self._symmetry_list[k]
+        if sym is None:
+            return
+        irreducible, images = sym
+        n_atoms = len(self.atoms_list[k])
+        Hb = self.H_list[k].reshape(n_atoms, 3, n_atoms, 3)
+        done = set(irreducible)
+        for b, (a, R, perm) in enumerate(images):
+            if b in done:
+                continue
+            rotated = np.einsum('ij,jck,lk->icl', R, np.asarray(Hb[a]), R)
+            Hb[b][:, perm, :] = rotated
+
     # ------------------------------------------------------------------- run
 
     def run(self):
@@ -122,11 +330,53 @@ class ParallelVibrations:
         ``self.atoms_list[k]`` (already an internal copy made in ``__init__``)
         is reused as a working buffer: we shift one coordinate in place,
         evaluate, then restore it — no per-mode ``atoms.copy()``.
+
+        With ``pack=True`` the work is :meth:`_run_packed` instead.  Either
+        way each result is added into its Hessian row as soon as it arrives.
+        A Hessian provider (see the module docstring) replaces all of it.
         """
+        self._allocate()
+        if self.analytic and self._run_provider():
+            return
+        if self.pack:
+            self._run_packed()
+        else:
+            self._run_by_mode()
+        for k in range(len(self.atoms_list)):
+            self._unfold(k)
+
+    def _run_provider(self):
+        """Take the Hessians from ``batch_evaluator.hessians``; False (and
+        nothing changed) if there is no provider or it fails."""
+        provider = getattr(self.batch_evaluator, 'hessians', None)
+        if provider is None:
+            return False
+        print(f"[ParallelVibrations] analytic Hessians for "
+              f"{len(self.atoms_list)} structures")
+        try:
+            hessians = provider(self.atoms_list)
+        except NotImplementedError as e:
+            print(f"[ParallelVibrations] no analytic Hessian ({e}); "
+                  f"using finite differences")
+            return False
+        except Exception:
+            print("[ParallelVibrations] analytic Hessian failed; using "
+                  "finite differences:", traceback.format_exc())
+            return False
+        for k, full in enumerate(hessians):
+            cols = (3 * self.indices_list[k][:, None]
+                    + np.arange(3)).ravel()
+            # read() adds the transpose: store half of the symmetric part
+            sub = np.asarray(full)[np.ix_(cols, cols)]
+            self.H_list[k][:] = 0.25 * (sub + sub.T)
+        return True
+
+    def _run_by_mode(self):
         comp_groups: dict = defaultdict(list)
         for k in range(len(self.atoms_list)):
             atoms = self.atoms_list[k]
-            sig = (len(atoms), tuple(atoms.get_chemical_symbols()))
+            sig = (len(atoms), tuple(atoms.get_chemical_symbols()),
+                   tuple(self._displaced(k)))
             comp_groups[sig].append(k)
 
         for k_indices in comp_groups.values():
@@ -155,69 +405,78 @@ class ParallelVibrations:
                                 atoms.positions[d.a, d.i] -= step
 
                     for k, F in zip(sub_k, F_list):
-                        self.cache_list[k][_disp_name(d)] = \
-                            np.asarray(F).reshape(-1, 3)
+                        self._accumulate(k, [d], [F])
+
+    def _run_packed(self):
+        """Evaluate every displacement of every structure in full calls.
+
+        The (structure, displacement) pairs form one work list; each
+        evaluator call takes the next displaced copies until it holds
+        ``batch_size`` structures or adding one would exceed ``max_atoms``
+        atoms (a call always gets at least one).
+        """
+        work = [(k, d) for k in range(len(self.atoms_list))
+                for d in self._disps_for(k)]
+        bs = self.batch_size or PACK_BATCH_SIZE
+        total = len(work)
+        start = 0
+        while start < total:
+            stop, n_atoms = start, 0
+            while stop < total and stop - start < bs:
+                n = len(self.atoms_list[work[stop][0]])
+                if (self.max_atoms is not None and stop > start
+                        and n_atoms + n > self.max_atoms):
+                    break
+                n_atoms += n
+                stop += 1
+            print(f"[ParallelVibrations] packed displacements "
+                  f"{start + 1}-{stop}/{total} ({n_atoms} atoms)")
+
+            atoms_chunk = []
+            for k, d in work[start:stop]:
+                atoms = self.atoms_list[k].copy()
+                atoms.positions[d.a, d.i] += d.sign * d.ndisp * self.delta
+                atoms_chunk.append(atoms)
+            _, F_list, _ = self.batch_evaluator(atoms_chunk)
+
+            by_structure = defaultdict(lambda: ([], []))
+            for (k, d), F in zip(work[start:stop], F_list):
+                by_structure[k][0].append(d)
+                by_structure[k][1].append(F)
+            for k, (disps, forces) in by_structure.items():
+                self._accumulate(k, disps, forces)
+            start = stop
 
     # ------------------------------------------------------------------ read
 
-    def read(self, method: str = 'standard', direction: str = 'central'):
-        """Assemble the per-structure Hessian from cached forces.
+    def read(self, method: Optional[str] = None,
+             direction: Optional[str] = None):
+        """Finish the Hessians accumulated by :meth:`run`.
 
-        Mirrors ``ase.vibrations.Vibrations.read``.
+        Mirrors ``ase.vibrations.Vibrations.read``; the scheme is the one
+        given to the constructor, so `method` / `direction` may only repeat
+        it.
         """
-        self.method = method.lower()
-        self.direction = direction.lower()
-        assert self.method in ('standard', 'frederiksen')
-        assert self.direction in ('central', 'forward', 'backward')
+        for name, value in (('method', method), ('direction', direction)):
+            if value is not None and value.lower() != getattr(self, name):
+                raise ValueError(
+                    f"forces were assembled for {name}="
+                    f"{getattr(self, name)!r}; construct ParallelVibrations "
+                    f"with {name}={value!r} to use it")
+        if self.H_list[0] is None:
+            raise RuntimeError("ParallelVibrations.read() before run()")
 
         for k, atoms in enumerate(self.atoms_list):
-            indices = self.indices_list[k]
-            cache = self.cache_list[k]
-            n = 3 * len(indices)
-            H = np.empty((n, n))
-            r = 0
-
-            feq = cache['eq'] if self.direction != 'central' else None
-
-            for a in indices:
-                for i in range(3):
-                    fminus = cache[_disp_name(Disp(int(a), i, -1, 1))]
-                    fplus = cache[_disp_name(Disp(int(a), i, 1, 1))]
-                    if self.method == 'frederiksen':
-                        fminus = fminus.copy()
-                        fplus = fplus.copy()
-                        fminus[a] -= fminus.sum(0)
-                        fplus[a] -= fplus.sum(0)
-                    if self.nfree == 4:
-                        fmm = cache[_disp_name(Disp(int(a), i, -1, 2))]
-                        fpp = cache[_disp_name(Disp(int(a), i, 1, 2))]
-                        if self.method == 'frederiksen':
-                            fmm = fmm.copy()
-                            fpp = fpp.copy()
-                            fmm[a] -= fmm.sum(0)
-                            fpp[a] -= fpp.sum(0)
-                    if self.direction == 'central':
-                        if self.nfree == 2:
-                            H[r] = 0.5 * (fminus - fplus)[indices].ravel()
-                        else:
-                            H[r] = (-fmm + 8 * fminus - 8 * fplus + fpp
-                                    )[indices].ravel() / 12.0
-                    elif self.direction == 'forward':
-                        H[r] = (feq - fplus)[indices].ravel()
-                    else:
-                        H[r] = (fminus - feq)[indices].ravel()
-                    H[r] /= 2 * self.delta
-                    r += 1
-
-            H += H.copy().T
-            self.H_list[k] = H
+            if self._vibrations_list[k] is not None:
+                continue
+            _symmetrize(self.H_list[k])
             self._vibrations_list[k] = VibrationsData.from_2d(
-                atoms, H, indices=indices)
+                atoms, self.H_list[k], indices=self.indices_list[k])
 
     # ------------------------------------------------------------- accessors
 
     def _ensure_read(self):
-        if self.H_list[0] is None:
+        if self._vibrations_list[0] is None:
             self.read()
 
     def get_vibrations(self) -> List[VibrationsData]:
@@ -241,12 +500,11 @@ class ParallelVibrations:
 # --------------------------------------------------------------- evaluators
 
 def make_deepmd_evaluator(calculator):
-    """Wrap ``batch_calculator_deepmd`` into the
-    ``(atoms_list) -> (E, F, S)`` signature expected by ParallelVibrations,
-    ParallelFIRE and ParallelLBFGS."""
-    def _eval(atoms_list):
-        return batch_calculator_deepmd(atoms_list, calculator)
-    return _eval
+    """Wrap a DeepMD calculator into the ``(atoms_list) -> (E, F, S)``
+    signature expected by ParallelVibrations, ParallelFIRE and
+    ParallelLBFGS (a :class:`DeepMDBatchEvaluator` with reusable input
+    buffers)."""
+    return DeepMDBatchEvaluator(calculator)
 
 
 
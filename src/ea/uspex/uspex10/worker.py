@@ -7,8 +7,7 @@ a single batched DeepMD evaluation:
 
     1. discover ``CalcFold[N]`` directories under the USPEX workdir,
     2. read each ``geom.in`` (VASP / POSCAR format),
-    3. run staged ParallelFIRE + ParallelLBFGS just like
-       ``create_batch_deepmd.run_full_optimization``,
+    3. run FIRE + staged LBFGS (``ea.parallel.scheduler.StagedRelaxer``),
     4. (optional) compute Gamma-point ZPE per structure with
        ``ea.parallel.zpe.ParallelVibrations``,
     5. write ``geom.out`` (VASP, direct) and ``energy.txt`` back into
@@ -28,9 +27,8 @@ from pathlib import Path
 
 from ase.io import read, write
 
-from ea.parallel.create_batch import batch_calculator_deepmd
-from ea.parallel.FIRE_parallel import ParallelFIRE
-from ea.parallel.LBFGS_parallel import ParallelLBFGS
+from ea.parallel.create_batch import DeepMDBatchEvaluator
+from ea.parallel.scheduler import StagedRelaxer
 from ea.parallel.zpe import ParallelVibrations
 from ea.utils.config import load_config
 
@@ -72,9 +70,8 @@ def make_calculator(model_key, device):
 
 
 def make_evaluator(calculator):
-    def _eval(atoms_list):
-        return batch_calculator_deepmd(atoms_list, calculator)
-    return _eval
+    """Per-wave evaluator owning reusable DeepMD input buffers."""
+    return DeepMDBatchEvaluator(calculator)
 
 
 # ---------------------------------------------------------------------------
@@ -109,7 +106,7 @@ def discover_calcfolders(workdir):
 def _reset_traj_files(workdir, out_dir):
     """Drop ``batch.traj`` and ``<out_dir>/output.traj`` from any previous
     generation BEFORE the optimizers start writing.  If this generation is
-    interrupted, the partial trajectory written by ParallelFIRE/LBFGS is
+    interrupted, the partial trajectory written by the StagedRelaxer is
     preserved for inspection."""
     for f in (Path(workdir) / "batch.traj", Path(out_dir) / "output.traj"):
         if f.is_file():
@@ -118,30 +115,27 @@ def _reset_traj_files(workdir, out_dir):
 
 
 def run_full_optimization(batch, calc, out_dir):
-    evaluator = make_evaluator(calc)
-
-    print(f"\n=== ParallelFIRE  fmax={FIRE_FMAX}  on {len(batch)} structures ===")
-    opt = ParallelFIRE(batch, batch_evaluator=evaluator,
-                       fmax=FIRE_FMAX, max_steps=FIRE_STEPS, maxstep=MAXSTEP)
-    opt.run()
+    """FIRE -> staged LBFGS as one ``StagedRelaxer``: the L-BFGS history
+    survives the tightening fmax stages and the evaluation that meets one
+    threshold is reused for the next, instead of a cold ``ParallelLBFGS``
+    (plus a redundant evaluator call) per stage."""
+    print(f"\n=== StagedRelaxer  FIRE fmax={FIRE_FMAX} -> LBFGS "
+          f"{LBFGS_STAGES}  on {len(batch)} structures ===")
+    opt = StagedRelaxer(batch, batch_evaluator=make_evaluator(calc),
+                        fire_fmax=FIRE_FMAX, fire_steps=FIRE_STEPS,
+                        lbfgs_stages=LBFGS_STAGES, lbfgs_steps=LBFGS_STEPS,
+                        maxstep=MAXSTEP, memory=LBFGS_MEMORY)
+    opt.run(out_dir=out_dir)
     batch = opt.get_atoms()
 
-    for fmax in LBFGS_STAGES:
-        print(f"\n=== ParallelLBFGS  fmax={fmax} ===")
-        opt = ParallelLBFGS(batch, batch_evaluator=evaluator,
-                            fmax=fmax, max_steps=LBFGS_STEPS,
-                            maxstep=MAXSTEP, memory=LBFGS_MEMORY)
-        opt.run(out_dir=out_dir)
-        batch = opt.get_atoms()
-
     print("\n=== final energies ===")
-    for i, s in enumerate(opt.states):
-        tag = "CONVERGED" if s.converged else "not converged"
-        print(f"  struct {i}: E = {s.energy:.4f}  "
-              f"fmax = {s.fmax_current:.4f}  "
-              f"vol = {s.atoms.get_volume():.2f}  [{tag}]")
+    for i, job in enumerate(opt.jobs):
+        tag = "CONVERGED" if job.converged else "not converged"
+        print(f"  struct {i}: E = {job.energy:.4f}  "
+              f"fmax = {job.fmax_current:.4f}  "
+              f"vol = {job.atoms.get_volume():.2f}  [{tag}]")
 
-    return batch, [s.energy for s in opt.states]
+    return batch, opt.get_energies()
 
 
 # ---------------------------------------------------------------------------
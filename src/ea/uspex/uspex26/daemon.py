@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Resident DeepMD evaluation daemon for the USPEX 26 driver.
+
+``run_uspex26.py`` used to launch ``conda run ... python worker.py`` once per
+relaxation wave, paying conda activation, the torch import and a full
+``DP(model=...)`` load every time.  This daemon is started ONCE per USPEX run
+(in the same DeepMD environment), loads the model, and then serves waves over
+a local Unix socket by calling ``worker.run_wave`` with the resident
+calculator.
+
+Protocol: one JSON object per line in each direction, one request per
+connection::
+
+    {"op": "ping"}                                  -> {"ok": true, "pid": ..., "waves": ...}
+    {"op": "wave", "workdir": ..., "argv": [...]}   -> {"ok": true, "relaxed": n, "fallback": m}
+    {"op": "shutdown"}                              -> {"ok": true}
+
+``argv`` holds extra ``worker.py`` flags (``--smoke``, ``--slots`` ...).  A
+failing wave is reported as ``{"ok": false, "error": ...}`` and the daemon
+keeps serving; only a hard crash takes it down, and the driver restarts it.
+
+With ``--multi`` the daemon is instead ONE evaluation service shared by many
+USPEX runs (e.g. the ``run_XXX`` directories of ``prepare_uspex_python.py``):
+drivers register their run directory and the service relaxes the Calcfolds of
+every attached run in one batched scheduler (``worker.MultiRunRelaxer``)::
+
+    {"op": "attach", "workdir": ..., "zpe": false}  -> {"ok": true, "run": {...}}
+    {"op": "detach", "workdir": ...}                -> {"ok": true, "run": {...}}
+    {"op": "stats"}                                 -> {"ok": true, "runs": [...], ...}
+
+This module imports only the standard library at module level so the driver
+(which has no DeepMD dependency) can use ``request`` as the client.
+
+Usage::
+
+    python daemon.py /tmp/ea_deepmd.sock --model deepmd_d3 --device cpu
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+
+POLL = 5        # seconds between liveness checks while waiting for a reply
+
+
+def request(socket_path, payload, timeout=None, alive=None):
+    """Send one request to the daemon at ``socket_path`` and return its reply.
+
+    ``timeout`` bounds the whole exchange (``None``: wait as long as a wave
+    takes).  While waiting, ``alive()`` is polled every ``POLL`` seconds; if it
+    returns False the daemon died mid-request and ``ConnectionError`` is
+    raised instead of blocking forever.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(POLL if timeout is None else min(POLL, timeout))
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        buf = b""
+        while not buf.endswith(b"\n"):
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                if alive is not None and not alive():
+                    raise ConnectionError("evaluation daemon exited mid-request")
+                if deadline is not None and time.monotonic() > deadline:
+                    raise TimeoutError(f"no reply from {socket_path} "
+                                       f"within {timeout}s")
+                continue
+            if not chunk:
+                raise ConnectionError("evaluation daemon closed the connection")
+            buf += chunk
+    return json.loads(buf)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            reply = self.server.dispatch(json.loads(self.rfile.readline()))
+        except Exception:
+            reply = {"ok": False, "error": traceback.format_exc()}
+        self.wfile.write(json.dumps(reply).encode() + b"\n")
+
+
+class EvaluationDaemon(socketserver.UnixStreamServer):
+    """Unix-socket server running one wave at a time with ``run_wave``.
+
+    ``run_wave(workdir, argv)`` does the actual work and returns a dict that
+    is merged into the reply; ``info`` is echoed by ``ping``.
+    """
+
+    def __init__(self, socket_path, run_wave, info=None, service=None):
+        self.socket_path = Path(socket_path)
+        if self.socket_path.exists():
+            # left behind by a daemon that crashed
+            self.socket_path.unlink()
+        super().__init__(str(self.socket_path), _Handler)
+        self.run_wave = run_wave
+        self.service = service
+        self.info = dict(info or {})
+        self.waves = 0
+        self.t_start = time.time()
+
+    def dispatch(self, req):
+        op = req.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid(), "waves": self.waves,
+                    "uptime": time.time() - self.t_start, **self.info}
+        if op in ("attach", "detach", "stats"):
+            if self.service is None:
+                return {"ok": False, "error": f"{op!r} needs a --multi daemon"}
+            if op == "stats":
+                return {"ok": True, **self.service.stats()}
+            if op == "attach":
+                run = self.service.attach(req["workdir"],
+                                          zpe=bool(req.get("zpe")))
+            else:
+                run = self.service.detach(req["workdir"])
+            return {"ok": run is not None, "run": run}
+        if op == "wave":
+            if self.run_wave is None:
+                return {"ok": False, "error": "multi-run service: use 'attach'"}
+            try:
+                result = self.run_wave(req["workdir"], list(req.get("argv", ())))
+            except SystemExit as e:
+                # worker.py reports unrecoverable waves with sys.exit()
+                return {"ok": False, "error": str(e.code)}
+            self.waves += 1
+            return {"ok": True, **(result or {})}
+        if op == "shutdown":
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return {"ok": True}
+        return {"ok": False, "error": f"unknown op {op!r}"}
+
+    def server_close(self):
+        super().server_close()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+class ThreadingEvaluationDaemon(socketserver.ThreadingMixIn, EvaluationDaemon):
+    """``--multi`` variant: requests from many drivers are answered while
+    the shared relaxation runs in the main thread."""
+    daemon_threads = True
+
+
+def main():
+    p = argparse.ArgumentParser(
+        description="Resident DeepMD evaluation daemon for run_uspex26.py"
+    )
+    p.add_argument("socket", type=Path, help="Unix socket path to listen on")
+    p.add_argument("--model", default="deepmd_d3",
+                   help="DeepMD model key (see worker.MODELS)")
+    p.add_argument("--device", default=None,
+                   help="DeepMD device override (default: deepmd.device from config)")
+    p.add_argument("--multi", action="store_true",
+                   help="Serve many USPEX runs from one shared batched "
+                        "relaxation (attach/detach/stats protocol)")
+    p.add_argument("--slots", type=int, default=None,
+                   help="--multi: scheduler slots shared by all runs "
+                        "(default: worker.STREAM_SLOTS)")
+    p.add_argument("--cache", type=Path, default=None,
+                   help="--multi: SQLite relaxation cache shared by the runs "
+                        "(see worker.py --cache; ZPE runs bypass it)")
+    p.add_argument("--cache-tol", type=float, default=None,
+                   help="--multi: cache match tolerance (worker.py "
+                        "--cache-tol)")
+    p.add_argument("--cache-size", type=int, default=None,
+                   help="--multi: cache capacity (worker.py --cache-size)")
+    p.add_argument("--smoke", action="store_true",
+                   help="--multi: abbreviated smoke-test relaxation; cache "
+                        "entries are kept apart from production ones")
+    args = p.parse_args()
+    sys.stdout.reconfigure(line_buffering=True)
+
+    from ea.uspex.uspex26 import worker
+    from ea.utils.config import load_config
+
+    device = args.device or load_config()["deepmd"].get("device", "cpu")
+    t0 = time.perf_counter()
+    calc = worker.make_calculator(args.model, device)
+    print(f"[daemon] model resident after {time.perf_counter() - t0:.1f}s")
+
+    def run_wave(workdir, argv):
+        t_wave = time.perf_counter()
+        wave_args = worker.build_parser().parse_args([workdir, *argv])
+        result = worker.run_wave(wave_args, calc=calc)
+        print(f"[daemon] wave wall time: {time.perf_counter() - t_wave:.1f}s")
+        return result
+
+    info = {"model": args.model, "device": device}
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(143))
+    if args.multi:
+        # same key / tolerance / size handling as worker.py --cache; only
+        # runs without ZPE use the shared cache
+        cache = worker.open_cache(argparse.Namespace(
+            cache=args.cache, model=args.model, smoke=args.smoke, zpe=False,
+            zpe_method=None,
+            cache_tol=(worker.COS_DIST_MAX if args.cache_tol is None
+                       else args.cache_tol),
+            cache_size=(worker.MAX_ENTRIES if args.cache_size is None
+                        else args.cache_size)))
+        schedule = worker.SMOKE_PROFILE if args.smoke else {}
+        serve_multi(args.socket, worker.MultiRunRelaxer(
+            calc, slots=args.slots or worker.STREAM_SLOTS, cache=cache,
+            **schedule), info)
+        return
+
+    server = EvaluationDaemon(args.socket, run_wave, info=info)
+    print(f"[daemon] pid {os.getpid()} listening on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        print(f"[daemon] stopped after {server.waves} wave(s)")
+
+
+def serve_multi(socket_path, relaxer, info=None):
+    """Answer requests in a background thread and run the shared relaxation
+    in this one until a ``shutdown`` request (or SIGTERM)."""
+    server = ThreadingEvaluationDaemon(socket_path, None, info=info,
+                                       service=relaxer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stop = threading.Event()
+    # 'shutdown' stops the request loop; the relaxation loop follows it
+    threading.Thread(target=lambda: (thread.join(), stop.set()),
+                     daemon=True).start()
+    print(f"[daemon] pid {os.getpid()} serving runs on {socket_path}")
+    try:
+        relaxer.serve(stop)
+    finally:
+        server.shutdown()
+        server.server_close()
+        print(f"[daemon] stopped; per-run accounting: "
+              f"{json.dumps(relaxer.stats()['runs'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,16 +15,42 @@ containing ``input.xyz`` and launches ``commandExecutable``
 ``numParallelCalcs`` sets how many run at once and USPEX pins one core to
 each (``whichCluster = 0`` -> 'local, free cores').
 
-Once a whole wave of folders is present and settled, this driver calls
-the batched worker (``worker.py``) ONCE; the worker relaxes every pending
-Calcfold and writes ``output.xyz`` back, letting each
-``run_batch.py`` exit so USPEX collects results and launches the next wave.
+Once a whole wave of folders is present, this driver calls the batched
+worker (``worker.py``) ONCE; the worker relaxes every pending Calcfold and
+writes ``output.xyz`` back, letting each ``run_batch.py`` exit so USPEX
+collects results and launches the next wave.  Folders are tracked by
+``watch.CalcfoldWatcher`` (inotify close-write events, polling fallback
+with ``--poll``): a wave fires as soon as ``numParallelCalcs`` inputs are
+complete, or once a smaller wave (end of a generation) has not grown for
+``SETTLE`` seconds.  With ``--stream`` the worker starts on the first
+complete input and admits the rest of the wave (and the following ones)
+into its running batched relaxation as USPEX writes them, overlapping
+input generation with relaxation; it returns to the driver once it has
+been idle for ``worker.STREAM_IDLE`` seconds.
 
 The worker needs the DeepMD environment, so it is run in the ``deepmd``
 conda env (``deepmd.conda_env`` in the EA config) via ``conda run`` unless
 ``--worker-python`` / ``$WORKER_PY`` points at an explicit interpreter.
 This driver itself needs no DeepMD dependency.
 
+By default the waves are not run as one-shot worker processes: the driver
+starts the evaluation daemon (``daemon.py``) ONCE, in that same environment,
+and sends each wave to it over a Unix socket, so conda activation, the torch
+import and the model load are paid once per USPEX run instead of once per
+wave.  The daemon is launched before USPEX and loads the model while USPEX
+writes the first wave; the first wave waits for it to be ready.  It is
+pinged before every wave and restarted if it died or hangs, including a
+wave that takes longer than ``--wave-timeout``; a lost wave is retried on a
+fresh daemon, and if that fails too the wave falls back to the one-shot
+worker.  ``--no-daemon``
+restores the one-shot worker for every wave.
+
+With ``--service SOCKET`` (or ``$EA_SERVICE``) the run is attached to ONE
+shared ``daemon.py --multi`` evaluation service instead, which relaxes the
+Calcfolds of many concurrent USPEX runs in the same batched evaluator calls
+(see ``prepare_uspex_python.py --service``); the driver only health-checks
+it and falls back to its own daemon if the service disappears.
+
 Usage::
 
     python run_uspex26.py                       # workdir = cwd, model=deepmd_d3, cpu
@@ -39,6 +65,7 @@ import re
 import signal
 import subprocess
 import sys
+import tempfile
 import time
 from pathlib import Path
 
@@ -47,14 +74,24 @@ from pathlib import Path
 EA_SRC = str(Path(__file__).resolve().parents[3])
 sys.path.insert(0, EA_SRC)
 from ea.utils.config import load_config
+from ea.uspex.uspex26.daemon import request
+from ea.uspex.uspex26.watch import CalcfoldWatcher, folder_pending
 
 SCRIPT_DIR = Path(__file__).resolve().parent
 WORKER = SCRIPT_DIR / "worker.py"
+DAEMON = SCRIPT_DIR / "daemon.py"
 CALC_DIR = "Calculation"      # USPEX 26 base_calc_folder
 DEFAULT_USPEX = "/home/vito/uspex_python/USPEX26/uspex_2607_linux/uspex_2607.sh"
 
-POLL = 3        # seconds between scans
-SETTLE = 3      # require the pending set to be stable this long
+POLL = 3        # seconds between scans (polling fallback / idle wake-up)
+SETTLE = 3      # fire a partial wave once it has not grown for this long
+
+DAEMON_STARTUP = 900    # seconds allowed for conda + torch import + model load
+DAEMON_PING = 30        # a resident daemon must answer a ping this fast
+DAEMON_RETRIES = 1      # fresh daemons tried for a wave lost to a crash
+DAEMON_WAVE = 6 * 3600  # seconds one wave may take before the daemon is
+                        # considered hung and restarted
+SERVICE_PING = 30       # seconds between health checks of a shared service
 
 
 def validate_molecular_interface(workdir):
@@ -81,6 +118,20 @@ def validate_molecular_interface(workdir):
         )
 
 
+def read_num_parallel(workdir):
+    """``numParallelCalcs`` from INPUT.txt (``value : key`` or ``% key``
+    block form), or None if it is not set."""
+    input_path = Path(workdir) / "INPUT.txt"
+    if not input_path.is_file():
+        return None
+    text = input_path.read_text(errors="replace")
+    match = (re.search(r"^\s*(\d+)\s*:\s*numParallelCalcs\b", text,
+                       flags=re.IGNORECASE | re.MULTILINE)
+             or re.search(r"%\s*numParallelCalcs\s*\r?\n\s*(\d+)", text,
+                          flags=re.IGNORECASE))
+    return int(match.group(1)) if match else None
+
+
 def resolve_uspex(cfg, override=None):
     """USPEX 26 binary: --uspex-exe -> $USPEX26_EXE -> config uspex26.exe -> default."""
     if override:
@@ -97,40 +148,237 @@ def count_pending(workdir):
     base = Path(workdir) / CALC_DIR
     if not base.is_dir():
         return 0
-    n = 0
-    for d in base.glob("Calcfold_*"):
-        ase_input = d / "input.xyz"
-        user_input = d / "geom.in"
-        ase_pending = (ase_input.is_file() and ase_input.stat().st_size > 0
-                       and not (d / "output.xyz").is_file())
-        user_pending = (user_input.is_file() and user_input.stat().st_size > 0
-                        and not (d / "energy.txt").is_file())
-        if d.is_dir() and (ase_pending or user_pending):
-            n += 1
-    return n
-
-
-def build_worker_cmd(cfg, workdir, model, device, worker_python, smoke=False):
+    return sum(1 for d in base.glob("Calcfold_*")
+               if d.is_dir() and folder_pending(d))
+
+
+def _deepmd_python(cfg, worker_python, tail):
+    """Prefix *tail* with the interpreter of the DeepMD environment."""
+    if worker_python:
+        return [worker_python, *tail]
+    conda_env = (cfg.get("deepmd") or {}).get("conda_env", "deepmd_env")
+    return ["conda", "run", "--no-capture-output", "-n", conda_env, "python", *tail]
+
+
+def build_worker_cmd(cfg, workdir, model, device, worker_python, smoke=False,
+                     stream=False, cache=None):
     """Command that runs worker.py in the DeepMD environment."""
     tail = [str(WORKER), str(workdir), "--model", model]
     if device:
         tail += ["--device", device]
     if smoke:
         tail.append("--smoke")
-    if worker_python:
-        return [worker_python, *tail]
-    conda_env = (cfg.get("deepmd") or {}).get("conda_env", "deepmd_env")
-    return ["conda", "run", "--no-capture-output", "-n", conda_env, "python", *tail]
+    if stream:
+        tail.append("--stream")
+    if cache:
+        tail += ["--cache", str(cache)]
+    return _deepmd_python(cfg, worker_python, tail)
+
+
+def build_daemon_cmd(cfg, socket_path, model, device, worker_python):
+    """Command that runs the resident daemon.py in the DeepMD environment."""
+    tail = [str(DAEMON), str(socket_path), "--model", model]
+    if device:
+        tail += ["--device", device]
+    return _deepmd_python(cfg, worker_python, tail)
+
+
+def _worker_env():
+    env = os.environ.copy()
+    env["PYTHONPATH"] = EA_SRC + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+class DaemonSupervisor:
+    """Owns the evaluation daemon process: start, health check, restart.
+
+    ``launch`` only spawns the daemon, so the model loads while the caller
+    does other work (USPEX generating the first wave); the first ``ensure``
+    / ``run_wave`` then waits for it to answer a ping.  ``run_wave`` returns
+    the daemon's reply, or None when the daemon could not relax the wave
+    (the caller then falls back to the one-shot worker).  A wave that takes
+    longer than ``wave_timeout`` seconds counts as a hung daemon, which is
+    restarted.
+    """
+
+    def __init__(self, cmd, socket_path, workdir, log_path,
+                 startup=DAEMON_STARTUP, ping_timeout=DAEMON_PING,
+                 wave_timeout=DAEMON_WAVE):
+        self.cmd = cmd
+        self.socket_path = Path(socket_path)
+        self.workdir = workdir
+        self.log_path = log_path
+        self.startup = startup
+        self.ping_timeout = ping_timeout
+        self.wave_timeout = wave_timeout
+        self.proc = None
+        self.restarts = 0
+        self._deadline = None       # startup deadline of a launched daemon
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def ping(self, timeout=None):
+        try:
+            reply = request(self.socket_path, {"op": "ping"},
+                            timeout=timeout or self.ping_timeout)
+        except (OSError, ValueError):
+            return None
+        return reply if reply.get("ok") else None
+
+    def launch(self):
+        """Spawn the daemon without waiting for it to be ready."""
+        self.stop()
+        with open(self.log_path, "a") as log:
+            self.proc = subprocess.Popen(
+                self.cmd, cwd=self.workdir, env=_worker_env(), stdout=log,
+                stderr=subprocess.STDOUT, start_new_session=True,
+            )
+        self._deadline = time.monotonic() + self.startup
+        print(f"[launcher] evaluation daemon PID {self.proc.pid} starting "
+              f"(socket: {self.socket_path})", flush=True)
+
+    def wait_ready(self):
+        """Wait (until the startup deadline) for a launched daemon to answer
+        a ping."""
+        while time.monotonic() < self._deadline:
+            if not self.alive():
+                print(f"[launcher] evaluation daemon exited during startup "
+                      f"(rc={self.proc.returncode})", flush=True)
+                self._deadline = None
+                return False
+            if self.socket_path.exists() and self.ping() is not None:
+                print("[launcher] evaluation daemon ready", flush=True)
+                self._deadline = None
+                return True
+            time.sleep(1)
+        print("[launcher] evaluation daemon did not come up in "
+              f"{self.startup}s", flush=True)
+        self.stop()
+        return False
+
+    def start(self):
+        """Launch the daemon and wait until it answers a ping."""
+        self.launch()
+        return self.wait_ready()
+
+    def ensure(self):
+        """Health check; (re)start the daemon if it is dead or hung.  A
+        daemon still starting up (``launch``) is waited for first."""
+        if self._deadline is not None and self.wait_ready():
+            return True
+        if self.alive() and self.ping() is not None:
+            return True
+        if self.proc is not None:
+            self.restarts += 1
+            print(f"[launcher] evaluation daemon unhealthy; restart "
+                  f"#{self.restarts}", flush=True)
+        return self.start()
+
+    def run_wave(self, workdir, argv=()):
+        for attempt in range(1 + DAEMON_RETRIES):
+            if not self.ensure():
+                continue
+            try:
+                reply = request(self.socket_path,
+                                {"op": "wave", "workdir": str(workdir),
+                                 "argv": list(argv)},
+                                timeout=self.wave_timeout, alive=self.alive)
+            except TimeoutError:
+                # alive but stuck: replace it for the retry / the next wave
+                print(f"[launcher] evaluation daemon hung: no reply within "
+                      f"{self.wave_timeout}s; restarting it", flush=True)
+                self.restarts += 1
+                self.stop(hung=True)
+                continue
+            except (OSError, ValueError) as e:
+                # ensure() restarts it for the retry / the next wave
+                print(f"[launcher] evaluation daemon lost during wave: {e}",
+                      flush=True)
+                continue
+            if reply.get("ok"):
+                return reply
+            print(f"[launcher] wave failed in evaluation daemon:\n"
+                  f"{reply.get('error')}", flush=True)
+            return None
+        return None
+
+    def stop(self, hung=False):
+        """Shut the daemon down; a `hung` one is terminated right away
+        instead of being asked to shut down."""
+        if self.proc is None:
+            return
+        if self.alive() and not hung:
+            try:
+                request(self.socket_path, {"op": "shutdown"}, timeout=10)
+                self.proc.wait(timeout=30)
+            except (OSError, ValueError, subprocess.TimeoutExpired):
+                pass
+        if self.alive():
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        self.proc = None
+        self._deadline = None
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+
+
+def follow_service(socket_path, workdir, proc, zpe=False):
+    """Let a shared ``daemon.py --multi`` service relax this run.
+
+    Attaches ``workdir``, then health-checks the service every
+    ``SERVICE_PING`` seconds while USPEX runs.  Returns True once USPEX has
+    finished (the run is detached and its accounting printed), False as soon
+    as the service is unreachable so the caller can relax locally instead.
+    """
+    try:
+        reply = request(socket_path, {"op": "attach", "workdir": str(workdir),
+                                      "zpe": zpe}, timeout=DAEMON_PING)
+    except (OSError, ValueError) as e:
+        print(f"[launcher] evaluation service {socket_path} unreachable: {e}",
+              flush=True)
+        return False
+    if not reply.get("ok"):
+        print(f"[launcher] evaluation service refused attach: "
+              f"{reply.get('error')}", flush=True)
+        return False
+    print(f"[launcher] attached to evaluation service {socket_path}", flush=True)
+
+    while True:
+        try:
+            proc.wait(timeout=SERVICE_PING)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+        try:
+            alive = request(socket_path, {"op": "ping"},
+                            timeout=DAEMON_PING).get("ok")
+        except (OSError, ValueError):
+            alive = False
+        if not alive:
+            print("[launcher] evaluation service lost; relaxing locally",
+                  flush=True)
+            return False
+
+    try:
+        run = request(socket_path, {"op": "detach", "workdir": str(workdir)},
+                      timeout=DAEMON_PING).get("run")
+        print(f"[launcher] detached from evaluation service: {run}", flush=True)
+    except (OSError, ValueError) as e:
+        print(f"[launcher] detach failed: {e}", flush=True)
+    return True
 
 
 def run_worker(cmd, workdir, n, device, log_path):
     print(f"[launcher] {time.strftime('%H:%M:%S')} relaxing wave of {n} "
           f"folder(s) with DeepMD ({device})", flush=True)
-    env = os.environ.copy()
-    env["PYTHONPATH"] = EA_SRC + os.pathsep + env.get("PYTHONPATH", "")
     with open(log_path, "a") as log:
         subprocess.run(
-            cmd, cwd=workdir, env=env, stdout=log,
+            cmd, cwd=workdir, env=_worker_env(), stdout=log,
             stderr=subprocess.STDOUT, check=True,
         )
 
@@ -156,6 +404,28 @@ def main():
     p.add_argument("--smoke", action="store_true",
                    help="Pass the abbreviated smoke-test optimization profile "
                         "to the worker; do not use for production")
+    p.add_argument("--stream", action="store_true",
+                   help="Start relaxing as soon as the first Calcfold input "
+                        "lands; the worker admits the rest of the wave as it "
+                        "appears and publishes each result when it finishes")
+    p.add_argument("--cache", default=os.environ.get("EA_RELAX_CACHE"),
+                   help="SQLite relaxation cache shared across waves and "
+                        "runs (worker.py --cache; default: $EA_RELAX_CACHE)")
+    p.add_argument("--poll", action="store_true",
+                   help="Detect Calcfold inputs by periodic rescans instead "
+                        "of inotify events")
+    p.add_argument("--service", default=os.environ.get("EA_SERVICE"),
+                   help="Unix socket of a shared 'daemon.py --multi' "
+                        "evaluation service to attach this run to "
+                        "(default: $EA_SERVICE); falls back to local "
+                        "relaxation if the service goes away")
+    p.add_argument("--no-daemon", action="store_true",
+                   help="Launch a one-shot worker.py per wave instead of "
+                        "keeping the model resident in the evaluation daemon")
+    p.add_argument("--wave-timeout", type=float, default=DAEMON_WAVE,
+                   help="Seconds one wave may take in the evaluation daemon "
+                        "before it is considered hung and restarted "
+                        f"(default: {DAEMON_WAVE})")
     args = p.parse_args()
 
     cfg = load_config()
@@ -179,13 +449,40 @@ def main():
                         "Specific", "results1"], cwd=workdir)
 
     worker_cmd = build_worker_cmd(
-        cfg, workdir, args.model, device, args.worker_python, args.smoke
+        cfg, workdir, args.model, device, args.worker_python, args.smoke,
+        args.stream, args.cache,
     )
     worker_log = os.path.join(workdir, "deepmd_worker.log")
 
+    daemon = None
+    if not args.no_daemon:
+        socket_path = Path(tempfile.gettempdir()) / f"ea_deepmd_{os.getpid()}.sock"
+        daemon = DaemonSupervisor(
+            build_daemon_cmd(cfg, socket_path, args.model, device,
+                             args.worker_python),
+            socket_path, workdir, worker_log, wave_timeout=args.wave_timeout,
+        )
+    wave_argv = worker_cmd[worker_cmd.index(str(WORKER)) + 2:]
+
+    def relax_wave(n):
+        if daemon is not None:
+            print(f"[launcher] {time.strftime('%H:%M:%S')} relaxing wave of "
+                  f"{n} folder(s) in the evaluation daemon", flush=True)
+            if daemon.run_wave(workdir, wave_argv) is not None:
+                return
+            print("[launcher] falling back to a one-shot worker", flush=True)
+        run_worker(worker_cmd, workdir, n, device, worker_log)
+
     print(f"[launcher] workdir : {workdir}")
     print(f"[launcher] uspex26 : {uspex}")
     print(f"[launcher] worker  : {' '.join(worker_cmd)}")
+    if args.service:
+        print(f"[launcher] service : {args.service}")
+    elif daemon is not None:
+        print(f"[launcher] daemon  : {' '.join(daemon.cmd)}")
+        # Load the model while USPEX generates the first wave; the first
+        # relax_wave waits for it to be ready.
+        daemon.launch()
     print(f"[launcher] starting USPEX 26 (model={args.model}, device={device})", flush=True)
 
     uspex_log = open(os.path.join(workdir, "uspex_run.log"), "w")
@@ -194,6 +491,8 @@ def main():
     print(f"[launcher] USPEX 26 PID {proc.pid}  (log: uspex_run.log)", flush=True)
 
     def cleanup(*_):
+        if daemon is not None:
+            daemon.stop()
         if proc.poll() is None:
             print(f"[launcher] stopping USPEX 26 (PID {proc.pid})", flush=True)
             proc.terminate()
@@ -201,24 +500,32 @@ def main():
     signal.signal(signal.SIGINT, lambda *_: (cleanup(), sys.exit(130)))
     signal.signal(signal.SIGTERM, lambda *_: (cleanup(), sys.exit(143)))
 
+    watcher = CalcfoldWatcher(workdir, use_inotify=not args.poll)
+    expected = read_num_parallel(workdir)
+    print(f"[launcher] watching {CALC_DIR}/ with "
+          f"{'inotify' if watcher.inotify else 'polling'}; full wave = "
+          f"{expected if expected else '?'} folder(s)", flush=True)
+
     try:
+        if args.service and follow_service(args.service, workdir, proc):
+            return
         print(f"[launcher] DeepMD worker driver started (worker: {WORKER})", flush=True)
         while proc.poll() is None:
-            n = count_pending(workdir)
-            if n > 0:
-                # Wait until the wave stops growing, so USPEX has finished
-                # writing every input file before the batched worker reads them.
-                time.sleep(SETTLE)
-                if count_pending(workdir) == n and proc.poll() is None:
-                    run_worker(worker_cmd, workdir, n, device, worker_log)
-                    continue
-            time.sleep(POLL)
+            n = len(watcher.pending)
+            if n > 0 and (args.stream or (expected and n >= expected)
+                          or watcher.idle() >= SETTLE):
+                relax_wave(n)
+                # pick up the published outputs before counting again
+                watcher.wait(0)
+                continue
+            watcher.wait(POLL if n == 0 else SETTLE - watcher.idle())
 
         print("[launcher] USPEX 26 finished; final worker sweep", flush=True)
         n = count_pending(workdir)
         if n > 0:
-            run_worker(worker_cmd, workdir, n, device, worker_log)
+            relax_wave(n)
     finally:
+        watcher.close()
         cleanup()
         rc = proc.wait()
         uspex_log.close()
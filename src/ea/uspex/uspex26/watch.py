@@ -0,0 +1,224 @@
+"""Event-driven tracking of pending USPEX 26 Calcfolds.
+
+``CalcfoldWatcher`` keeps an incremental set of the
+``Calculation/Calcfold_*`` folders whose relaxation input is complete
+(``input.xyz`` for code 20, ``geom.in`` for code 99) but whose completion
+marker (``output.xyz`` / ``energy.txt``) is not there yet.  On Linux it
+uses inotify (through ``ctypes``, no extra dependency): an input counts as
+complete on its close-write (or rename-into-place) event, and only the folder
+an event names is re-examined.  Elsewhere, or if inotify is unavailable, it
+falls back to periodic rescans.
+
+Inputs found by a scan rather than an event (startup, a folder created
+before its watch was added, polling mode) may still be being written, so
+they only count once they have not been modified for ``FRESH`` seconds.
+
+Only the standard library is used so the DeepMD-free driver can import it.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from pathlib import Path
+
+CALC_DIR = "Calculation"
+INPUTS = ("input.xyz", "geom.in")
+MARKERS = {"input.xyz": "output.xyz", "geom.in": "energy.txt"}
+FRESH = 1.0     # seconds an input found by a scan must be left untouched
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_DIR_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM
+_FOLDER_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM
+_EVENT = struct.Struct("iIII")
+
+
+def folder_pending(d, fresh=0.0):
+    """Whether Calcfold *d* has a complete input and no completion marker.
+
+    ``fresh > 0`` additionally ignores inputs modified in the last ``fresh``
+    seconds, which may still be being written.
+    """
+    now = time.time()
+    for name in INPUTS:
+        try:
+            st = (d / name).stat()
+        except OSError:
+            continue
+        if st.st_size == 0 or now - st.st_mtime < fresh:
+            continue
+        if not (d / MARKERS[name]).is_file():
+            return True
+    return False
+
+
+def _inotify():
+    """Return libc with inotify bound, or None where it is unavailable."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None,
+                           use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                           ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class CalcfoldWatcher:
+    """Incremental pending set for ``<workdir>/Calculation/Calcfold_*``.
+
+    ``wait(timeout)`` blocks until something changes (or ``timeout``
+    expires) and updates ``pending``; ``idle()`` is the time since a folder
+    last became pending.  ``use_inotify=False`` forces the polling fallback.
+    """
+
+    def __init__(self, workdir, use_inotify=True, fresh=FRESH):
+        self.workdir = Path(workdir)
+        self.base = self.workdir / CALC_DIR
+        self.fresh = fresh
+        self.pending = set()
+        self.t_grown = time.monotonic()
+        self._unsure = set()    # folders with an input too fresh to trust
+        self._fd = None
+        self._wd = {}
+        self._libc = _inotify() if use_inotify else None
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+            else:
+                self._libc = None
+        self.rescan()
+
+    @property
+    def inotify(self):
+        return self._fd is not None
+
+    def idle(self):
+        return time.monotonic() - self.t_grown
+
+    # ---- bookkeeping ------------------------------------------------------
+
+    def _set(self, d, pending):
+        if pending and d not in self.pending:
+            self.pending.add(d)
+            self.t_grown = time.monotonic()
+            return True
+        if not pending and d in self.pending:
+            self.pending.discard(d)
+            return True
+        return False
+
+    def _check(self, d, trusted=False):
+        """Re-examine one folder; ``trusted`` after a close-write event."""
+        pending = folder_pending(d, 0.0 if trusted else self.fresh)
+        if pending or trusted or not folder_pending(d):
+            self._unsure.discard(d)
+        else:
+            self._unsure.add(d)
+        return self._set(d, pending)
+
+    def _watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd >= 0:
+            self._wd[wd] = Path(path)
+
+    def rescan(self):
+        """Full scan (startup, queue overflow, polling mode)."""
+        changed = False
+        if self.inotify:
+            for wd in list(self._wd):
+                self._libc.inotify_rm_watch(self._fd, wd)
+            self._wd.clear()
+            self._watch(self.workdir, _DIR_MASK)
+            if self.base.is_dir():
+                self._watch(self.base, _DIR_MASK)
+        seen = set()
+        if self.base.is_dir():
+            for d in self.base.glob("Calcfold_*"):
+                if d.is_dir():
+                    if self.inotify:
+                        self._watch(d, _FOLDER_MASK)
+                    seen.add(d)
+                    changed |= self._check(d)
+        for d in (self.pending | self._unsure) - seen:
+            self._unsure.discard(d)
+            changed |= self._set(d, False)
+        return changed
+
+    # ---- waiting ----------------------------------------------------------
+
+    def wait(self, timeout):
+        """Block up to ``timeout`` seconds; True if ``pending`` changed."""
+        if not self.inotify:
+            time.sleep(timeout)
+            return self.rescan()
+        if self._unsure:
+            timeout = min(timeout, self.fresh)
+        ready, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        changed = self._drain() if ready else False
+        for d in list(self._unsure):
+            changed |= self._check(d)
+        return changed
+
+    def _drain(self):
+        changed = False
+        while True:
+            try:
+                buf = os.read(self._fd, 65536)
+            except BlockingIOError:
+                return changed
+            off = 0
+            while off < len(buf):
+                wd, mask, _, size = _EVENT.unpack_from(buf, off)
+                name = buf[off + _EVENT.size: off + _EVENT.size + size]
+                name = os.fsdecode(name.rstrip(b"\0"))
+                off += _EVENT.size + size
+                if mask & IN_Q_OVERFLOW:
+                    return self.rescan() or True
+                changed |= self._event(wd, mask, name)
+
+    def _event(self, wd, mask, name):
+        if mask & IN_IGNORED:
+            self._wd.pop(wd, None)
+            return False
+        path = self._wd.get(wd)
+        if path is None:
+            return False
+        if path == self.workdir:
+            if name == CALC_DIR and mask & IN_ISDIR:
+                return self.rescan()
+            return False
+        if path == self.base:
+            d = self.base / name
+            if not (mask & IN_ISDIR and name.startswith("Calcfold_")):
+                return False
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._watch(d, _FOLDER_MASK)
+                return self._check(d)
+            self._unsure.discard(d)
+            return self._set(d, False)
+        if name in INPUTS or name in MARKERS.values():
+            return self._check(path, trusted=bool(mask & (IN_CLOSE_WRITE
+                                                          | IN_MOVED_TO)))
+        return False
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._wd.clear()
@@ -8,13 +8,20 @@ a single batched DeepMD evaluation:
     1. discover ``CalcFold[N]`` directories under the USPEX workdir,
     2. read each USPEX 26 ASE ``input.xyz`` (preferred) or legacy
        USER_CODE ``geom.in`` file,
-    3. run staged ParallelFIRE + ParallelLBFGS just like
-       ``create_batch_deepmd.run_full_optimization``,
-    4. (optional) compute Gamma-point ZPE per structure with
-       ``ea.parallel.zpe.ParallelVibrations``,
+    3. run FIRE + staged LBFGS (``ea.parallel.scheduler.StagedRelaxer``),
+       optionally after a rigid-molecule pre-optimization
+       (``ea.parallel.rigid_body.ParallelRigidBodyRelaxer``) and/or with
+       the Exp preconditioner (``ea.parallel.precon``, ``--precon``),
+    4. (optional) compute ZPE per structure -- Gamma-point with
+       ``ea.parallel.zpe.ParallelVibrations`` or on a phonopy q-mesh with
+       ``ea.parallel.phonons.ParallelPhonons`` -- for every structure, or
+       (``ZPEPolicy``) only for the low-energy ones, the rest getting the
+       running mean ZPE per atom of their composition,
     5. write ``output.xyz`` with energy metadata (ASE/code 20) or legacy
        ``geom.out`` + ``energy.txt`` (USER_CODE/code 99) back into each
-       CalcFolder.  The completion marker is published last/atomically.
+       CalcFolder.  The completion marker is published last/atomically,
+       per structure, as soon as that structure finishes its schedule
+       (``ResultPublisher``), not after the slowest one.
 
 USPEX 26 molecular calculations must use the ASE/code-20 interface.  Its
 extended-XYZ files preserve molecule/template atom order.  The code-99 POSCAR
@@ -22,24 +29,36 @@ writer groups all atoms globally by element, after which USPEX cannot rebuild
 the original molecular components even though it can still read energy.txt.
 
 Driven by ``run_uspex26.py`` (this package); not meant to be run
-N times in parallel — exactly once per USPEX 26 relaxation wave.
+N times in parallel — exactly once per USPEX 26 relaxation wave, either as a
+one-shot process or through ``run_wave`` inside the resident evaluation
+daemon (``daemon.py``).
 """
 
 import argparse
+import bisect
+import json
 import os
 import re
 import sys
+import threading
 import time
 import traceback
+from collections import deque
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Any
 
+from ase.calculators.singlepoint import SinglePointCalculator
 from ase.io import read, write
 
-from ea.parallel.create_batch import batch_calculator_deepmd
-from ea.parallel.FIRE_parallel import ParallelFIRE
-from ea.parallel.LBFGS_parallel import ParallelLBFGS
+from ea.parallel.create_batch import DeepMDBatchEvaluator
+from ea.parallel.phonons import ParallelPhonons
+from ea.parallel.relax_cache import COS_DIST_MAX, MAX_ENTRIES, RelaxationCache
+from ea.parallel.rigid_body import RIGID_FMAX, ParallelRigidBodyRelaxer
+from ea.parallel.scheduler import RelaxationScheduler, StagedRelaxer
 from ea.parallel.zpe import ParallelVibrations
 from ea.utils.config import load_config
+from ea.uspex.uspex26.watch import FRESH, folder_pending
 
 
 MODELS = {
@@ -57,6 +76,13 @@ FIRE_STEPS = 500
 LBFGS_STEPS = 1200
 MAXSTEP = 0.03
 LBFGS_MEMORY = 40
+SMOKE_PROFILE = {"fire_steps": 2, "lbfgs_steps": 2, "lbfgs_stages": (0.03,)}
+
+STREAM_SLOTS = 64       # default scheduler slots in --stream mode
+STREAM_IDLE = 30.0      # --stream ends after this long with nothing to do
+STREAM_SCAN = 1.0       # seconds between CalcFolder scans while relaxing
+ZPE_BATCH = 8           # finished structures per buffered ZPE batch
+ZPE_STATS = "zpe_stats.json"    # running ZPE/atom means, under the workdir
 
 
 # ---------------------------------------------------------------------------
@@ -79,9 +105,8 @@ def make_calculator(model_key, device):
 
 
 def make_evaluator(calculator):
-    def _eval(atoms_list):
-        return batch_calculator_deepmd(atoms_list, calculator)
-    return _eval
+    """Per-wave evaluator owning reusable DeepMD input buffers."""
+    return DeepMDBatchEvaluator(calculator)
 
 
 # ---------------------------------------------------------------------------
@@ -130,6 +155,16 @@ def _pending(cf):
     return False
 
 
+def read_calcfolder_input(cf):
+    """Return ``(mode, atoms)`` for the input of a pending calc folder."""
+    mode = calcfolder_mode(cf)
+    if mode == ASE_MODE:
+        return mode, read(cf / "input.xyz", format="extxyz")
+    if mode == USER_CODE_MODE:
+        return mode, read(cf / "geom.in", format="vasp")
+    raise ValueError("no supported non-empty input file")
+
+
 def discover_calcfolders(workdir):
     """Return pending ``(sort_key, path)`` calculation folders.
 
@@ -169,7 +204,7 @@ def discover_calcfolders(workdir):
 def _reset_traj_files(workdir, out_dir):
     """Drop ``batch.traj`` and ``<out_dir>/output.traj`` from any previous
     generation BEFORE the optimizers start writing.  If this generation is
-    interrupted, the partial trajectory written by ParallelFIRE/LBFGS is
+    interrupted, the partial trajectory written by the StagedRelaxer is
     preserved for inspection."""
     for f in (Path(workdir) / "batch.traj", Path(out_dir) / "output.traj"):
         if f.is_file():
@@ -177,6 +212,21 @@ def _reset_traj_files(workdir, out_dir):
             print(f"[batch_worker] removed stale trajectory: {f}")
 
 
+def run_rigid_preoptimization(batch, calc, max_steps):
+    """Move the molecules of `batch` as rigid bodies (plus the cell) until
+    the molecular forces drop below ``RIGID_FMAX``, so the atomistic FIRE
+    stage does not start from a bad packing.  Atom order is kept."""
+    print(f"\n=== ParallelRigidBodyRelaxer  fmax={RIGID_FMAX}  "
+          f"<= {max_steps} steps  on {len(batch)} structures ===")
+    opt = ParallelRigidBodyRelaxer(batch, make_evaluator(calc),
+                                   max_steps=max_steps)
+    opt.run()
+    n_mol = sum(s.is_molecular() for s in opt.states)
+    print(f"[batch_worker] rigid pre-optimization: {n_mol} molecular "
+          f"structure(s), {opt.nsteps_done} step(s)")
+    return opt.get_atoms()
+
+
 def run_full_optimization(
     batch,
     calc,
@@ -185,40 +235,398 @@ def run_full_optimization(
     fire_steps=FIRE_STEPS,
     lbfgs_steps=LBFGS_STEPS,
     lbfgs_stages=LBFGS_STAGES,
+    screening=None,
+    screen_min=1,
+    dedup_every=None,
+    precon=None,
+    on_finished=None,
 ):
-    evaluator = make_evaluator(calc)
-
-    print(f"\n=== ParallelFIRE  fmax={FIRE_FMAX}  on {len(batch)} structures ===")
-    opt = ParallelFIRE(batch, batch_evaluator=evaluator,
-                       fmax=FIRE_FMAX, max_steps=fire_steps, maxstep=MAXSTEP)
-    opt.run()
+    """FIRE -> staged LBFGS as one ``StagedRelaxer``: the L-BFGS history
+    survives the tightening fmax stages and the evaluation that meets one
+    threshold is reused for the next, instead of a cold ``ParallelLBFGS``
+    (plus a redundant evaluator call) per stage.
+
+    ``screening`` (fractions refined past each LBFGS stage) switches to the
+    successive-halving ranking mode; structures retired early keep their
+    best-so-far geometry/energy and get ``info['screened_out_fmax']``.
+
+    ``dedup_every`` collapses structures that reach the same basin during
+    L-BFGS (checked every that many steps); they all get the result of the
+    one that kept relaxing.
+
+    ``precon='Exp'`` preconditions FIRE and L-BFGS with the batched Exp
+    preconditioner of ``ea.parallel.precon``.
+
+    ``on_finished(k, atoms, energy, relaxed)`` is called for ``batch[k]``
+    as soon as it leaves its last stage, with the same atoms/energy returned
+    at the end; ``relaxed`` is False for a structure screened out or out of
+    steps before converging.
+    """
+    print(f"\n=== StagedRelaxer  FIRE fmax={FIRE_FMAX} -> LBFGS "
+          f"{tuple(lbfgs_stages)}  on {len(batch)} structures ===")
+    if screening is not None:
+        print(f"[batch_worker] screening: refine fractions {tuple(screening)} "
+              f"(min {screen_min})")
+    opt = StagedRelaxer(batch, batch_evaluator=make_evaluator(calc),
+                        fire_fmax=FIRE_FMAX, fire_steps=fire_steps,
+                        lbfgs_stages=lbfgs_stages, lbfgs_steps=lbfgs_steps,
+                        maxstep=MAXSTEP, memory=LBFGS_MEMORY,
+                        screening=screening, screen_min=screen_min,
+                        dedup_every=dedup_every, precon=precon,
+                        on_finished=_job_callback(on_finished))
+    opt.run(out_dir=out_dir)
     batch = opt.get_atoms()
 
-    for fmax in lbfgs_stages:
-        print(f"\n=== ParallelLBFGS  fmax={fmax} ===")
-        opt = ParallelLBFGS(batch, batch_evaluator=evaluator,
-                            fmax=fmax, max_steps=lbfgs_steps,
-                            maxstep=MAXSTEP, memory=LBFGS_MEMORY)
-        opt.run(out_dir=out_dir)
-        batch = opt.get_atoms()
+    print("\n=== final energies ===")
+    for i, job in enumerate(opt.jobs):
+        tag = "CONVERGED" if job.converged else "not converged"
+        if job.screened_out is not None:
+            tag = f"screened out at fmax={job.screened_out}"
+        if job.duplicate_of is not None:
+            tag += f", duplicate of struct {job.duplicate_of}"
+        print(f"  struct {i}: E = {job.energy:.4f}  "
+              f"fmax = {job.fmax_current:.4f}  "
+              f"vol = {job.atoms.get_volume():.2f}  [{tag}]")
+
+    return batch, opt.get_energies()
+
+
+def _finalize_job(job):
+    """Give a finished job's atoms their final energy and screening tag."""
+    if job.screened_out is not None:
+        job.atoms.info["screened_out_fmax"] = job.screened_out
+    job.atoms.calc = SinglePointCalculator(job.atoms, energy=job.energy)
+
+
+def _relaxed(job):
+    """Whether a finished job reached a converged minimum (not screened out
+    or stopped by the step limit), i.e. its result may be cached."""
+    return job.converged and job.screened_out is None
+
+
+def _job_callback(on_finished):
+    """Scheduler callback finalizing a job's atoms (energy, screening tag)
+    and handing them to ``on_finished(k, atoms, energy, relaxed)`` if
+    given."""
+    def _finished(job):
+        _finalize_job(job)
+        if on_finished is not None:
+            on_finished(job.key, job.atoms, job.energy, _relaxed(job))
+    return _finished
+
+
+def run_scheduled_optimization(
+    batch,
+    calc,
+    slots,
+    *,
+    fire_steps=FIRE_STEPS,
+    lbfgs_steps=LBFGS_STEPS,
+    lbfgs_stages=LBFGS_STAGES,
+    dedup_every=None,
+    precon=None,
+    on_finished=None,
+):
+    """Same FIRE -> staged-LBFGS schedule as ``run_full_optimization``, but
+    run by a ``RelaxationScheduler`` that keeps every evaluator call at
+    ``slots`` structures by refilling the slots of finished ones."""
+    print(f"\n=== RelaxationScheduler  {len(batch)} structures  "
+          f"{slots} slots ===")
+    sched = RelaxationScheduler(
+        batch, batch_evaluator=make_evaluator(calc), batch_size=slots,
+        fire_fmax=FIRE_FMAX, fire_steps=fire_steps,
+        lbfgs_stages=lbfgs_stages, lbfgs_steps=lbfgs_steps,
+        maxstep=MAXSTEP, memory=LBFGS_MEMORY, keep_history=True,
+        dedup_every=dedup_every, precon=precon,
+        on_finished=_job_callback(on_finished),
+    )
+    sched.run()
+    jobs = sched.results()
 
     print("\n=== final energies ===")
-    for i, s in enumerate(opt.states):
-        tag = "CONVERGED" if s.converged else "not converged"
-        print(f"  struct {i}: E = {s.energy:.4f}  "
-              f"fmax = {s.fmax_current:.4f}  "
-              f"vol = {s.atoms.get_volume():.2f}  [{tag}]")
+    for i, job in enumerate(jobs):
+        tag = "CONVERGED" if job.converged else "not converged"
+        print(f"  struct {i}: E = {job.energy:.4f}  "
+              f"fmax = {job.fmax_current:.4f}  "
+              f"vol = {job.atoms.get_volume():.2f}  [{tag}]")
+
+    return [job.atoms for job in jobs], [job.energy for job in jobs]
+
+
+def run_stream(workdir, calc, *, slots=STREAM_SLOTS, idle=STREAM_IDLE,
+               zpe=False, zpe_policy=None, zpe_symmetry=False,
+               zpe_method="gamma", cache=None,
+               dedup_every=None, precon=None,
+               fire_steps=FIRE_STEPS, lbfgs_steps=LBFGS_STEPS,
+               lbfgs_stages=LBFGS_STAGES):
+    """Relax CalcFolders as USPEX writes them instead of waiting for the
+    whole wave.
+
+    Pending folders (ASE ``input.xyz`` or USER_CODE ``geom.in``) are
+    re-discovered every ``STREAM_SCAN`` seconds and ``submit``-ted into a
+    running ``RelaxationScheduler``; each structure is published to its
+    folder as soon as it leaves its last stage, so its ``run_batch.py``
+    stub exits and USPEX can write the next input.  Returns once nothing is
+    queued or relaxing and no new input has appeared for ``idle`` seconds
+    (since the start or the last relaxation step).
+    """
+    publisher = ResultPublisher(calc if zpe else None, cache=cache,
+                                zpe_policy=zpe_policy if zpe else None,
+                                zpe_symmetry=zpe_symmetry,
+                                zpe_method=zpe_method)
+
+    def publish(cf_mode, atoms, energy, relaxed):
+        publisher(*cf_mode, atoms, energy, store=relaxed)
+        print(f"[batch_worker] finished {cf_mode[0].name}: E = {energy:.4f}")
+
+    sched = RelaxationScheduler(
+        batch_evaluator=make_evaluator(calc), batch_size=slots,
+        fire_fmax=FIRE_FMAX, fire_steps=fire_steps,
+        lbfgs_stages=lbfgs_stages, lbfgs_steps=lbfgs_steps,
+        maxstep=MAXSTEP, memory=LBFGS_MEMORY, keep_history=True,
+        dedup_every=dedup_every, precon=precon,
+        on_finished=_job_callback(publish), logfile=None,
+    )
+    print(f"\n=== streaming RelaxationScheduler  {slots} slots ===")
+    seen = set()
+    t_scan = -float("inf")
+    t_active = time.monotonic()     # last admission or relaxation step
+    while True:
+        now = time.monotonic()
+        if now - t_scan >= STREAM_SCAN:
+            t_scan = now
+            for _, cf in discover_calcfolders(workdir):
+                # folders still being written are picked up by a later scan
+                if cf in seen or not folder_pending(cf, FRESH):
+                    continue
+                seen.add(cf)
+                try:
+                    mode, atoms = read_calcfolder_input(cf)
+                except Exception as e:
+                    print(f"  [warn] {cf.name}: failed to read relaxation "
+                          f"input: {e}")
+                    continue
+                if publisher.serve_cached(cf, mode, atoms):
+                    continue
+                sched.submit(atoms, key=(cf, mode))
+                print(f"[batch_worker] admitted {cf.name} ({mode}); "
+                      f"{sched.pending()} in flight")
+        if sched.pending():
+            sched.nsteps_done += 1
+            sched.step()
+            t_active = time.monotonic()
+            continue
+        # nothing in flight: publish a partially filled ZPE buffer
+        publisher.flush()
+        if time.monotonic() - t_active >= idle:
+            break
+        time.sleep(STREAM_SCAN)
+
+    print(f"[batch_worker] stream done — {len(sched.finished)} structures in "
+          f"{sched.nsteps_done} steps ({sched.nevals} evaluator calls)")
+    return publisher.counts
+
+
+@dataclass
+class RunAccount:
+    """Per-run bookkeeping of the multi-run service."""
+    workdir: Path
+    publisher: Any
+    queue: deque = field(default_factory=deque)
+    seen: set = field(default_factory=set)
+    detached: bool = False
+    admitted: int = 0
+    in_flight: int = 0
+    finished: int = 0
+    evaluations: int = 0        # structure-evaluations spent on this run
+    t_attached: float = field(default_factory=time.time)
+
+    def summary(self):
+        return {"workdir": str(self.workdir), "admitted": self.admitted,
+                "queued": len(self.queue), "in_flight": self.in_flight,
+                "finished": self.finished, "evaluations": self.evaluations,
+                **self.publisher.counts,
+                "attached_s": time.time() - self.t_attached}
+
+
+class MultiRunRelaxer:
+    """One streaming ``RelaxationScheduler`` shared by many USPEX runs.
+
+    Every attached run directory is scanned for pending CalcFolders like
+    ``run_stream`` does for one; their structures share the scheduler's
+    slots, so fifty small runs fill the same batched evaluator calls as one
+    big one, and each result is published back to the CalcFolder it came
+    from.  Structures wait in per-run queues and are admitted round-robin,
+    one per run per turn, only when a slot is free, so a run that dumps a
+    large wave cannot starve the others.  A failing relaxation step
+    publishes the fallback result for the structures in flight and the
+    service carries on with the rest.  Thread-safe: ``attach``, ``detach``
+    and ``stats`` may be called while ``serve`` runs.
+    """
 
-    return batch, [s.energy for s in opt.states]
+    def __init__(self, calc, *, slots=STREAM_SLOTS, cache=None,
+                 fire_steps=FIRE_STEPS, lbfgs_steps=LBFGS_STEPS,
+                 lbfgs_stages=LBFGS_STAGES):
+        self.calc = calc
+        self.cache = cache      # for runs without ZPE (ZPE-free energies)
+        self.runs = {}
+        self.lock = threading.RLock()
+        self._turn = 0
+        self.sched = RelaxationScheduler(
+            batch_evaluator=make_evaluator(calc), batch_size=slots,
+            fire_fmax=FIRE_FMAX, fire_steps=fire_steps,
+            lbfgs_stages=lbfgs_stages, lbfgs_steps=lbfgs_steps,
+            maxstep=MAXSTEP, memory=LBFGS_MEMORY, keep_history=True,
+            on_finished=self._finished, logfile=None,
+        )
+
+    def attach(self, workdir, zpe=False):
+        """Start scanning ``workdir``.  A detached run whose structures are
+        still in flight is re-activated with its account (and the set of
+        folders it already took), so they are not queued a second time."""
+        workdir = Path(workdir).expanduser().resolve()
+        with self.lock:
+            run = self.runs.get(str(workdir))
+            if run is not None and run.detached and run.in_flight > 0:
+                run.detached = False
+                print(f"[service] re-attached {workdir}")
+            elif run is None or run.detached:
+                run = RunAccount(workdir, ResultPublisher(
+                    self.calc if zpe else None,
+                    cache=None if zpe else self.cache))
+                self.runs[str(workdir)] = run
+                print(f"[service] attached {workdir}")
+            return run.summary()
+
+    def detach(self, workdir):
+        """Stop scanning ``workdir``; structures in flight still finish."""
+        workdir = Path(workdir).expanduser().resolve()
+        with self.lock:
+            run = self.runs.get(str(workdir))
+            if run is None:
+                return None
+            run.detached = True
+            run.queue.clear()
+            self._drop_finished_runs()
+            print(f"[service] detached {workdir}")
+            return run.summary()
+
+    def stats(self):
+        with self.lock:
+            return {"slots": self.sched.batch_size,
+                    "occupied": len(self.sched.occupied()),
+                    "steps": self.sched.nsteps_done,
+                    "evaluator_calls": self.sched.nevals,
+                    "runs": [run.summary() for run in self.runs.values()]}
+
+    # ---- internals --------------------------------------------------------
+
+    def _finished(self, job):
+        _finalize_job(job)
+        # keyed to the account itself: a re-attached workdir gets a new one
+        run, cf, mode, atoms_in = job.key
+        run.in_flight -= 1
+        run.finished += 1
+        run.evaluations += job.nevals
+        run.publisher(cf, mode, job.atoms, job.energy, fallback=atoms_in,
+                      store=_relaxed(job))
+
+    def _fail_in_flight(self):
+        """After a failed step: drop the structures in the slots and give
+        their CalcFolders the fallback result (input, energy 0)."""
+        for job in self.sched.drop_occupied():
+            run, cf, mode, atoms_in = job.key
+            run.in_flight -= 1
+            run.evaluations += job.nevals
+            run.publisher.fail(cf, mode, atoms_in)
+            print(f"[service] {cf.name}: relaxation failed, wrote fallback")
+
+    def _drop_finished_runs(self):
+        for key, run in list(self.runs.items()):
+            if run.detached and run.in_flight == 0:
+                run.publisher.flush()
+                del self.runs[key]
+
+    def scan(self):
+        for key, run in self.runs.items():
+            if run.detached or not run.workdir.is_dir():
+                continue
+            for _, cf in discover_calcfolders(run.workdir):
+                if cf in run.seen or not folder_pending(cf, FRESH):
+                    continue
+                run.seen.add(cf)
+                try:
+                    mode, atoms = read_calcfolder_input(cf)
+                except Exception as e:
+                    print(f"  [warn] {cf.name}: failed to read relaxation "
+                          f"input: {e}")
+                    continue
+                if run.publisher.serve_cached(cf, mode, atoms):
+                    run.finished += 1
+                    continue
+                run.queue.append((cf, mode, atoms))
+
+    def admit(self):
+        """Fill free slots round-robin across runs with queued structures."""
+        free = self.sched.batch_size - self.sched.pending()
+        keys = list(self.runs)
+        while free > 0:
+            ready = [k for k in keys if self.runs[k].queue]
+            if not ready:
+                return
+            key = ready[self._turn % len(ready)]
+            self._turn += 1
+            run = self.runs[key]
+            cf, mode, atoms = run.queue.popleft()
+            self.sched.submit(atoms, key=(run, cf, mode, atoms))
+            run.admitted += 1
+            run.in_flight += 1
+            free -= 1
+
+    def serve(self, stop):
+        """Scan, admit and step until the ``threading.Event`` ``stop``."""
+        t_scan = -float("inf")
+        while not stop.is_set():
+            with self.lock:
+                if time.monotonic() - t_scan >= STREAM_SCAN:
+                    t_scan = time.monotonic()
+                    self.scan()
+                self.admit()
+                busy = self.sched.pending() > 0
+                if busy:
+                    self.sched.nsteps_done += 1
+                    try:
+                        self.sched.step()
+                    except Exception:
+                        print("[service] relaxation step failed:",
+                              traceback.format_exc())
+                        self._fail_in_flight()
+                else:
+                    for run in self.runs.values():
+                        run.publisher.flush()
+                self._drop_finished_runs()
+            if not busy:
+                stop.wait(STREAM_SCAN)
+        with self.lock:
+            for run in self.runs.values():
+                run.publisher.flush()
 
 
 # ---------------------------------------------------------------------------
 # ZPE
 # ---------------------------------------------------------------------------
 
-def compute_zpe(batch, calc):
+def compute_zpe(batch, calc, symmetry=False, method="gamma"):
+    if method == "phonons":
+        print(f"\n=== ParallelPhonons on {len(batch)} structures ===")
+        phonons = ParallelPhonons(batch, batch_evaluator=make_evaluator(calc))
+        phonons.run()
+        phonons.summary()
+        return phonons.get_zero_point_energies()
     print(f"\n=== ParallelVibrations on {len(batch)} structures ===")
-    vib = ParallelVibrations(batch, batch_evaluator=make_evaluator(calc))
+    # packed: every call is full even for a single large structure
+    vib = ParallelVibrations(batch, batch_evaluator=make_evaluator(calc),
+                             pack=True, symmetry=symmetry)
     vib.run()
     vib.read()
     return vib.get_zero_point_energies()
@@ -238,6 +646,20 @@ def _write_ase_result(cf_path, atoms, energy):
     os.replace(temporary_path, output_path)
 
 
+def _write_user_code_result(cf_path, atoms, energy):
+    """Atomically publish legacy ``geom.out`` + ``energy.txt``.
+
+    energy.txt remains the completion marker and is renamed into place
+    last, so a stub polling for it never sees a partial geom.out or energy.
+    """
+    temporary_geom = cf_path / ".geom.out.tmp"
+    temporary_energy = cf_path / ".energy.txt.tmp"
+    write(temporary_geom, atoms, format="vasp", direct=True)
+    temporary_energy.write_text(f"{energy}\n")
+    os.replace(temporary_geom, cf_path / "geom.out")
+    os.replace(temporary_energy, cf_path / "energy.txt")
+
+
 def write_calcfolder_result(cf_path, atoms, energy, mode):
     """Write a result using the interface with which USPEX made the input."""
     cf_path = Path(cf_path)
@@ -245,9 +667,7 @@ def write_calcfolder_result(cf_path, atoms, energy, mode):
         _write_ase_result(cf_path, atoms, energy)
         return
     if mode == USER_CODE_MODE:
-        # energy.txt remains the legacy completion marker and is written last.
-        write(cf_path / "geom.out", atoms, format="vasp", direct=True)
-        (cf_path / "energy.txt").write_text(f"{energy}\n")
+        _write_user_code_result(cf_path, atoms, energy)
         return
     raise ValueError(f"Unknown USPEX calc-folder mode: {mode!r}")
 
@@ -257,11 +677,224 @@ def write_failure(cf_path, atoms, mode):
     write_calcfolder_result(cf_path, atoms, 0.0, mode)
 
 
+class ZPEPolicy:
+    """Which finished structures get a real ZPE calculation.
+
+    A structure is computed if its energy per atom is within ``window``
+    eV/atom of the lowest one seen so far, or ranks among the ``top``
+    lowest seen so far (either criterion that is set).  Because results are
+    published while the wave is still relaxing, "so far" stands in for the
+    wave minimum; this can only compute more structures, never fewer.
+
+    The others get an estimate: the running mean ZPE per atom of their
+    reduced composition times their atom count.  The means are updated by
+    every computed ZPE and kept in the JSON file ``stats_path`` so later
+    waves start from them.  A composition without a mean yet is computed.
+    """
+
+    def __init__(self, window=None, top=None, stats_path=None):
+        self.window = window
+        self.top = top
+        self.stats_path = None if stats_path is None else Path(stats_path)
+        self.stats = {}         # composition -> {"zpe_per_atom", "n"}
+        self._seen = []         # sorted energies per atom
+        if self.stats_path is not None and self.stats_path.is_file():
+            try:
+                self.stats = json.loads(self.stats_path.read_text())
+            except (OSError, ValueError):
+                print(f"[batch_worker] ignoring unreadable {self.stats_path}")
+
+    @staticmethod
+    def composition(atoms):
+        return str(atoms.symbols.formula.reduce()[0])
+
+    def observe(self, atoms, energy):
+        bisect.insort(self._seen, energy / len(atoms))
+
+    def wants(self, atoms, energy):
+        """Whether ``atoms`` (relaxed, ``energy``) gets a computed ZPE."""
+        e = energy / len(atoms)
+        if self.window is not None and e - self._seen[0] <= self.window:
+            return True
+        if self.top is not None and bisect.bisect_left(self._seen, e) < self.top:
+            return True
+        return False
+
+    def estimate(self, atoms):
+        """Running-mean ZPE of ``atoms``, or None without a mean yet."""
+        entry = self.stats.get(self.composition(atoms))
+        return None if entry is None else entry["zpe_per_atom"] * len(atoms)
+
+    def record(self, atoms_list, zpes):
+        for atoms, zpe in zip(atoms_list, zpes):
+            entry = self.stats.setdefault(self.composition(atoms),
+                                          {"zpe_per_atom": 0.0, "n": 0})
+            entry["n"] += 1
+            entry["zpe_per_atom"] += (zpe / len(atoms)
+                                      - entry["zpe_per_atom"]) / entry["n"]
+        if self.stats_path is not None:
+            tmp = self.stats_path.with_name(f".{self.stats_path.name}.tmp")
+            tmp.write_text(json.dumps(self.stats, indent=1))
+            os.replace(tmp, self.stats_path)
+
+
+class ResultPublisher:
+    """Publish finished structures to their CalcFolders one by one.
+
+    Called as ``publisher(cf, mode, atoms, energy, fallback, store)`` when a
+    structure leaves its last stage, so its ``run_batch.py`` stub can exit
+    without waiting for the slowest structure of the wave.  With ``zpe_calc``
+    the structures are buffered and their ZPE is computed ``zpe_batch`` at a
+    time (``flush`` publishes a partial buffer); a failing ZPE batch
+    publishes its structures without ZPE, as a failing end-of-wave ZPE did.
+    With a ``ZPEPolicy`` only the structures it wants are computed and the
+    others get its estimate; ``info['zpe_method']`` of the published atoms
+    says which ('vibrations', 'phonons' or 'composition_mean').
+    ``zpe_method`` picks Gamma-point vibrations ('gamma') or the phonopy
+    q-mesh ('phonons'); ``zpe_symmetry`` makes the Gamma route displace only
+    symmetry-inequivalent atoms (phonopy always does).
+    ``fallback`` is the structure written with energy 0 if the write fails.
+
+    With a ``RelaxationCache``, ``serve_cached`` publishes a cached result
+    for an input straight away; inputs that miss are remembered and their
+    result is stored in the cache once published (never a ZPE-less result
+    from a failed ZPE batch, nor an estimated ZPE, nor a structure published
+    with ``store=False`` because it was screened out or did not converge).
+    """
+
+    def __init__(self, zpe_calc=None, zpe_batch=ZPE_BATCH, cache=None,
+                 zpe_policy=None, zpe_symmetry=False, zpe_method="gamma"):
+        self.zpe_calc = zpe_calc
+        self.zpe_batch = zpe_batch
+        self.zpe_policy = zpe_policy
+        self.zpe_symmetry = zpe_symmetry
+        self.zpe_method = zpe_method
+        self.cache = cache
+        self.buffer = []
+        self.published = set()
+        self.counts = {"relaxed": 0, "fallback": 0}
+        self.cache_hits = 0
+        self._inputs = {}       # cf -> (input atoms, fingerprint) to store
+
+    def serve_cached(self, cf, mode, atoms):
+        """Publish the cached result for input ``atoms``; True on a hit."""
+        if self.cache is None:
+            return False
+        try:
+            fp = self.cache.fingerprint(atoms)
+            hit = self.cache.lookup(atoms, fp)
+        except Exception:
+            print(f"[batch_worker] cache lookup failed for {Path(cf).name}:",
+                  traceback.format_exc())
+            return False
+        if hit is None:
+            self._inputs[Path(cf)] = (atoms, fp)
+            return False
+        relaxed, energy = hit
+        self._write(cf, mode, relaxed, energy, atoms, store=False)
+        self.cache_hits += 1
+        print(f"[batch_worker] cache hit for {Path(cf).name}: E = {energy:.4f}")
+        return True
+
+    def __call__(self, cf, mode, atoms, energy, fallback=None, store=True):
+        if self.zpe_calc is None:
+            self._write(cf, mode, atoms, energy, fallback, store=store)
+            return
+        self.buffer.append((cf, mode, atoms, energy, fallback, store))
+        if self.zpe_policy is not None:
+            self.zpe_policy.observe(atoms, energy)
+        if len(self.buffer) >= self.zpe_batch:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        buffer, self.buffer = self.buffer, []
+        policy = self.zpe_policy
+        estimates = [None] * len(buffer)
+        if policy is not None:
+            estimates = [None if policy.wants(atoms, energy)
+                         else policy.estimate(atoms)
+                         for _, _, atoms, energy, _, _ in buffer]
+        exact = [i for i, est in enumerate(estimates) if est is None]
+        if policy is not None:
+            print(f"[batch_worker] ZPE policy: computing {len(exact)}/"
+                  f"{len(buffer)}, estimating the rest")
+
+        zpes, methods, store = list(estimates), {}, {}
+        try:
+            computed = (compute_zpe([buffer[i][2] for i in exact],
+                                    self.zpe_calc, symmetry=self.zpe_symmetry,
+                                    method=self.zpe_method)
+                        if exact else [])
+        except Exception:
+            print("[batch_worker] ZPE failed:", traceback.format_exc())
+            computed = None
+        for j, i in enumerate(exact):
+            if computed is None:
+                zpes[i], store[i] = 0.0, False
+            else:
+                zpes[i] = float(computed[j])
+                methods[i] = ("phonons" if self.zpe_method == "phonons"
+                              else "vibrations")
+        if policy is not None and computed:
+            policy.record([buffer[i][2] for i in exact], computed)
+        for i, (cf, mode, atoms, energy, fallback, relaxed) in enumerate(buffer):
+            if policy is not None and i not in exact:
+                methods[i], store[i] = "composition_mean", False
+            if policy is not None and i in methods:
+                atoms.info["zpe"] = zpes[i]
+                atoms.info["zpe_method"] = methods[i]
+            self._write(cf, mode, atoms, energy + zpes[i], fallback,
+                        store=relaxed and store.get(i, True))
+
+    def _write(self, cf, mode, atoms, energy, fallback, store=True):
+        self.published.add(Path(cf))
+        cached = self._inputs.pop(Path(cf), None)
+        try:
+            write_calcfolder_result(cf, atoms, energy, mode)
+            self.counts["relaxed"] += 1
+        except Exception:
+            print(f"[batch_worker] failed to write {Path(cf).name}:",
+                  traceback.format_exc())
+        else:
+            if store and cached is not None:
+                try:
+                    self.cache.store(cached[0], atoms, energy, fp=cached[1])
+                except Exception:
+                    print("[batch_worker] cache store failed:",
+                          traceback.format_exc())
+            return
+        self.fail(cf, mode, atoms if fallback is None else fallback)
+
+    def fail(self, cf, mode, atoms):
+        """Publish the fallback result (``atoms``, energy 0) to ``cf``."""
+        self.published.add(Path(cf))
+        self._inputs.pop(Path(cf), None)
+        try:
+            write_failure(cf, atoms, mode)
+        except Exception:
+            pass
+        self.counts["fallback"] += 1
+
+
 # ---------------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------------
 
-def main():
+def _parse_fractions(text):
+    """argparse type for '0.5,0.5,0.25' style screening schedules."""
+    try:
+        fractions = tuple(float(f) for f in text.split(",") if f.strip())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a list of fractions: {text!r}")
+    if not fractions or any(not 0.0 < f <= 1.0 for f in fractions):
+        raise argparse.ArgumentTypeError(
+            f"screening fractions must be in (0, 1]: {text!r}")
+    return fractions
+
+
+def build_parser():
     p = argparse.ArgumentParser(
         description="Batched DeepMD relaxation across all CalcFolders of "
                     "the current USPEX generation."
@@ -278,35 +911,149 @@ def main():
     p.add_argument("--zpe", action="store_true",
                    help="Add Gamma-point ZPE to the final energy "
                         "(matches uspex_deepmd_gfnff.py)")
+    p.add_argument("--zpe-window", type=float, default=None, metavar="EV",
+                   help="--zpe: compute ZPE only for structures within EV "
+                        "eV/atom of the lowest energy of the wave; the others "
+                        "get the running mean ZPE/atom of their composition")
+    p.add_argument("--zpe-top", type=int, default=None, metavar="K",
+                   help="--zpe: compute ZPE only for the K lowest-energy "
+                        "structures (with --zpe-window: for either)")
+    p.add_argument("--zpe-symmetry", action="store_true",
+                   help="--zpe: displace only symmetry-inequivalent atoms "
+                        "(spglib) and rebuild the Hessian with the space-group "
+                        "operations")
+    p.add_argument("--zpe-method", choices=("gamma", "phonons"),
+                   default="gamma",
+                   help="--zpe: Gamma-point vibrations of the cell ('gamma', "
+                        "default) or phonopy finite displacements in a "
+                        "supercell summed over a q-mesh ('phonons')")
+    p.add_argument("--zpe-stats", type=Path, default=None,
+                   help="JSON file of running ZPE/atom means per composition "
+                        f"(default: <workdir>/{ZPE_STATS})")
     p.add_argument("--traj-name", default="batch.traj",
                    help="Filename for the assembled input trajectory "
                         "(written under workdir)")
+    p.add_argument("--slots", type=int, default=None,
+                   help="Relax with a continuous-batching scheduler that keeps "
+                        "this many structures per evaluator call, refilling "
+                        "the slots of converged ones (default: one fixed batch)")
+    p.add_argument("--screen", type=_parse_fractions, default=None,
+                   metavar="F1,F2,...",
+                   help="Successive-halving ranking mode: fraction of "
+                        "structures refined past each LBFGS stage, e.g. "
+                        "'0.5,0.5,0.5,0.5' (default: refine every structure "
+                        "to the last stage)")
+    p.add_argument("--screen-min", type=int, default=1,
+                   help="Always refine at least this many structures per "
+                        "screening stage (default: 1)")
+    p.add_argument("--rigid-steps", type=int, default=None, metavar="N",
+                   help="Before FIRE, relax the molecules as rigid bodies "
+                        "(6 DOF each plus the cell) for at most N steps; "
+                        "for badly packed fresh molecular crystals "
+                        "(default: off)")
+    p.add_argument("--precon", action="store_true",
+                   help="Precondition FIRE and LBFGS with the batched Exp "
+                        "preconditioner (stiff bonds vs soft intermolecular "
+                        "modes of molecular crystals)")
+    p.add_argument("--dedup", type=int, default=None, metavar="N",
+                   help="Every N steps, collapse structures that reached the "
+                        "same basin during LBFGS (E/atom, volume, pair "
+                        "fingerprint) and give them one shared result "
+                        "(default: off)")
+    p.add_argument("--cache", type=Path, default=None, metavar="SQLITE",
+                   help="Fingerprint-keyed relaxation cache shared across "
+                        "waves/runs: inputs matching a cached input are "
+                        "published from the cache without relaxing")
+    p.add_argument("--cache-tol", type=float, default=COS_DIST_MAX,
+                   help="Max OFP cosine distance for a cache hit "
+                        f"(default: {COS_DIST_MAX:g}, as EA_SEARCH.py)")
+    p.add_argument("--cache-size", type=int, default=MAX_ENTRIES,
+                   help="Max cached results; least recently used are "
+                        f"evicted (default: {MAX_ENTRIES})")
+    p.add_argument("--stream", action="store_true",
+                   help="Admit CalcFolders into a running continuous-batching "
+                        "relaxation as their inputs appear, publishing each "
+                        "result as soon as it finishes (uses --slots, "
+                        f"default {STREAM_SLOTS})")
+    p.add_argument("--stream-idle", type=float, default=STREAM_IDLE,
+                   help="--stream: return after this many seconds with "
+                        f"nothing to relax (default: {STREAM_IDLE:g})")
     p.add_argument("--smoke", action="store_true",
                    help="Run a minimal FIRE/LBFGS sequence for integration "
                         "smoke tests; do not use for production relaxation")
-    args = p.parse_args()
+    return p
+
+
+def open_cache(args):
+    """The ``--cache`` relaxation cache, keyed by model (+ZPE, +smoke)."""
+    if not args.cache:
+        return None
+    zpe = "" if not args.zpe else (
+        "+zpe" if args.zpe_method == "gamma" else f"+zpe-{args.zpe_method}")
+    key = args.model + zpe + (
+        "+smoke" if args.smoke else "")
+    return RelaxationCache(args.cache, key, tol=args.cache_tol,
+                           max_entries=args.cache_size)
+
+
+def make_zpe_policy(args, workdir):
+    """The selective-ZPE policy of ``--zpe-window`` / ``--zpe-top``."""
+    if not args.zpe or (args.zpe_window is None and args.zpe_top is None):
+        return None
+    return ZPEPolicy(window=args.zpe_window, top=args.zpe_top,
+                     stats_path=args.zpe_stats or Path(workdir) / ZPE_STATS)
+
+
+def _optimization_kwargs(args):
+    kwargs = {"precon": "Exp"} if args.precon else {}
+    if not args.smoke:
+        return kwargs
+    print("[batch_worker] SMOKE profile: abbreviated relaxation")
+    return {**kwargs, **SMOKE_PROFILE}
+
 
+def run_wave(args, calc=None):
+    """Relax every pending CalcFolder of one wave and publish the results.
+
+    ``args`` is the parsed ``build_parser()`` namespace.  ``calc`` is an
+    already-loaded DeepMD calculator (the evaluation daemon passes its
+    resident one); when omitted the model is loaded here.  Returns
+    ``{"relaxed": n_ok, "fallback": n_fail}``.
+    """
     workdir = args.workdir.expanduser().resolve()
     if not workdir.is_dir():
         sys.exit(f"workdir not found: {workdir}")
 
+    if args.stream:
+        if calc is None:
+            cfg = load_config()
+            device = args.device or cfg["deepmd"].get("device", "cpu")
+            calc = make_calculator(args.model, device)
+        if args.screen is not None:
+            print("[batch_worker] --screen needs a whole cohort; "
+                  "ignored in --stream mode")
+        if args.rigid_steps:
+            print("[batch_worker] --rigid-steps pre-optimizes a whole batch; "
+                  "ignored in --stream mode")
+        return run_stream(workdir, calc, slots=args.slots or STREAM_SLOTS,
+                          idle=args.stream_idle, zpe=args.zpe,
+                          zpe_policy=make_zpe_policy(args, workdir),
+                          zpe_symmetry=args.zpe_symmetry,
+                          zpe_method=args.zpe_method,
+                          cache=open_cache(args), dedup_every=args.dedup,
+                          **_optimization_kwargs(args))
+
     calcfolders = discover_calcfolders(workdir)
     if not calcfolders:
         print(f"[batch_worker] no pending CalcFolders under {workdir}; nothing to do")
-        return
+        return {"relaxed": 0, "fallback": 0}
     print(f"[batch_worker] {len(calcfolders)} pending CalcFolders")
 
     # ---- read inputs -------------------------------------------------------
     indices, paths, modes, atoms_in = [], [], [], []
     for idx, cf in calcfolders:
-        mode = calcfolder_mode(cf)
         try:
-            if mode == ASE_MODE:
-                a = read(cf / "input.xyz", format="extxyz")
-            elif mode == USER_CODE_MODE:
-                a = read(cf / "geom.in", format="vasp")
-            else:
-                raise ValueError("no supported non-empty input file")
+            mode, a = read_calcfolder_input(cf)
         except Exception as e:
             print(f"  [warn] {cf.name}: failed to read relaxation input: {e}")
             continue
@@ -340,61 +1087,73 @@ def main():
     write(traj_path, atoms_in)
     print(f"[batch_worker] wrote input batch trajectory: {traj_path}")
 
-    cfg = load_config()
-    device = args.device or cfg["deepmd"].get("device", "cpu")
-    calc = make_calculator(args.model, device)
-
     keep_idx = list(range(len(atoms_in)))
     if args.size is not None:
         keep_idx = keep_idx[: args.size]
-    batch = [atoms_in[i].copy() for i in keep_idx]
 
-    optimization_kwargs = {}
-    if args.smoke:
-        optimization_kwargs = {
-            "fire_steps": 2,
-            "lbfgs_steps": 2,
-            "lbfgs_stages": (0.03,),
-        }
-        print("[batch_worker] SMOKE profile: abbreviated relaxation")
-    relaxed, energies = run_full_optimization(
-        batch, calc, out_dir, **optimization_kwargs
-    )
-
-    # ---- ZPE ---------------------------------------------------------------
-    if args.zpe:
-        try:
-            zpes = compute_zpe(relaxed, calc)
-        except Exception:
-            print("[batch_worker] ZPE failed:", traceback.format_exc())
-            zpes = [0.0] * len(relaxed)
-    else:
-        zpes = [0.0] * len(relaxed)
+    # ---- cache hits are published without relaxing -------------------------
+    publisher = ResultPublisher(cache=open_cache(args),
+                                zpe_policy=make_zpe_policy(args, workdir),
+                                zpe_symmetry=args.zpe_symmetry,
+                                zpe_method=args.zpe_method)
+    keep_idx = [i for i in keep_idx
+                if not publisher.serve_cached(paths[i], modes[i], atoms_in[i])]
+    if publisher.cache is not None:
+        print(f"[batch_worker] relaxation cache: {publisher.cache_hits} hit(s), "
+              f"{len(keep_idx)} to relax")
+    batch = [atoms_in[i].copy() for i in keep_idx]
 
-    # ---- distribute results back to CalcFolders ---------------------------
-    final_energies = {keep_idx[k]: energies[k] + zpes[k] for k in range(len(relaxed))}
-    final_atoms = {keep_idx[k]: relaxed[k] for k in range(len(relaxed))}
+    if calc is None and batch:
+        cfg = load_config()
+        device = args.device or cfg["deepmd"].get("device", "cpu")
+        calc = make_calculator(args.model, device)
+
+    # ---- relax, publishing each structure (+ ZPE) as it finishes ---------
+    publisher.zpe_calc = calc if args.zpe else None
+
+    def on_finished(k, atoms, energy, relaxed):
+        i = keep_idx[k]
+        publisher(paths[i], modes[i], atoms, energy, fallback=atoms_in[i],
+                  store=relaxed)
+
+    optimization_kwargs = _optimization_kwargs(args)
+    if batch and args.rigid_steps:
+        batch = run_rigid_preoptimization(batch, calc, args.rigid_steps)
+    if batch and args.slots is not None:
+        if args.screen is not None:
+            print("[batch_worker] --screen needs a whole cohort; "
+                  "ignored with --slots")
+        run_scheduled_optimization(
+            batch, calc, args.slots, dedup_every=args.dedup,
+            on_finished=on_finished,
+            **optimization_kwargs
+        )
+    elif batch:
+        run_full_optimization(
+            batch, calc, out_dir, screening=args.screen,
+            screen_min=args.screen_min, dedup_every=args.dedup,
+            on_finished=on_finished,
+            **optimization_kwargs
+        )
+    publisher.flush()
 
-    n_ok = n_fail = 0
+    # ---- fallback for anything not relaxed (--size cap) -------------------
+    n_ok, n_fail = publisher.counts["relaxed"], publisher.counts["fallback"]
     for i, cf in enumerate(paths):
+        if cf in publisher.published:
+            continue
         try:
-            if i in final_energies:
-                write_calcfolder_result(
-                    cf, final_atoms[i], final_energies[i], modes[i]
-                )
-                n_ok += 1
-            else:
-                write_failure(cf, atoms_in[i], modes[i])
-                n_fail += 1
+            write_failure(cf, atoms_in[i], modes[i])
         except Exception:
             print(f"[batch_worker] failed to write {cf.name}:", traceback.format_exc())
-            try:
-                write_failure(cf, atoms_in[i], modes[i])
-            except Exception:
-                pass
-            n_fail += 1
+        n_fail += 1
 
     print(f"[batch_worker] done — relaxed={n_ok}  fallback={n_fail}")
+    return {"relaxed": n_ok, "fallback": n_fail}
+
+
+def main():
+    run_wave(build_parser().parse_args())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+"""Evaluators and structures shared by the test modules."""
+
+import warnings
+
+import numpy as np
+from ase import Atoms
+from ase.build import bulk
+from ase.calculators.emt import EMT
+from ase.neighborlist import neighbor_list
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        from ase.ga.ofp_comparator import OFPComparator  # noqa: F401
+    HAVE_OFP = True
+except ImportError:
+    HAVE_OFP = False
+
+
+def emt_evaluator(atoms_list):
+    """Reference batch evaluator: one EMT call per structure."""
+    energies, forces, stresses = [], [], []
+    for atoms in atoms_list:
+        calc = EMT()
+        energies.append(calc.get_potential_energy(atoms))
+        forces.append(calc.get_forces(atoms))
+        stresses.append(calc.get_stress(atoms))
+    return np.array(energies), forces, stresses
+
+
+class RecordingEvaluator:
+    """EMT batch evaluator that records the size of every call."""
+
+    def __init__(self):
+        self.sizes = []
+
+    def __call__(self, atoms_list):
+        self.sizes.append(len(atoms_list))
+        return emt_evaluator(atoms_list)
+
+
+def padded_batch():
+    """Three Cu/Al cells of different sizes so the vectorized path pads."""
+    batch = []
+    for k, (symbol, rep) in enumerate([("Cu", (2, 1, 1)),
+                                      ("Al", (2, 2, 1)),
+                                      ("Cu", (1, 1, 1))]):
+        atoms = bulk(symbol, cubic=True).repeat(rep)
+        atoms.rattle(stdev=0.08, seed=k)
+        atoms.set_cell(atoms.cell * 1.02, scale_atoms=True)
+        batch.append(atoms)
+    return batch
+
+
+def rattled_batch(n=5):
+    """`n` alternating Cu/Al cells, increasingly rattled and strained."""
+    batch = []
+    for k in range(n):
+        symbol = ("Cu", "Al")[k % 2]
+        atoms = bulk(symbol, cubic=True).repeat((1 + k % 2, 1, 1))
+        atoms.rattle(stdev=0.05 + 0.02 * k, seed=k)
+        atoms.set_cell(atoms.cell * (1.0 + 0.01 * k), scale_atoms=True)
+        batch.append(atoms)
+    return batch
+
+
+class PairEvaluator:
+    """Force-shifted Lennard-Jones between atoms of different molecules
+    (tags); records the size of every call."""
+
+    sigma, epsilon, rc = 3.0, 0.01, 8.0
+
+    def __init__(self):
+        self.sizes = []
+
+    def phi(self, r):
+        s6 = (self.sigma / r) ** 6
+        return 4 * self.epsilon * (s6 * s6 - s6), \
+            -24 * self.epsilon * (2 * s6 * s6 - s6) / r
+
+    def __call__(self, atoms_list):
+        self.sizes.append(len(atoms_list))
+        energies, forces, stresses = [], [], []
+        e_c, de_c = self.phi(self.rc)
+        for atoms in atoms_list:
+            i, j, D = neighbor_list('ijD', atoms, self.rc)
+            tags = atoms.get_tags()
+            keep = tags[i] != tags[j]
+            i, j, D = i[keep], j[keep], D[keep]
+            d = np.linalg.norm(D, axis=1)
+            e, de = self.phi(d)
+            # ordered pairs: every pair is counted twice
+            energies.append(0.5 * (e - e_c - (d - self.rc) * de_c).sum())
+            g = 0.5 * (de - de_c)[:, None] * D / d[:, None]
+            F = np.zeros((len(atoms), 3))
+            np.add.at(F, j, -g)
+            np.add.at(F, i, g)
+            forces.append(F)
+            sigma = g.T @ D / atoms.get_volume()
+            stresses.append(sigma.flat[[0, 4, 8, 5, 2, 1]])
+        return np.array(energies), forces, stresses
+
+
+def dimer_crystal(a=4.6, seed=0):
+    """Four N2-like dimers on fcc sites, randomly oriented, one tag each."""
+    rng = np.random.default_rng(seed)
+    sites = a * np.array([[0, 0, 0], [0.5, 0.5, 0], [0.5, 0, 0.5],
+                          [0, 0.5, 0.5]])
+    positions, tags = [], []
+    for k, site in enumerate(sites):
+        u = rng.normal(size=3)
+        u *= 0.55 / np.linalg.norm(u)
+        positions += [site - u, site + u]
+        tags += [k, k]
+    atoms = Atoms("N8", positions=positions, cell=[a, a, a], pbc=True)
+    atoms.set_tags(tags)
+    atoms.wrap()
+    return atoms
@@ -0,0 +1,148 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy as np
+from ase import Atoms
+from ase.stress import full_3x3_to_voigt_6_stress
+
+from ea.parallel import create_batch
+from ea.parallel.create_batch import (
+    DeepMDBatchEvaluator,
+    batch_calculator_deepmd,
+)
+
+
+class FakeDeepPot:
+    """Stand-in for ``DP.dp``: a type-weighted harmonic well per atom.
+
+    ``eval`` requires a homogeneous frame layout, like the real DeepPot.
+    """
+
+    weights = np.array([1.0, 2.0, 3.0])
+
+    def __init__(self):
+        self.calls = []
+        self.deep_eval = SimpleNamespace(auto_batch_size=SimpleNamespace(
+            current_batch_size=0, maximum_working_batch_size=0,
+            minimal_not_working_batch_size=0))
+
+    def eval(self, coords, cells, atom_types):
+        nframes = coords.shape[0]
+        natoms = len(atom_types)
+        self.calls.append((nframes, natoms))
+        r = coords.reshape(nframes, natoms, 3)
+        w = self.weights[atom_types][None, :, None]
+        energy = (w * r ** 2).sum(axis=(1, 2)).reshape(nframes, 1)
+        forces = -2.0 * w * r
+        virial = np.einsum('fai,faj->fij', r, forces).reshape(nframes, 9)
+        return energy, forces.reshape(nframes, -1), virial
+
+
+def make_atoms(symbols, seed):
+    rng = np.random.default_rng(seed)
+    n = len(symbols)
+    return Atoms(symbols, positions=rng.uniform(0, 4, (n, 3)),
+                 cell=np.diag([5.0, 6.0, 7.0]) + 0.1 * seed, pbc=True)
+
+
+class HeterogeneousBatchTests(unittest.TestCase):
+    def setUp(self):
+        self.calc = SimpleNamespace(dp=FakeDeepPot(),
+                                    type_dict={'C': 0, 'H': 1, 'O': 2})
+
+    def test_mixed_layouts_are_grouped_and_scattered_back_in_order(self):
+        batch = [make_atoms("CHHO", 0), make_atoms("CO", 1),
+                 make_atoms("CHHO", 2), make_atoms("OHHC", 3),
+                 make_atoms("CO", 4)]
+        E, F, S = batch_calculator_deepmd(batch, self.calc)
+
+        # one dp.eval per layout: CHHO x2, CO x2, OHHC x1
+        self.assertEqual(sorted(self.calc.dp.calls), [(1, 4), (2, 2), (2, 4)])
+
+        for k, atoms in enumerate(batch):
+            e_ref, f_ref, s_ref = batch_calculator_deepmd([atoms], self.calc)
+            self.assertAlmostEqual(E[k], e_ref[0])
+            np.testing.assert_allclose(F[k], f_ref[0])
+            np.testing.assert_allclose(S[k], s_ref[0])
+            self.assertEqual(F[k].shape, (len(atoms), 3))
+
+    def test_evaluator_reuses_buffers_and_tracks_moved_atoms(self):
+        batch = [make_atoms("CHHO", 0), make_atoms("CO", 1),
+                 make_atoms("CHHO", 2)]
+        evaluator = DeepMDBatchEvaluator(self.calc)
+        evaluator(batch)
+        buffers = {k: v[0] for k, v in evaluator._buffers.items()}
+
+        batch[2].positions += 0.25
+        batch[2].set_cell(batch[2].cell * 1.1, scale_atoms=False)
+        E, F, S = evaluator(batch)
+
+        # same Atoms objects -> same plan and the same input arrays
+        self.assertTrue(all(evaluator._buffers[k][0] is v
+                            for k, v in buffers.items()))
+        r = batch[2].positions
+        w = FakeDeepPot.weights[[0, 1, 1, 2]][:, None]
+        self.assertAlmostEqual(E[2], (w * r ** 2).sum())
+        np.testing.assert_allclose(F[2], -2.0 * w * r)
+        virial = np.einsum('ai,aj->ij', r, -2.0 * w * r)
+        stress = -virial / batch[2].get_volume()
+        np.testing.assert_allclose(
+            S[2], full_3x3_to_voigt_6_stress(0.5 * (stress + stress.T)))
+
+
+class SharedMemoryTransportTests(unittest.TestCase):
+    def test_worker_results_round_trip_through_shared_block(self):
+        calc = SimpleNamespace(dp=FakeDeepPot(),
+                               type_dict={'C': 0, 'H': 1, 'O': 2})
+        batch = [make_atoms("CHHO", 0), make_atoms("CO", 1),
+                 make_atoms("OHHCC", 2)]
+        E_ref, F_ref, S_ref = DeepMDBatchEvaluator(calc)(batch)
+
+        # Run the worker-side task in this process against a fake model.
+        create_batch._worker_dp = SimpleNamespace(dp=FakeDeepPot())
+        self.addCleanup(create_batch._dp_shm.close)
+        v = create_batch._shm_write_batch(batch, calc.type_dict)
+        shm = create_batch._dp_shm
+        for start, stop in [(0, 2), (2, 3)]:
+            create_batch._dp_eval_shm(
+                (shm.shm.name, shm.capacity, shm.nmax, start, stop, True))
+        E, F, S = create_batch._shm_read_results(batch, v)
+
+        np.testing.assert_allclose(E, E_ref)
+        for k in range(len(batch)):
+            np.testing.assert_allclose(F[k], F_ref[k])
+            np.testing.assert_allclose(S[k], S_ref[k])
+
+        # A larger batch reallocates the block; workers re-attach by name.
+        old_name = shm.shm.name
+        create_batch._shm_write_batch(batch * 3, calc.type_dict)
+        self.assertNotEqual(shm.shm.name, old_name)
+        create_batch._worker_dp.dp.calls.clear()
+        create_batch._dp_eval_shm(
+            (shm.shm.name, shm.capacity, shm.nmax, 0, 9, True))
+        self.assertEqual(create_batch._worker_shm[0], shm.shm.name)
+        create_batch._worker_shm = None
+        # worker-side batching: one dp.eval per layout in the range
+        self.assertEqual(sorted(create_batch._worker_dp.dp.calls),
+                         [(3, 2), (3, 4), (3, 5)])
+
+    def test_pickled_chunk_is_evaluated_per_layout(self):
+        batch = [make_atoms("CHHO", 0), make_atoms("CO", 1),
+                 make_atoms("CHHO", 2)]
+        calc = SimpleNamespace(dp=FakeDeepPot(),
+                               type_dict={'C': 0, 'H': 1, 'O': 2})
+        E_ref, F_ref, _ = DeepMDBatchEvaluator(calc)(batch)
+        create_batch._worker_dp = SimpleNamespace(dp=FakeDeepPot())
+        create_batch._worker_type_dict = calc.type_dict
+
+        out = create_batch._dp_eval_chunk(
+            [(10 + k, atoms) for k, atoms in enumerate(batch)])
+        self.assertEqual(sorted(create_batch._worker_dp.dp.calls),
+                         [(1, 2), (2, 4)])
+        for idx, energy, forces, _ in out:
+            self.assertAlmostEqual(energy, E_ref[idx - 10])
+            np.testing.assert_allclose(forces, F_ref[idx - 10])
+
+
+if __name__ == "__main__":
+    unittest.main()
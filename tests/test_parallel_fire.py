@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from ea.parallel.FIRE_parallel import ParallelFIRE
+from tests.helpers import emt_evaluator, padded_batch
+
+
+class VectorizedFIRETests(unittest.TestCase):
+    def test_vectorized_trajectories_match_scalar_path(self):
+        kwargs = dict(batch_evaluator=emt_evaluator, fmax=0.02,
+                      max_steps=60, maxstep=0.1, logfile=None)
+        scalar = ParallelFIRE(padded_batch(), **kwargs)
+        vector = ParallelFIRE(padded_batch(), vectorized=True, **kwargs)
+
+        for _ in range(60):
+            done_scalar = scalar.step()
+            done_vector = vector.step()
+            self.assertEqual(done_scalar, done_vector)
+            for s_ref, s_vec in zip(scalar.states, vector.states):
+                self.assertEqual(s_ref.converged, s_vec.converged)
+                np.testing.assert_allclose(s_vec.atoms.positions,
+                                           s_ref.atoms.positions,
+                                           rtol=0, atol=1e-10)
+                np.testing.assert_allclose(s_vec.atoms.cell.array,
+                                           s_ref.atoms.cell.array,
+                                           rtol=0, atol=1e-10)
+            if done_scalar:
+                break
+
+        vector.sync_states()
+        for s_ref, s_vec in zip(scalar.states, vector.states):
+            self.assertAlmostEqual(s_vec.dt, s_ref.dt, places=12)
+            self.assertAlmostEqual(s_vec.a, s_ref.a, places=12)
+            self.assertEqual(s_vec.Nsteps, s_ref.Nsteps)
+            np.testing.assert_allclose(s_vec.vel, s_ref.vel, atol=1e-10)
+
+
+if __name__ == "__main__":
+    unittest.main()
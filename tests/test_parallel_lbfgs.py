@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+from ase.calculators.emt import EMT
+from ase.filters import FrechetCellFilter
+from ase.optimize import LBFGS
+
+from ea.parallel.LBFGS_parallel import ParallelLBFGS
+from tests.helpers import emt_evaluator, padded_batch
+
+
+class RingBufferLBFGSTests(unittest.TestCase):
+    def test_batched_recursion_matches_ase_lbfgs_per_structure(self):
+        # memory=3 so the ring buffer wraps around within the run.
+        nsteps, memory, maxstep = 25, 3, 0.05
+        opt = ParallelLBFGS(padded_batch(), batch_evaluator=emt_evaluator,
+                            fmax=1e-6, max_steps=nsteps, maxstep=maxstep,
+                            memory=memory, logfile=None)
+        for _ in range(nsteps):
+            opt.step()
+
+        for ref_atoms, st in zip(padded_batch(), opt.states):
+            ref_atoms.calc = EMT()
+            ref = LBFGS(FrechetCellFilter(ref_atoms), maxstep=maxstep,
+                        memory=memory, alpha=70.0, logfile=None)
+            # ParallelLBFGS evaluates before moving, so `nsteps` batched
+            # steps correspond to `nsteps` ASE steps.
+            for _ in range(nsteps):
+                ref.step()
+            np.testing.assert_allclose(st.atoms.positions, ref_atoms.positions,
+                                       rtol=0, atol=1e-8)
+            np.testing.assert_allclose(st.atoms.cell.array,
+                                       ref_atoms.cell.array,
+                                       rtol=0, atol=1e-8)
+            self.assertEqual(st.iteration, nsteps)
+
+
+if __name__ == "__main__":
+    unittest.main()
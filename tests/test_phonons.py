@@ -0,0 +1,52 @@
+import unittest
+
+from ase.build import bulk
+from ase.units import kJ, mol
+
+from tests.helpers import RecordingEvaluator
+
+try:
+    import phonopy
+except ImportError:
+    phonopy = None
+
+if phonopy is not None:
+    from ea.parallel.phonons import FREQ_CUTOFF, ParallelPhonons
+
+
+def crystals():
+    return [bulk("Cu"), bulk("Al"), bulk("Cu", a=3.5)]
+
+
+@unittest.skipIf(phonopy is None, "phonopy not installed")
+class ParallelPhononsTests(unittest.TestCase):
+    def setUp(self):
+        self.evaluator = RecordingEvaluator()
+        self.phonons = ParallelPhonons(crystals(), self.evaluator,
+                                       supercell_matrix=[3, 3, 3],
+                                       mesh=(6, 6, 6), batch_size=2)
+        self.phonons.run()
+
+    def test_displaced_supercells_go_out_in_full_batches(self):
+        n = sum(len(p.supercells_with_displacements)
+                for p in self.phonons.phonons)
+        # fcc: one symmetry-inequivalent displacement per structure
+        self.assertEqual(n, 3)
+        self.assertEqual(self.evaluator.sizes, [2, 1])
+
+    def test_mesh_energies_match_phonopy_thermal_properties(self):
+        zpe = self.phonons.get_zero_point_energies()
+        free = self.phonons.get_free_energies(300.0)
+        for k, phonon in enumerate(self.phonons.phonons):
+            phonon.run_thermal_properties(temperatures=[0.0, 300.0],
+                                          cutoff_frequency=FREQ_CUTOFF)
+            ref = phonon.thermal_properties.free_energy * kJ / mol
+            self.assertAlmostEqual(zpe[k], ref[0], places=5)
+            self.assertAlmostEqual(free[k], ref[1], places=5)
+            self.assertLess(free[k], zpe[k])
+        # the stiffer, compressed Cu has the larger zero-point energy
+        self.assertGreater(zpe[2], zpe[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
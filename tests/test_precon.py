@@ -0,0 +1,115 @@
+import tempfile
+import unittest
+
+import numpy as np
+from ase.filters import FrechetCellFilter
+from ase.neighborlist import neighbor_list
+
+from ea.parallel.FIRE_parallel import _inject_results
+from ea.parallel.LBFGS_parallel import ParallelLBFGS
+from ea.parallel.precon import ExpPrecon, estimate_mu
+from ea.parallel.scheduler import StagedRelaxer
+from tests.helpers import PairEvaluator, dimer_crystal
+
+
+class BondedEvaluator(PairEvaluator):
+    """Stiff harmonic bonds inside the molecules (tags) on top of the soft
+    intermolecular Lennard-Jones of ``PairEvaluator``."""
+
+    k, r0 = 40.0, 1.1
+
+    def __call__(self, atoms_list):
+        E, F, S = super().__call__(atoms_list)
+        E = E.copy()
+        for n, atoms in enumerate(atoms_list):
+            i, j, D = neighbor_list('ijD', atoms, 1.8)
+            tags = atoms.get_tags()
+            keep = tags[i] == tags[j]
+            i, j, D = i[keep], j[keep], D[keep]
+            d = np.linalg.norm(D, axis=1)
+            E[n] += 0.25 * self.k * ((d - self.r0) ** 2).sum()
+            g = 0.5 * self.k * (d - self.r0)[:, None] * D / d[:, None]
+            np.add.at(F[n], j, -g)
+            np.add.at(F[n], i, g)
+            sigma = g.T @ D / atoms.get_volume()
+            S[n] = S[n] + sigma.flat[[0, 4, 8, 5, 2, 1]]
+        return E, F, S
+
+
+def strained_batch(n=2):
+    batch = []
+    for k in range(n):
+        atoms = dimer_crystal(a=4.6, seed=k)
+        atoms.rattle(stdev=0.05, seed=k)
+        batch.append(atoms)
+    return batch
+
+
+class ExpPreconTests(unittest.TestCase):
+    def test_factorization_is_reused_inside_the_skin(self):
+        atoms = dimer_crystal()
+        precon = ExpPrecon()
+        self.assertTrue(precon.update(atoms))
+        self.assertAlmostEqual(precon.r_NN, 1.1, places=6)
+        P = precon.P.toarray()
+        np.testing.assert_allclose(P, P.T)
+        self.assertGreater(np.linalg.eigvalsh(P).min(), 0.0)
+        x = np.random.default_rng(0).normal(size=(len(atoms) + 3, 3))
+        np.testing.assert_allclose(precon.solve(precon.dot(x)), x)
+
+        atoms.positions[0] += [0.4 * precon.r_NN, 0.0, 0.0]
+        self.assertFalse(precon.update(atoms))
+        atoms.positions[0] += [0.2 * precon.r_NN, 0.0, 0.0]
+        self.assertTrue(precon.update(atoms))
+        self.assertEqual(precon.n_builds, 2)
+
+    def test_mu_of_a_batch_from_one_evaluator_call(self):
+        evaluator = BondedEvaluator()
+        filters = [FrechetCellFilter(a) for a in strained_batch(3)]
+        E, F, S = evaluator([f.atoms for f in filters])
+        items = []
+        for flt, e, f, s in zip(filters, E, F, S):
+            _inject_results(flt.atoms, e, f, s)
+            items.append((ExpPrecon(), flt, flt.get_forces()))
+        evaluator.sizes.clear()
+        estimate_mu(items, evaluator)
+        self.assertEqual(evaluator.sizes, [3])
+        for precon, _, _ in items:
+            # the bonds dominate: mu is close to the bond stiffness scale
+            self.assertGreater(precon.mu, 5.0)
+            self.assertGreaterEqual(precon.mu_c, 1.0)
+
+
+class PreconditionedRelaxationTests(unittest.TestCase):
+    def test_lbfgs_converges_in_fewer_steps(self):
+        runs = {}
+        for precon in (None, 'Exp'):
+            evaluator = BondedEvaluator()
+            opt = ParallelLBFGS(strained_batch(), evaluator, fmax=1e-2,
+                                max_steps=500, maxstep=0.2, logfile=None,
+                                precon=precon)
+            with tempfile.TemporaryDirectory() as tmp:
+                self.assertTrue(opt.run(tmp))
+            runs[precon] = opt
+        self.assertLess(runs['Exp'].nsteps_done,
+                        0.9 * runs[None].nsteps_done)
+        for state in runs['Exp'].states:
+            # rebuilt only when the geometry left the skin, not every step
+            self.assertLess(state.precon.n_builds,
+                            runs['Exp'].nsteps_done // 5)
+
+    def test_staged_relaxer_needs_fewer_evaluator_calls(self):
+        nevals = {}
+        for precon in (None, 'Exp'):
+            staged = StagedRelaxer(strained_batch(),
+                                   batch_evaluator=BondedEvaluator(),
+                                   lbfgs_stages=(0.01,), logfile=None,
+                                   precon=precon)
+            self.assertTrue(staged.run())
+            self.assertTrue(all(job.converged for job in staged.jobs))
+            nevals[precon] = staged.nevals
+        self.assertLess(nevals['Exp'], 0.9 * nevals[None])
+
+
+if __name__ == "__main__":
+    unittest.main()
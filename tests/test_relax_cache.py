@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+import warnings
+from pathlib import Path
+
+from ase.build import bulk
+
+from ea.parallel.relax_cache import RelaxationCache
+from tests.helpers import HAVE_OFP
+
+
+def structure(seed, symbol="Cu"):
+    atoms = bulk(symbol, cubic=True).repeat((2, 1, 1))
+    atoms.rattle(stdev=0.1, seed=seed)
+    return atoms
+
+
+@unittest.skipUnless(HAVE_OFP, "OFPComparator (ase-ga) not installed")
+class RelaxationCacheTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "cache.sqlite"
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", FutureWarning)
+            self.cache = RelaxationCache(self.path, "deepmd_d3",
+                                         max_entries=2)
+        self.addCleanup(self.cache.close)
+
+    def test_symmetric_copy_hits_and_different_structure_misses(self):
+        atoms = structure(0)
+        relaxed = atoms.copy()
+        relaxed.positions += 0.01
+        self.cache.store(atoms, relaxed, -12.5)
+
+        copy = atoms.copy()
+        copy.translate([0.4, 0.2, 0.1])
+        copy.wrap()
+        hit = self.cache.lookup(copy)
+        self.assertIsNotNone(hit)
+        self.assertAlmostEqual(hit[1], -12.5)
+        self.assertTrue((abs(hit[0].positions - relaxed.positions) < 1e-6).all())
+
+        self.assertIsNone(self.cache.lookup(structure(1)))
+        self.assertIsNone(self.cache.lookup(structure(0, "Al")))
+        # other model, same structure: separate entries
+        other = RelaxationCache(self.path, "deepmd_d4")
+        self.addCleanup(other.close)
+        self.assertIsNone(other.lookup(atoms))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        a, b, c = structure(0), structure(1), structure(2)
+        self.cache.store(a, a, -1.0)
+        self.cache.store(b, b, -2.0)
+        self.assertIsNotNone(self.cache.lookup(a))     # a is now fresher
+        self.cache.store(c, c, -3.0)
+        self.assertEqual(len(self.cache), 2)
+        self.assertIsNone(self.cache.lookup(b))
+        self.assertIsNotNone(self.cache.lookup(a))
+        self.assertIsNotNone(self.cache.lookup(c))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+
+import numpy as np
+from ase import Atoms
+from ase.build import bulk
+
+from ea.parallel.rigid_body import (ParallelRigidBodyRelaxer, RigidState,
+                                    exp_so3, find_molecules)
+from tests.helpers import PairEvaluator, dimer_crystal
+
+
+def bond_lengths(atoms):
+    mol_of, pos, _ = find_molecules(atoms)
+    return np.array([np.linalg.norm(np.subtract(*pos[mol_of == m]))
+                     for m in range(mol_of.max() + 1)])
+
+
+class RigidBodyTests(unittest.TestCase):
+    def test_exp_so3_is_a_rotation_about_the_vector(self):
+        w = np.array([[0.3, -0.2, 0.9], [0.0, 0.0, 0.0]])
+        R = exp_so3(w)
+        for Rk in R:
+            np.testing.assert_allclose(Rk @ Rk.T, np.eye(3), atol=1e-12)
+        np.testing.assert_allclose(R[0] @ w[0], w[0], atol=1e-12)
+        np.testing.assert_allclose(R[1], np.eye(3))
+
+    def test_tags_keep_close_contacts_from_merging_molecules(self):
+        # two dimers with a 1.0 A contact, the first across the boundary
+        atoms = Atoms("N4", positions=[[-0.55, 5, 5], [0.55, 5, 5],
+                                       [1.55, 5, 5], [1.55, 6.1, 5]],
+                      cell=[10, 10, 10], pbc=True)
+        atoms.set_tags([0, 0, 1, 1])
+        atoms.wrap()
+        mol_of, _, extended = find_molecules(atoms)
+        self.assertEqual(mol_of.tolist(), [0, 0, 1, 1])
+        self.assertFalse(extended)
+        np.testing.assert_allclose(bond_lengths(atoms), 1.1, atol=1e-12)
+        atoms.set_tags(0)
+        self.assertEqual(find_molecules(atoms)[0].tolist(), [0, 0, 0, 0])
+        # a metal is one infinitely bonded component, not a molecule
+        self.assertTrue(find_molecules(bulk("Cu", cubic=True))[2])
+
+    def test_generalized_forces_are_the_rigid_body_gradient(self):
+        evaluator = PairEvaluator()
+        state = RigidState.from_atoms(dimer_crystal(a=5.2))
+        _, F, S = evaluator([state.atoms])
+        g = state.generalized_forces(F[0], S[0]).ravel()
+
+        rng = np.random.default_rng(1)
+        direction = rng.normal(size=g.size)
+        strain = direction[-9:].reshape(3, 3)
+        direction[-9:] = (strain + strain.T).ravel()
+        h = 1e-5
+        energies = []
+        for sign in (1, -1):
+            displaced = RigidState.from_atoms(state.atoms)
+            displaced.displace(sign * h * direction)
+            energies.append(evaluator([displaced.atoms])[0][0])
+        self.assertAlmostEqual((energies[0] - energies[1]) / (2 * h),
+                               -g @ direction, places=6)
+
+    def test_batch_relaxes_molecules_without_deforming_them(self):
+        batch = [dimer_crystal(a=4.4, seed=k) for k in range(3)]
+        batch.insert(1, bulk("Cu", cubic=True))
+        evaluator = PairEvaluator()
+        start = evaluator(batch)[0]
+        evaluator.sizes.clear()
+
+        opt = ParallelRigidBodyRelaxer(batch, evaluator, fmax=0.01,
+                                       max_steps=300, logfile=None)
+        self.assertTrue(opt.run())
+        relaxed = opt.get_atoms()
+        end = evaluator(relaxed)[0]
+
+        # only the three molecular crystals are evaluated, in one call each
+        self.assertEqual(max(evaluator.sizes[:-1]), 3)
+        self.assertIs(opt.states[1].energy, None)
+        np.testing.assert_allclose(relaxed[1].positions, batch[1].positions)
+        for k in (0, 2, 3):
+            self.assertLess(end[k], start[k] - 0.05)
+            self.assertEqual(relaxed[k].get_chemical_symbols(),
+                             batch[k].get_chemical_symbols())
+            np.testing.assert_allclose(bond_lengths(relaxed[k]), 1.1,
+                                       atol=1e-10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+from ase.build import bulk
+
+from ea.parallel.FIRE_parallel import ParallelFIRE
+from ea.parallel.LBFGS_parallel import ParallelLBFGS
+from ea.parallel.scheduler import RelaxationScheduler, StagedRelaxer
+from tests.helpers import RecordingEvaluator, rattled_batch
+
+
+SCHEDULE = dict(fire_fmax=0.3, fire_steps=15, lbfgs_stages=(0.1, 0.02),
+                lbfgs_steps=20, maxstep=0.05, memory=5)
+
+
+def staged_reference(batch, evaluator):
+    """The worker's fixed-batch FIRE -> fresh-LBFGS-per-stage pipeline."""
+    opt = ParallelFIRE(batch, batch_evaluator=evaluator,
+                       fmax=SCHEDULE['fire_fmax'],
+                       max_steps=SCHEDULE['fire_steps'],
+                       maxstep=SCHEDULE['maxstep'], logfile=None)
+    for _ in range(opt.max_steps):
+        if opt.step():
+            break
+    batch = [s.atoms for s in opt.states]
+    for fmax in SCHEDULE['lbfgs_stages']:
+        opt = ParallelLBFGS(batch, batch_evaluator=evaluator, fmax=fmax,
+                            max_steps=SCHEDULE['lbfgs_steps'],
+                            maxstep=SCHEDULE['maxstep'],
+                            memory=SCHEDULE['memory'], logfile=None)
+        for _ in range(opt.max_steps):
+            if opt.step():
+                break
+        batch = opt.get_atoms()
+    return batch, [s.energy for s in opt.states]
+
+
+class RelaxationSchedulerTests(unittest.TestCase):
+    def test_refilled_slots_reproduce_per_structure_schedule(self):
+        ref_atoms, ref_energies = staged_reference(rattled_batch(),
+                                                   RecordingEvaluator())
+
+        evaluator = RecordingEvaluator()
+        finished = []
+        sched = RelaxationScheduler(
+            rattled_batch(), batch_evaluator=evaluator, batch_size=2,
+            on_finished=lambda job: finished.append(job.key),
+            logfile=None, **SCHEDULE)
+        self.assertTrue(sched.run())
+
+        results = sched.results()
+        self.assertEqual([job.key for job in results], list(range(5)))
+        self.assertEqual(sorted(finished), list(range(5)))
+        for job, ref, e_ref in zip(results, ref_atoms, ref_energies):
+            np.testing.assert_allclose(job.atoms.positions, ref.positions,
+                                       rtol=0, atol=1e-8)
+            np.testing.assert_allclose(job.atoms.cell.array, ref.cell.array,
+                                       rtol=0, atol=1e-8)
+            self.assertAlmostEqual(job.energy, e_ref, places=8)
+
+        # Slots are refilled: every call is full until the queue drains.
+        n_full = len(evaluator.sizes) - evaluator.sizes[::-1].index(2)
+        self.assertTrue(all(size == 2 for size in evaluator.sizes[:n_full]))
+
+
+class StagedRelaxerTests(unittest.TestCase):
+    def test_single_state_machine_beats_per_stage_restarts(self):
+        schedule = dict(SCHEDULE, lbfgs_stages=(0.1, 0.05, 0.02, 0.01),
+                        lbfgs_steps=100)
+        ref_eval = RecordingEvaluator()
+        with patch.dict(SCHEDULE, schedule):
+            _, ref_energies = staged_reference(rattled_batch(), ref_eval)
+
+        warm_eval = RecordingEvaluator()
+        warm = StagedRelaxer(rattled_batch(), batch_evaluator=warm_eval,
+                             logfile=None, **schedule)
+        self.assertTrue(warm.run())
+
+        self.assertTrue(all(job.converged for job in warm.jobs))
+        self.assertLess(len(warm_eval.sizes), len(ref_eval.sizes))
+        self.assertLess(sum(warm_eval.sizes), sum(ref_eval.sizes))
+        for e_warm, e_ref in zip(warm.get_energies(), ref_energies):
+            self.assertAlmostEqual(e_warm, e_ref, places=4)
+        self.assertEqual(len(warm.get_atoms()), 5)
+
+    def test_screening_refines_only_best_fraction(self):
+        schedule = dict(SCHEDULE, lbfgs_stages=(0.1, 0.05, 0.01),
+                        lbfgs_steps=100)
+        full_eval = RecordingEvaluator()
+        full = StagedRelaxer(rattled_batch(6), batch_evaluator=full_eval,
+                             logfile=None, **schedule)
+        full.run()
+
+        evaluator = RecordingEvaluator()
+        screened = StagedRelaxer(rattled_batch(6), batch_evaluator=evaluator,
+                                 screening=(0.5, 0.5), logfile=None,
+                                 **schedule)
+        self.assertTrue(screened.run())
+        self.assertLess(sum(evaluator.sizes), sum(full_eval.sizes))
+
+        jobs = screened.jobs
+        refined = [job for job in jobs if job.screened_out is None]
+        first_cut = [job for job in jobs if job.screened_out == 0.1]
+        second_cut = [job for job in jobs if job.screened_out == 0.05]
+        self.assertEqual((len(refined), len(second_cut), len(first_cut)),
+                         (2, 1, 3))
+        self.assertTrue(all(job.converged for job in refined))
+
+        def e_per_atom(job):
+            return job.energy / len(job.atoms)
+
+        # Retired structures rank behind every structure kept at that cut.
+        worst_kept = max(e_per_atom(job) for job in refined + second_cut)
+        self.assertTrue(all(job.best_energy / len(job.atoms) >= worst_kept
+                            for job in first_cut))
+        for job in first_cut + second_cut:
+            self.assertEqual(job.energy, job.best_energy)
+            np.testing.assert_allclose(job.atoms.positions, job.best_positions)
+        # Refined structures end where the full (unscreened) run ends.
+        for job in refined:
+            ref = full.jobs[job.order]
+            self.assertAlmostEqual(job.energy, ref.energy, places=4)
+
+    def test_duplicates_are_collapsed_in_flight(self):
+        def batch():
+            copies = []
+            for k in range(3):
+                atoms = bulk("Cu", cubic=True).repeat((2, 1, 1))
+                atoms.rattle(stdev=0.05, seed=k)
+                atoms.translate([0.3 * k, 0.1, 0.0])
+                copies.append(atoms)
+            return copies + rattled_batch(2)[1:]
+
+        schedule = dict(SCHEDULE, lbfgs_stages=(0.1, 0.05, 0.01, 0.001),
+                        lbfgs_steps=100)
+        full_eval = RecordingEvaluator()
+        full = StagedRelaxer(batch(), batch_evaluator=full_eval,
+                             logfile=None, **schedule)
+        full.run()
+
+        evaluator = RecordingEvaluator()
+        dedup = StagedRelaxer(batch(), batch_evaluator=evaluator,
+                              dedup_every=5, logfile=None, **schedule)
+        self.assertTrue(dedup.run())
+        self.assertLess(sum(evaluator.sizes), sum(full_eval.sizes))
+
+        # the three Cu copies share one result; the Al structure is untouched
+        self.assertEqual([job.duplicate_of is not None for job in dedup.jobs],
+                         [False, True, True, False])
+        rep = dedup.jobs[0]
+        for job in dedup.jobs[1:3]:
+            self.assertEqual(job.duplicate_of, rep.key)
+            self.assertEqual(job.energy, rep.energy)
+            np.testing.assert_allclose(job.atoms.positions, rep.atoms.positions)
+        for job, ref in zip(dedup.jobs, full.jobs):
+            self.assertTrue(job.done)
+            self.assertAlmostEqual(job.energy, ref.energy, places=4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+from ase.build import bulk
+
+from ea.parallel.FIRE_parallel import ParallelFIRE
+from ea.parallel.LBFGS_parallel import ParallelLBFGS
+from ea.parallel.scheduler import StagedRelaxer
+from ea.parallel.symmetry import symmetric_basis, symmetry_constraint
+from tests.helpers import RecordingEvaluator
+
+try:
+    import spglib
+except ImportError:
+    spglib = None
+
+
+def space_group(atoms, symprec=1e-5):
+    cell = (atoms.cell.array, atoms.get_scaled_positions(), atoms.numbers)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        return spglib.get_symmetry_dataset(cell, symprec=symprec).number
+
+
+def tetragonal_cuau(seed=0):
+    """L1_0-like CuAu (P4/mmm) with a little numerical noise."""
+    atoms = bulk("Cu", "fcc", a=3.9, cubic=True)
+    atoms[0].symbol = "Au"
+    atoms.set_cell(np.diag([3.9, 3.9, 3.5]), scale_atoms=True)
+    atoms.rattle(stdev=1e-3, seed=seed)
+    return atoms
+
+
+@unittest.skipIf(spglib is None, "spglib not installed")
+class SymmetryConstrainedRelaxationTests(unittest.TestCase):
+    def test_basis_spans_the_invariant_dofs(self):
+        atoms = tetragonal_cuau()
+        constraint = symmetry_constraint(atoms)
+        self.assertEqual(space_group(atoms), 123)
+        Q = symmetric_basis(atoms, constraint)
+        # atoms on special positions, cell: a = b and c
+        self.assertEqual(Q.shape, (3 * (len(atoms) + 3), 2))
+        np.testing.assert_allclose(Q.T @ Q, np.eye(2), atol=1e-12)
+        # no symmetry at a tolerance below the noise: nothing attached
+        rattled = tetragonal_cuau()
+        self.assertIsNone(symmetry_constraint(rattled, symprec=1e-5))
+        self.assertEqual(rattled.constraints, [])
+
+    def test_lbfgs_keeps_the_space_group_in_fewer_steps(self):
+        batch = [tetragonal_cuau(seed=k) for k in range(2)]
+        runs = {}
+        for symmetry in (False, True):
+            opt = ParallelLBFGS(batch, RecordingEvaluator(), fmax=1e-3,
+                                max_steps=300, maxstep=0.1, logfile=None,
+                                symmetry=symmetry)
+            with tempfile.TemporaryDirectory() as tmp:
+                self.assertTrue(opt.run(tmp))
+            runs[symmetry] = opt
+
+        sym, free = runs[True], runs[False]
+        self.assertEqual(sym.history.ndofs.tolist(), [2, 2])
+        self.assertLess(sym.nsteps_done, free.nsteps_done)
+        for a, b in zip(sym.get_atoms(), free.get_atoms()):
+            self.assertEqual(space_group(a), 123)
+            self.assertAlmostEqual(a.get_potential_energy(),
+                                   b.get_potential_energy(), places=5)
+
+    def test_fire_and_scheduler_keep_the_space_group(self):
+        batch = [tetragonal_cuau(seed=k) for k in range(2)]
+        fire = ParallelFIRE(batch, RecordingEvaluator(), fmax=1e-3,
+                            max_steps=1000, logfile=None, vectorized=True,
+                            symmetry=True)
+        self.assertTrue(fire.run())
+        staged = StagedRelaxer(batch, batch_evaluator=RecordingEvaluator(),
+                               fire_steps=50, lbfgs_stages=(0.01, 0.001),
+                               lbfgs_steps=200, logfile=None, symmetry=True)
+        self.assertTrue(staged.run())
+        for atoms in fire.get_atoms() + staged.get_atoms():
+            self.assertEqual(space_group(atoms), 123)
+
+
+if __name__ == "__main__":
+    unittest.main()
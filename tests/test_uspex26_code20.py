@@ -1,6 +1,8 @@
+import os
 import tempfile
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
 from ase import Atoms
 from ase.io import read, write
@@ -8,6 +10,7 @@ from ase.io import read, write
 from ea.uspex.uspex26.run_uspex26 import count_pending
 from ea.uspex.uspex26.worker import (
     ASE_MODE,
+    USER_CODE_MODE,
     calcfolder_mode,
     discover_calcfolders,
     write_calcfolder_result,
@@ -62,6 +65,29 @@ class Code20WorkerTests(unittest.TestCase):
             self.assertEqual(discover_calcfolders(workdir), [])
             self.assertEqual(count_pending(workdir), 0)
 
+    def test_code99_result_is_published_atomically_energy_last(self):
+        atoms = Atoms("Cu2", positions=[[0, 0, 0], [1.8, 0, 0]],
+                      cell=[4.0, 4.0, 4.0], pbc=True)
+        with tempfile.TemporaryDirectory() as tmp:
+            calcfolder = Path(tmp)
+            renamed = []
+
+            def replace(src, dst):
+                renamed.append(Path(dst).name)
+                os.rename(src, dst)
+
+            with patch("ea.uspex.uspex26.worker.os.replace", replace):
+                write_calcfolder_result(calcfolder, atoms, -7.5,
+                                        USER_CODE_MODE)
+
+            self.assertEqual(renamed, ["geom.out", "energy.txt"])
+            self.assertEqual(sorted(p.name for p in calcfolder.iterdir()),
+                             ["energy.txt", "geom.out"])
+            self.assertEqual(float((calcfolder / "energy.txt").read_text()),
+                             -7.5)
+            self.assertEqual(len(read(calcfolder / "geom.out",
+                                      format="vasp")), 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from ea.uspex.uspex26.daemon import EvaluationDaemon, request
+from ea.uspex.uspex26.run_uspex26 import DAEMON_RETRIES, DaemonSupervisor
+
+# A stand-in daemon process: same server, a wave that just counts folders.
+FAKE_DAEMON = """
+import sys
+from pathlib import Path
+from ea.uspex.uspex26.daemon import EvaluationDaemon
+
+def run_wave(workdir, argv):
+    if "--crash" in argv:
+        import os; os._exit(1)
+    if "--hang" in argv:
+        import time; time.sleep(3600)
+    return {"relaxed": len(list(Path(workdir).iterdir())), "fallback": 0}
+
+server = EvaluationDaemon(sys.argv[1], run_wave)
+server.serve_forever()
+"""
+
+
+class EvaluationDaemonTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.socket_path = Path(self.tmp.name) / "d.sock"
+
+    def test_waves_are_served_by_one_resident_process(self):
+        calls = []
+
+        def run_wave(workdir, argv):
+            calls.append((workdir, argv))
+            if argv == ["--bad"]:
+                raise SystemExit("no readable pending structures")
+            return {"relaxed": 2, "fallback": 0}
+
+        server = EvaluationDaemon(self.socket_path, run_wave,
+                                  info={"model": "fake"})
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            ping = request(self.socket_path, {"op": "ping"}, timeout=5)
+            self.assertEqual((ping["ok"], ping["model"], ping["waves"]),
+                             (True, "fake", 0))
+            reply = request(self.socket_path,
+                            {"op": "wave", "workdir": "/w", "argv": ["--smoke"]})
+            self.assertEqual(reply, {"ok": True, "relaxed": 2, "fallback": 0})
+            # a failing wave is reported, the daemon keeps serving
+            reply = request(self.socket_path,
+                            {"op": "wave", "workdir": "/w", "argv": ["--bad"]})
+            self.assertFalse(reply["ok"])
+            self.assertIn("no readable", reply["error"])
+            self.assertEqual(request(self.socket_path, {"op": "ping"})["waves"], 1)
+            request(self.socket_path, {"op": "shutdown"}, timeout=5)
+        finally:
+            thread.join(timeout=10)
+            server.server_close()
+        self.assertEqual(calls, [("/w", ["--smoke"]), ("/w", ["--bad"])])
+        self.assertFalse(self.socket_path.exists())
+
+    def test_supervisor_restarts_a_crashed_daemon(self):
+        workdir = Path(self.tmp.name) / "run"
+        (workdir / "a").mkdir(parents=True)
+        (workdir / "b").mkdir()
+        sup = DaemonSupervisor(
+            [sys.executable, "-c", FAKE_DAEMON, str(self.socket_path)],
+            self.socket_path, workdir, os.devnull, startup=60,
+        )
+        self.addCleanup(sup.stop)
+
+        self.assertTrue(sup.start())
+        pid = sup.proc.pid
+        self.assertEqual(sup.run_wave(workdir)["relaxed"], 2)
+        self.assertEqual(sup.proc.pid, pid)     # same resident process
+
+        # crash mid-wave: the retry on a fresh daemon crashes too -> None
+        self.assertIsNone(sup.run_wave(workdir, ["--crash"]))
+        # the next wave gets a healthy, restarted daemon
+        self.assertEqual(sup.run_wave(workdir)["relaxed"], 2)
+        self.assertNotEqual(sup.proc.pid, pid)
+        self.assertGreaterEqual(sup.restarts, 1)
+
+    def test_launch_is_lazy_and_a_hung_wave_restarts_the_daemon(self):
+        workdir = Path(self.tmp.name) / "run"
+        (workdir / "a").mkdir(parents=True)
+        sup = DaemonSupervisor(
+            [sys.executable, "-c", FAKE_DAEMON, str(self.socket_path)],
+            self.socket_path, workdir, os.devnull, startup=60,
+            wave_timeout=3,
+        )
+        self.addCleanup(sup.stop)
+
+        sup.launch()                            # returns before the ping
+        self.assertTrue(sup.alive())
+        self.assertEqual(sup.run_wave(workdir)["relaxed"], 1)
+        pid = sup.proc.pid
+
+        # alive but stuck: timed out, retried on a fresh daemon, given up
+        self.assertIsNone(sup.run_wave(workdir, ["--hang"]))
+        self.assertEqual(sup.restarts, 1 + DAEMON_RETRIES)
+        self.assertEqual(sup.run_wave(workdir)["relaxed"], 1)
+        self.assertNotEqual(sup.proc.pid, pid)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,373 @@
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+from ase.build import bulk
+from ase.io import read, write
+
+from ea.parallel.scheduler import StagedRelaxer
+from ea.uspex.uspex26 import worker
+from tests.helpers import HAVE_OFP, RecordingEvaluator, rattled_batch
+
+STREAM_SCHEDULE = dict(fire_steps=15, lbfgs_stages=(0.1, 0.02),
+                       lbfgs_steps=20)
+
+
+def wait_for(path, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while not path.is_file() and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return path.is_file()
+
+
+class StreamingWorkerTests(unittest.TestCase):
+    def test_inputs_are_admitted_and_published_as_they_land(self):
+        cu, al, late = rattled_batch(3)
+        evaluator = RecordingEvaluator()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(worker, "make_evaluator", lambda calc: evaluator), \
+                patch.object(worker, "FRESH", 0.0), \
+                patch.object(worker, "STREAM_SCAN", 0.02):
+            workdir = Path(tmp)
+            folders = [workdir / "Calculation" / name
+                       for name in ("Calcfold_1_1", "Calcfold_1_2",
+                                    "Calcfold_2_1")]
+            for cf in folders:
+                cf.mkdir(parents=True)
+            write(folders[0] / "input.xyz", cu, format="extxyz")
+            write(folders[1] / "geom.in", al, format="vasp")
+
+            counts = {}
+            thread = threading.Thread(target=lambda: counts.update(
+                worker.run_stream(workdir, calc=None, slots=4, idle=0.5,
+                                  **STREAM_SCHEDULE)))
+            thread.start()
+            # the first result is published while the stream keeps running
+            self.assertTrue(wait_for(folders[0] / "output.xyz"))
+            self.assertTrue(thread.is_alive())
+            write(folders[2] / "input.xyz", late, format="extxyz")
+            thread.join(timeout=120)
+            self.assertFalse(thread.is_alive())
+
+            self.assertEqual(counts, {"relaxed": 3, "fallback": 0})
+            self.assertTrue((folders[1] / "energy.txt").is_file())
+            published = [
+                read(folders[0] / "output.xyz").get_potential_energy(),
+                float((folders[1] / "energy.txt").read_text()),
+                read(folders[2] / "output.xyz").get_potential_energy(),
+            ]
+
+        # admission time does not change a structure's relaxation
+        ref = StagedRelaxer([cu, al, late], batch_evaluator=RecordingEvaluator(),
+                            fire_fmax=worker.FIRE_FMAX,
+                            maxstep=worker.MAXSTEP,
+                            memory=worker.LBFGS_MEMORY, logfile=None,
+                            **STREAM_SCHEDULE)
+        ref.run()
+        for got, want in zip(published, ref.get_energies()):
+            self.assertAlmostEqual(got, want, places=6)
+
+
+class EarlyPublishTests(unittest.TestCase):
+    def test_results_are_published_per_structure_and_match_end_of_wave(self):
+        batch = rattled_batch(4)
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp) / "run"
+            folders = [workdir / "Calculation" / f"Calcfold_1_{k}"
+                       for k in range(len(batch))]
+            for cf, atoms in zip(folders, batch):
+                cf.mkdir(parents=True)
+                write(cf / "input.xyz", atoms, format="extxyz")
+
+            published_at_call = []
+
+            class Spy(RecordingEvaluator):
+                def __call__(self, atoms_list):
+                    published_at_call.append(
+                        sum((cf / "output.xyz").is_file() for cf in folders))
+                    return super().__call__(atoms_list)
+
+            with patch.object(worker, "make_evaluator", lambda calc: Spy()), \
+                    patch.object(worker, "_optimization_kwargs",
+                                 lambda args: STREAM_SCHEDULE):
+                counts = worker.run_wave(
+                    worker.build_parser().parse_args([str(workdir)]),
+                    calc=object())
+                self.assertEqual(counts, {"relaxed": 4, "fallback": 0})
+                # the fast structures were out before the slowest finished
+                self.assertGreater(published_at_call[-1], 0)
+
+                # end-of-wave reference: relax everything, then write
+                ref_dir = Path(tmp) / "ref"
+                ref_dir.mkdir()
+                relaxed, energies = worker.run_full_optimization(
+                    [read(cf / "input.xyz") for cf in folders], object(),
+                    ref_dir,
+                    **STREAM_SCHEDULE)
+            for cf, atoms, energy in zip(folders, relaxed, energies):
+                ref_cf = ref_dir / cf.name
+                ref_cf.mkdir(parents=True)
+                worker.write_calcfolder_result(ref_cf, atoms, energy,
+                                               worker.ASE_MODE)
+                self.assertEqual((cf / "output.xyz").read_text(),
+                                 (ref_cf / "output.xyz").read_text())
+
+
+@unittest.skipUnless(HAVE_OFP, "OFPComparator (ase-ga) not installed")
+class RelaxationCacheWaveTests(unittest.TestCase):
+    def test_second_wave_is_served_from_the_cache(self):
+        batch = rattled_batch(2)
+        evaluator = RecordingEvaluator()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(worker, "make_evaluator", lambda calc: evaluator), \
+                patch.object(worker, "_optimization_kwargs",
+                             lambda args: STREAM_SCHEDULE):
+            outputs = []
+            for wave in ("run1", "run2"):
+                folders = [Path(tmp) / wave / "Calculation" / f"Calcfold_1_{k}"
+                           for k in range(len(batch))]
+                for cf, atoms in zip(folders, batch):
+                    cf.mkdir(parents=True)
+                    write(cf / "input.xyz", atoms, format="extxyz")
+                args = worker.build_parser().parse_args(
+                    [str(Path(tmp) / wave), "--cache", str(Path(tmp) / "c.db")])
+                n_calls = len(evaluator.sizes)
+                self.assertEqual(worker.run_wave(args, calc=object()),
+                                 {"relaxed": 2, "fallback": 0})
+                outputs.append([(cf / "output.xyz").read_text()
+                                for cf in folders])
+            # the second run never called the evaluator
+            self.assertEqual(len(evaluator.sizes), n_calls)
+        self.assertEqual(outputs[0], outputs[1])
+
+    def test_screened_out_results_are_not_cached(self):
+        batch = rattled_batch(2)
+        evaluator = RecordingEvaluator()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(worker, "make_evaluator", lambda calc: evaluator), \
+                patch.object(worker, "_optimization_kwargs",
+                             lambda args: STREAM_SCHEDULE):
+            screened = []
+            for wave, extra in (("run1", ["--screen", "0.5"]), ("run2", [])):
+                folders = [Path(tmp) / wave / "Calculation" / f"Calcfold_1_{k}"
+                           for k in range(len(batch))]
+                for cf, atoms in zip(folders, batch):
+                    cf.mkdir(parents=True)
+                    write(cf / "input.xyz", atoms, format="extxyz")
+                args = worker.build_parser().parse_args(
+                    [str(Path(tmp) / wave), "--cache", str(Path(tmp) / "c.db")]
+                    + extra)
+                n_calls = len(evaluator.sizes)
+                self.assertEqual(worker.run_wave(args, calc=object()),
+                                 {"relaxed": 2, "fallback": 0})
+                screened.append([
+                    "screened_out_fmax" in read(cf / "output.xyz").info
+                    for cf in folders])
+            self.assertEqual(sum(screened[0]), 1)
+            # the screened-out structure is relaxed again, the other is
+            # served from the cache
+            self.assertEqual(set(evaluator.sizes[n_calls:]), {1})
+            self.assertEqual(screened[1], [False, False])
+
+
+class SelectiveZPETests(unittest.TestCase):
+    def test_only_low_energy_structures_get_vibrations(self):
+        computed = []
+
+        def fake_zpe(batch, calc, symmetry=False, method="gamma"):
+            computed.append(len(batch))
+            return [0.05 * len(atoms) for atoms in batch]
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(worker, "compute_zpe", fake_zpe):
+            stats = Path(tmp) / "zpe_stats.json"
+
+            def publish(energies_per_atom):
+                publisher = worker.ResultPublisher(
+                    zpe_calc=object(), zpe_policy=worker.ZPEPolicy(
+                        window=0.05, stats_path=stats))
+                folders = []
+                for k, e in enumerate(energies_per_atom):
+                    cf = Path(tmp) / f"wave{len(computed)}" / f"Calcfold_1_{k}"
+                    cf.mkdir(parents=True)
+                    atoms = bulk("Cu", cubic=True)
+                    publisher(cf, worker.ASE_MODE, atoms, e * len(atoms))
+                    folders.append(cf)
+                publisher.flush()
+                return [read(cf / "output.xyz") for cf in folders]
+
+            # no mean for Cu yet: everything is computed
+            first = publish([-1.0, -0.5])
+            self.assertEqual(computed, [2])
+            self.assertEqual({a.info["zpe_method"] for a in first},
+                             {"vibrations"})
+
+            # next wave: the high-energy structure gets the Cu mean
+            low, high = publish([-1.02, -0.6])
+            self.assertEqual(computed, [2, 1])
+            self.assertEqual(low.info["zpe_method"], "vibrations")
+            self.assertEqual(high.info["zpe_method"], "composition_mean")
+            self.assertAlmostEqual(high.info["zpe"], 0.05 * 4)
+            self.assertAlmostEqual(high.get_potential_energy(),
+                                   -0.6 * 4 + 0.05 * 4)
+            self.assertEqual(worker.ZPEPolicy(stats_path=stats).stats,
+                             {"Cu": {"zpe_per_atom": 0.05, "n": 3}})
+
+
+class MultiRunServiceTests(unittest.TestCase):
+    def test_runs_share_slots_fairly_and_results_go_home(self):
+        batch = rattled_batch(5)
+        evaluator = RecordingEvaluator()
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(worker, "make_evaluator", lambda calc: evaluator), \
+                patch.object(worker, "FRESH", 0.0), \
+                patch.object(worker, "STREAM_SCAN", 0.02):
+            runs = {"big": batch[:4], "small": batch[4:]}
+            folders = {}
+            for name, structures in runs.items():
+                for k, atoms in enumerate(structures):
+                    cf = Path(tmp) / name / "Calculation" / f"Calcfold_1_{k}"
+                    cf.mkdir(parents=True)
+                    write(cf / "input.xyz", atoms, format="extxyz")
+                    folders[cf] = atoms
+
+            relaxer = worker.MultiRunRelaxer(None, slots=2, **STREAM_SCHEDULE)
+            for name in runs:
+                relaxer.attach(Path(tmp) / name)
+            relaxer.scan()
+            relaxer.admit()
+            # round-robin: the single small-run structure is not stuck
+            # behind the four structures of the big run
+            self.assertEqual(sorted(job.key[0].workdir.name
+                                    for job in relaxer.sched.queue),
+                             ["big", "small"])
+
+            stop = threading.Event()
+            thread = threading.Thread(target=relaxer.serve, args=(stop,))
+            thread.start()
+            for cf in folders:
+                self.assertTrue(wait_for(cf / "output.xyz"))
+            stats = relaxer.stats()
+            stop.set()
+            thread.join(timeout=30)
+
+            self.assertEqual(max(evaluator.sizes), 2)
+            accounts = {Path(run["workdir"]).name: run for run in stats["runs"]}
+            self.assertEqual(accounts["big"]["finished"], 4)
+            self.assertEqual(accounts["small"]["finished"], 1)
+            self.assertEqual(accounts["big"]["evaluations"]
+                             + accounts["small"]["evaluations"],
+                             sum(evaluator.sizes))
+            published = {cf: read(cf / "output.xyz").get_potential_energy()
+                         for cf in folders}
+
+            ref = StagedRelaxer([read(cf / "input.xyz") for cf in folders],
+                                batch_evaluator=RecordingEvaluator(),
+                                fire_fmax=worker.FIRE_FMAX,
+                                maxstep=worker.MAXSTEP,
+                                memory=worker.LBFGS_MEMORY, logfile=None,
+                                **STREAM_SCHEDULE)
+            ref.run()
+        for got, want in zip(published.values(), ref.get_energies()):
+            self.assertAlmostEqual(got, want, places=6)
+
+    def test_failed_step_publishes_fallbacks_and_keeps_serving(self):
+        batch = rattled_batch(3)
+
+        class FailingEvaluator(RecordingEvaluator):
+            def __call__(self, atoms_list):
+                if len(self.sizes) == 2:
+                    self.sizes.append(len(atoms_list))
+                    raise RuntimeError("evaluator crashed")
+                return super().__call__(atoms_list)
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(worker, "make_evaluator",
+                             lambda calc: FailingEvaluator()), \
+                patch.object(worker, "FRESH", 0.0), \
+                patch.object(worker, "STREAM_SCAN", 0.02):
+            runs = {"a": batch[:2], "b": batch[2:]}
+            folders = {}
+            for name, structures in runs.items():
+                for k, atoms in enumerate(structures):
+                    cf = Path(tmp) / name / "Calculation" / f"Calcfold_1_{k}"
+                    cf.mkdir(parents=True)
+                    write(cf / "input.xyz", atoms, format="extxyz")
+                    folders[cf] = atoms
+
+            # one slot: the third call only holds the first structure of 'a'
+            relaxer = worker.MultiRunRelaxer(None, slots=1, **STREAM_SCHEDULE)
+            for name in runs:
+                relaxer.attach(Path(tmp) / name)
+            stop = threading.Event()
+            thread = threading.Thread(target=relaxer.serve, args=(stop,))
+            thread.start()
+            for cf in folders:
+                self.assertTrue(wait_for(cf / "output.xyz"))
+            self.assertTrue(thread.is_alive())
+            stats = relaxer.stats()
+            stop.set()
+            thread.join(timeout=30)
+
+            accounts = {Path(run["workdir"]).name: run for run in stats["runs"]}
+            self.assertEqual(accounts["a"]["fallback"], 1)
+            self.assertEqual(accounts["a"]["relaxed"], 1)
+            self.assertEqual(accounts["b"]["fallback"], 0)
+            self.assertEqual(accounts["b"]["relaxed"], 1)
+            self.assertEqual(accounts["a"]["in_flight"], 0)
+
+            failed, *relaxed = folders
+            fallback = read(failed / "output.xyz")
+            self.assertEqual(fallback.get_potential_energy(), 0.0)
+            np.testing.assert_allclose(fallback.positions,
+                                       folders[failed].positions)
+            for cf in relaxed:
+                self.assertNotEqual(
+                    read(cf / "output.xyz").get_potential_energy(), 0.0)
+
+    def test_reattach_while_in_flight_keeps_the_run_account(self):
+        batch = rattled_batch(2)
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch.object(worker, "make_evaluator",
+                             lambda calc: RecordingEvaluator()), \
+                patch.object(worker, "FRESH", 0.0):
+            workdir = Path(tmp).resolve()
+            folders = []
+            for k, atoms in enumerate(batch):
+                cf = workdir / "Calculation" / f"Calcfold_1_{k}"
+                cf.mkdir(parents=True)
+                write(cf / "input.xyz", atoms, format="extxyz")
+                folders.append(cf)
+
+            relaxer = worker.MultiRunRelaxer(None, slots=2, **STREAM_SCHEDULE)
+            relaxer.attach(workdir)
+            relaxer.scan()
+            relaxer.admit()
+            run = relaxer.runs[str(workdir)]
+            relaxer.sched.step()
+            relaxer.detach(workdir)
+            relaxer.attach(workdir)
+            # same account: the in-flight folders are not queued again
+            self.assertIs(relaxer.runs[str(workdir)], run)
+            relaxer.scan()
+            self.assertEqual(len(run.queue), 0)
+
+            # a detached run replaced by a fresh account still gets its
+            # own results, without touching the new account
+            relaxer.detach(workdir)
+            relaxer.runs[str(workdir)] = fresh = worker.RunAccount(
+                workdir, worker.ResultPublisher())
+            relaxer.sched.run()
+            self.assertEqual((run.in_flight, run.finished), (0, 2))
+            self.assertEqual((fresh.in_flight, fresh.finished), (0, 0))
+            self.assertEqual(run.publisher.counts["relaxed"], 2)
+            for cf in folders:
+                self.assertTrue((cf / "output.xyz").is_file())
+
+
+if __name__ == "__main__":
+    unittest.main()
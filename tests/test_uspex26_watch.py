@@ -0,0 +1,75 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from ase import Atoms
+from ase.io import write
+
+from ea.uspex.uspex26.run_uspex26 import read_num_parallel
+from ea.uspex.uspex26.watch import CalcfoldWatcher
+
+
+def wait_for(watcher, predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        watcher.wait(0.1)
+    return predicate()
+
+
+class CalcfoldWatcherTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.workdir = Path(tmp.name)
+        self.atoms = Atoms("CO", positions=[[0, 0, 0], [1.1, 0, 0]],
+                           cell=[8.0, 8.0, 8.0], pbc=True)
+
+    def _wave(self, watcher):
+        """USPEX creates Calculation/ and two folders after the watcher."""
+        folders = [self.workdir / "Calculation" / f"Calcfold_1_{k}"
+                   for k in (1, 2)]
+        for cf in folders:
+            cf.mkdir(parents=True)
+        write(folders[0] / "input.xyz", self.atoms, format="extxyz")
+        write(folders[1] / "geom.in", self.atoms, format="vasp")
+        self.assertTrue(wait_for(watcher, lambda: len(watcher.pending) == 2))
+        self.assertEqual(watcher.pending, set(folders))
+
+        write(folders[0] / "output.xyz", self.atoms, format="extxyz")
+        (folders[1] / "energy.txt").write_text("-1.0\n")
+        self.assertTrue(wait_for(watcher, lambda: not watcher.pending))
+
+    def test_inotify_tracks_close_write_and_markers(self):
+        watcher = CalcfoldWatcher(self.workdir)
+        self.addCleanup(watcher.close)
+        if not watcher.inotify:
+            self.skipTest("inotify not available")
+        self._wave(watcher)
+
+    def test_polling_fallback(self):
+        watcher = CalcfoldWatcher(self.workdir, use_inotify=False, fresh=0.0)
+        self.assertFalse(watcher.inotify)
+        self._wave(watcher)
+
+    def test_scanned_input_counts_only_once_settled(self):
+        cf = self.workdir / "Calculation" / "Calcfold_1_1"
+        cf.mkdir(parents=True)
+        write(cf / "input.xyz", self.atoms, format="extxyz")
+        watcher = CalcfoldWatcher(self.workdir, fresh=0.5)
+        self.addCleanup(watcher.close)
+        self.assertEqual(watcher.pending, set())
+        self.assertTrue(wait_for(watcher, lambda: watcher.pending == {cf}))
+
+    def test_num_parallel_calcs_from_input_txt(self):
+        self.assertIsNone(read_num_parallel(self.workdir))
+        (self.workdir / "INPUT.txt").write_text(
+            "% abinitioCode\n20\n% EndAbinit\n8  : numParallelCalcs\n")
+        self.assertEqual(read_num_parallel(self.workdir), 8)
+        (self.workdir / "INPUT.txt").write_text(
+            "% numParallelCalcs\n 12\n% EndNumParallelCalcs\n")
+        self.assertEqual(read_num_parallel(self.workdir), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,239 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from ase.build import bulk
+from ase.calculators.emt import EMT
+from ase.neighborlist import neighbor_list
+from ase.vibrations import Vibrations
+
+from ea.parallel.create_batch import autograd_hessian
+from ea.parallel.zpe import ParallelVibrations
+from tests.helpers import RecordingEvaluator
+
+try:
+    import spglib
+except ImportError:
+    spglib = None
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+
+def structures():
+    out = []
+    for k, symbol in enumerate(("Cu", "Al", "Cu")):
+        atoms = bulk(symbol, cubic=True).repeat((1 + k % 2, 1, 1))
+        atoms.rattle(stdev=0.02, seed=k)
+        out.append(atoms)
+    return out
+
+
+class SpringEvaluator(RecordingEvaluator):
+    """Harmonic nearest-neighbour springs with an analytic Hessian."""
+
+    k, r0, rcut = 2.0, 2.5, 3.0
+
+    def pairs(self, atoms):
+        i, j, D = neighbor_list('ijD', atoms, self.rcut)
+        d = np.linalg.norm(D, axis=1)
+        return i, j, D / d[:, None], d
+
+    def __call__(self, atoms_list):
+        self.sizes.append(len(atoms_list))
+        energies, forces = [], []
+        for atoms in atoms_list:
+            i, j, u, d = self.pairs(atoms)
+            # ordered pairs: every spring is counted twice
+            energies.append(0.25 * self.k * ((d - self.r0) ** 2).sum())
+            g = 0.5 * self.k * (d - self.r0)[:, None] * u
+            F = np.zeros((len(atoms), 3))
+            np.add.at(F, j, -g)
+            np.add.at(F, i, g)
+            forces.append(F)
+        return np.array(energies), forces, [np.zeros(6)] * len(atoms_list)
+
+    def hessians(self, atoms_list):
+        out = []
+        for atoms in atoms_list:
+            n = len(atoms)
+            H = np.zeros((n, 3, n, 3))
+            for a, b, u, d in zip(*self.pairs(atoms)):
+                uu = np.outer(u, u)
+                K = 0.5 * self.k * (uu + (1 - self.r0 / d) * (np.eye(3) - uu))
+                H[a, :, a] += K
+                H[b, :, b] += K
+                H[a, :, b] -= K
+                H[b, :, a] -= K
+            out.append(H.reshape(3 * n, 3 * n))
+        return out
+
+
+class TorchSpringEvaluator(SpringEvaluator):
+    """Same springs, Hessian by autograd."""
+
+    def hessians(self, atoms_list):
+        out = []
+        for atoms in atoms_list:
+            i, j, S = neighbor_list('ijS', atoms, self.rcut)
+            shift = torch.as_tensor(S @ atoms.cell.array)
+
+            def energy(x):
+                x = x.view(-1, 3)
+                d = torch.linalg.norm(x[j] - x[i] + shift, dim=1)
+                return 0.25 * self.k * ((d - self.r0) ** 2).sum()
+
+            out.append(autograd_hessian(energy, atoms.positions,
+                                        dtype=torch.float64))
+        return out
+
+
+def spring_crystal():
+    atoms = bulk("Cu", cubic=True).repeat((2, 2, 2))
+    atoms.rattle(stdev=0.05, seed=4)
+    return atoms
+
+
+class HessianProviderTests(unittest.TestCase):
+    def check_provider(self, evaluator):
+        atoms = spring_crystal()
+        fd = ParallelVibrations([atoms], evaluator, pack=True, analytic=False)
+        fd.run()
+        fd.read()
+        n_fd = sum(evaluator.sizes)
+
+        full = ParallelVibrations([atoms], evaluator)
+        full.run()
+        sub = ParallelVibrations([atoms], evaluator, indices=range(1, 9))
+        sub.run()
+        sub.read()
+        self.assertEqual(sum(evaluator.sizes), n_fd)    # no displacements
+
+        np.testing.assert_allclose(full.get_zero_point_energies(),
+                                   fd.get_zero_point_energies(), atol=1e-5)
+        np.testing.assert_allclose(full.H_list[0], fd.H_list[0],
+                                   rtol=0, atol=1e-4)
+        np.testing.assert_allclose(sub.H_list[0], fd.H_list[0][3:27, 3:27],
+                                   rtol=0, atol=1e-4)
+
+    def test_analytic_hessian_agrees_with_finite_differences(self):
+        self.check_provider(SpringEvaluator())
+
+    @unittest.skipIf(torch is None, "torch not installed")
+    def test_autograd_hessian_agrees_with_finite_differences(self):
+        self.check_provider(TorchSpringEvaluator())
+
+    def test_failing_provider_falls_back_to_finite_differences(self):
+        class NoHessian(SpringEvaluator):
+            def hessians(self, atoms_list):
+                raise NotImplementedError("no autograd backend")
+
+        evaluator = NoHessian()
+        vib = ParallelVibrations([spring_crystal()], evaluator, pack=True)
+        vib.run()
+        self.assertEqual(sum(evaluator.sizes), 1 + 6 * 32)
+
+
+class PackedVibrationsTests(unittest.TestCase):
+    def test_packing_fills_calls_and_matches_per_mode_run(self):
+        ref_eval = RecordingEvaluator()
+        ref = ParallelVibrations(structures(), batch_evaluator=ref_eval)
+        ref.run()
+
+        evaluator = RecordingEvaluator()
+        packed = ParallelVibrations(structures(), batch_evaluator=evaluator,
+                                    pack=True, batch_size=16, max_atoms=200)
+        packed.run()
+
+        n_disps = sum(1 + 6 * len(atoms) for atoms in structures())
+        self.assertEqual(sum(evaluator.sizes), n_disps)
+        self.assertLess(len(evaluator.sizes), len(ref_eval.sizes))
+        # full calls until the work list drains, within the atom budget
+        self.assertTrue(all(size == 16 for size in evaluator.sizes[:-1]))
+        for zpe, zpe_ref in zip(packed.get_zero_point_energies(),
+                                ref.get_zero_point_energies()):
+            self.assertAlmostEqual(zpe, zpe_ref, places=10)
+        for H, H_ref in zip(packed.H_list, ref.H_list):
+            np.testing.assert_allclose(H, H_ref, rtol=0, atol=1e-10)
+
+    def test_atom_budget_bounds_a_call(self):
+        evaluator = RecordingEvaluator()
+        big = bulk("Cu", cubic=True).repeat((2, 2, 1))      # 16 atoms
+        ParallelVibrations([big], batch_evaluator=evaluator, pack=True,
+                           max_atoms=40).run()
+        self.assertEqual(max(evaluator.sizes), 2)
+        self.assertEqual(sum(evaluator.sizes), 1 + 6 * len(big))
+
+
+class StreamingHessianTests(unittest.TestCase):
+    def test_assembled_hessian_matches_ase_for_every_scheme(self):
+        atoms = bulk("Cu", cubic=True)
+        atoms.rattle(stdev=0.02, seed=1)
+        schemes = [(2, "standard", "central"), (2, "frederiksen", "forward"),
+                   (2, "standard", "backward"), (4, "frederiksen", "central")]
+        with tempfile.TemporaryDirectory() as tmp:
+            for nfree, method, direction in schemes:
+                ref_atoms = atoms.copy()
+                ref_atoms.calc = EMT()
+                ref = Vibrations(ref_atoms, nfree=nfree,
+                                 name=os.path.join(tmp, f"{nfree}{direction}"))
+                ref.run()
+                ref.read(method=method, direction=direction)
+
+                memmap_dir = os.path.join(tmp, f"H{nfree}{direction}")
+                vib = ParallelVibrations([atoms], RecordingEvaluator(),
+                                         nfree=nfree, method=method,
+                                         direction=direction, pack=True,
+                                         memmap_dir=memmap_dir)
+                vib.run()
+                vib.read()
+                self.assertIsInstance(vib.H_list[0], np.memmap)
+                np.testing.assert_allclose(vib.H_list[0], ref.H,
+                                           rtol=0, atol=1e-10)
+                with self.assertRaises(ValueError):
+                    vib.read(method="standard" if method == "frederiksen"
+                             else "frederiksen")
+
+
+@unittest.skipIf(spglib is None, "spglib not installed")
+class SymmetryReducedVibrationsTests(unittest.TestCase):
+    def test_only_inequivalent_atoms_are_displaced(self):
+        atoms = bulk("Cu", cubic=True).repeat((2, 1, 1))
+        atoms.positions[0, 2] += 0.1        # lower the symmetry a little
+
+        full_eval = RecordingEvaluator()
+        full = ParallelVibrations([atoms], full_eval, pack=True)
+        full.run()
+        evaluator = RecordingEvaluator()
+        sym = ParallelVibrations([atoms], evaluator, pack=True, symmetry=True)
+        sym.run()
+
+        self.assertLess(sum(evaluator.sizes), sum(full_eval.sizes))
+        np.testing.assert_allclose(sym.H_list[0], full.H_list[0],
+                                   rtol=0, atol=1e-9)
+        self.assertAlmostEqual(sym.get_zero_point_energies()[0],
+                               full.get_zero_point_energies()[0], places=8)
+
+        # one inequivalent atom in fcc Cu; no symmetry in a rattled cell
+        fcc = ParallelVibrations([bulk("Cu", cubic=True)], None,
+                                 symmetry=True)
+        self.assertEqual(len(fcc._disps_for(0)), 1 + 6)
+        rattled = atoms.copy()
+        rattled.rattle(stdev=0.05, seed=3)
+        low = ParallelVibrations([rattled], None, symmetry=True)
+        self.assertEqual(len(low._disps_for(0)), 1 + 6 * len(rattled))
+
+    def test_one_sided_differences_are_rejected(self):
+        # their rows do not rotate into the rows of the equivalent atoms
+        for direction in ("forward", "backward"):
+            with self.subTest(direction=direction):
+                with self.assertRaises(ValueError):
+                    ParallelVibrations([bulk("Cu", cubic=True)], None,
+                                       direction=direction, symmetry=True)
+
+
+if __name__ == "__main__":
+    unittest.main()